@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import threading
+import time
+
+import connection_pool
+import mock_server
+import model_backend
+from util import distribution
+
+# Measures what pooled connections save, against the local mock server (see 'mock_server.py').
+# Sends the same requests with and without the connection pool of the openAI backend:
+# - per_request: the default of the openAI library, a new session and connection for every async request
+# - pooled: one session per run, whose connections are kept alive and reused
+# The mock server speaks plain HTTP, so only the TCP and session setup is saved here.
+# Against the openAI API, every new connection costs a TLS handshake as well.
+# Run from the project root: python -m benchmark.connection_pool --requests 2000 -c 32
+
+
+def run_requests(backend: model_backend.OpenAIBackend, request_count: int, concurrency: int) -> float:
+    # Returns the seconds it took to send every request
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i: int):
+        async with semaphore:
+            await backend.acreate(model='gpt-3.5-turbo',
+                                  messages=[{'role': 'user', 'content': f'Das Signal kommt von dort drüben. #{i}'}])
+
+    async def send_all():
+        async with backend.connection_pool():
+            await asyncio.gather(*[send(i) for i in range(request_count)])
+
+    start_time = time.perf_counter()
+    asyncio.run(send_all())
+    return time.perf_counter() - start_time
+
+
+def main(request_count: int, concurrency: int, latency: str, max_connections: int):
+    server = mock_server.MockChatCompletionServer(port=0, latency=distribution.Distribution.parse(latency))
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    print(f'{"mode":<12} {"requests":>9} {"seconds":>8} {"requests/s":>11} {"connections":>12} '
+          f'{"reuse ratio":>12} {"connect ms":>11} {"wait s":>8}')
+    try:
+        for mode in ['per_request', 'pooled']:
+            pool = connection_pool.ConnectionPool(max_connections=max_connections, enabled=mode == 'pooled')
+            backend = model_backend.OpenAIBackend(api_key='benchmark', api_base=server.api_base(), pool=pool)
+            connections_before = server.connection_count
+
+            seconds = run_requests(backend=backend, request_count=request_count, concurrency=concurrency)
+            backend.close()
+
+            # counted by the server, as requests without the pool are not traced
+            connections = server.connection_count - connections_before
+            stats = pool.stats.to_dict()
+            reuse_ratio = round(1 - connections / request_count, 4)
+            connect_ms = stats['average_connect_ms'] if stats['average_connect_ms'] is not None else '-'
+            wait_seconds = stats['wait_seconds'] if mode == 'pooled' else '-'
+            print(f'{mode:<12} {request_count:>9} {seconds:>8.2f} {request_count / seconds:>11.1f} '
+                  f'{connections:>12} {reuse_ratio:>12} {connect_ms:>11} {wait_seconds:>8}')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks pooled connections against the local mock server.')
+    parser.add_argument('--requests', type=int, required=False, default=2000,
+                        help='Requests sent with and without the connection pool.')
+    parser.add_argument('-c', '--concurrency', type=int, required=False, default=32,
+                        help='Requests in flight at the same time.')
+    parser.add_argument('--latency', type=str, required=False, default='0.01',
+                        help='Seconds the mock server takes to answer. A number or a distribution.')
+    parser.add_argument('--max_connections', type=int, required=False,
+                        default=connection_pool.DEFAULT_MAX_CONNECTIONS,
+                        help='Maximum connections of the pool.')
+    args = parser.parse_args()
+
+    main(request_count=args.requests, concurrency=args.concurrency, latency=args.latency,
+         max_connections=args.max_connections)
@@ -0,0 +1,77 @@
+import random
+
+import subtitles
+from util import distribution
+
+# Synthetic subtitle files for the benchmarks.
+# The words per text line are drawn from a distribution, so short dialogue and long narration can both be simulated.
+
+_words: [str] = ['the', 'signal', 'is', 'coming', 'from', 'over', 'there', 'we', 'need', 'to', 'move', 'now',
+                 'what', 'was', 'that', 'sound', 'stay', 'close', 'and', 'keep', 'your', 'eyes', 'open',
+                 'nobody', 'leaves', 'before', 'morning', 'i', 'told', 'you', 'already', 'listen', 'carefully']
+
+
+def create_srt_file(file_path: str,
+                    cue_count: int,
+                    words_per_line: distribution.Distribution = None,
+                    two_line_share: float = 0.5,
+                    seed: int = 42,
+                    scene_cues: distribution.Distribution = None):
+    # Every cue has one or two text lines. 'two_line_share' is the share of cues with two.
+    # If 'scene_cues' is given, scenes of that many cues are separated by a pause of 10 seconds.
+    if words_per_line is None:
+        words_per_line = distribution.Distribution(kind='uniform', values=[3, 9])
+
+    rng = random.Random(seed)
+    f = open(file_path, 'w', encoding='utf-8')
+    pause_ms = 0
+    next_scene = _scene_length(scene_cues=scene_cues, rng=rng)
+    for i in range(cue_count):
+        if next_scene is not None and i == next_scene:
+            pause_ms = pause_ms + 10_000
+            next_scene = next_scene + _scene_length(scene_cues=scene_cues, rng=rng)
+        start_ms = i * 3000 + pause_ms
+        end_ms = start_ms + 2500
+        line_count = 2 if rng.random() < two_line_share else 1
+        text_lines = [' '.join(rng.choices(_words, k=max(1, round(words_per_line.sample(rng=rng)))))
+                      for _ in range(line_count)]
+        f.write(f'{i + 1}\n{subtitles.format_timestamp(start_ms)} --> {subtitles.format_timestamp(end_ms)}\n' +
+                '\n'.join(text_lines) + '\n\n')
+    f.close()
+
+
+def _scene_length(scene_cues: distribution.Distribution, rng: random.Random) -> int:
+    if scene_cues is None:
+        return None
+    return max(1, round(scene_cues.sample(rng=rng)))
+
+
+def revise_srt_file(file_path: str,
+                    edited_share: float = 0.05,
+                    inserted_share: float = 0.01,
+                    removed_share: float = 0.01,
+                    shift_ms: int = 500,
+                    seed: int = 42):
+    # Simulates a revision of the source: Every cue is shifted by 'shift_ms', the given shares of cues are edited,
+    # removed, or get a new cue after them.
+    rng = random.Random(seed)
+    subs = subtitles.Subtitles(input_file_path=file_path)
+    lines = []
+    for line in subs.lines:
+        if rng.random() < removed_share:
+            continue
+        text = line.spoken_line
+        if rng.random() < edited_share:
+            text = text + ' ' + rng.choice(_words)
+        lines.append([line.start_ms + shift_ms, line.end_ms + shift_ms, text])
+        if rng.random() < inserted_share:
+            lines.append([line.end_ms + shift_ms + 100, line.end_ms + shift_ms + 400,
+                          ' '.join(rng.choices(_words, k=5))])
+
+    f = open(file_path, 'w', encoding='utf-8')
+    for i in range(len(lines)):
+        start_ms, end_ms, text = lines[i]
+        f.write(f'{i + 1}\n{subtitles.format_timestamp(start_ms)} --> {subtitles.format_timestamp(end_ms)}\n'
+                f'{text}\n\n')
+    f.close()
+    return len(lines)
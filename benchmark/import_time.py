@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmark import suite
+from util import log, utils
+
+# Measures the time it takes to import the modules of the CLI, every import in a fresh process.
+# Starting 'translator.py' once per file (e.g. from a job queue) pays this time for every file.
+# Modules which are slow to load and not needed to translate (matplotlib, pycountry) must not be loaded on startup.
+# numpy is not checked by default: It is not used by this project, but openai 0.27 loads it if it is installed.
+# The run fails, if one of them is loaded or if an import takes longer than '--max_ms'.
+# Run from the project root: python -m benchmark.import_time --max_ms 1000
+default_modules: [str] = ['translator', 'gpt_model_interface', 'subtitles', 'languages', 'util.utils']
+default_heavy_modules: [str] = ['matplotlib', 'pycountry']
+
+
+def project_dir() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_import_times(output: str) -> {str: [int, int]}:
+    # Parses the output of 'python -X importtime': Microseconds spent per module, alone and including its imports
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times
+
+
+def measure_import(module: str) -> [float, float, {str: [int, int]}]:
+    # Returns the cumulative import time reported by python and the wall time of the whole process, in milliseconds
+    start_time = time.perf_counter_ns()
+    process = subprocess.run([sys.executable, '-c', f'import {module}'], cwd=project_dir(),
+                             capture_output=True, text=True)
+    process_ms = (time.perf_counter_ns() - start_time) / 1_000_000
+    if process.returncode != 0:
+        print(process.stderr)
+        raise Exception(f'Importing "{module}" failed with exit code {process.returncode}.')
+
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=project_dir(),
+                             capture_output=True, text=True)
+    times = parse_import_times(output=process.stderr)
+    if module not in times:
+        raise Exception(f'No import time reported for "{module}".')
+    return times[module][1] / 1000, process_ms, times
+
+
+def loaded_modules(module: str, candidates: [str]) -> [str]:
+    # Returns the candidates loaded by importing the module
+    code = f'import sys, {module}; print(",".join([m for m in {candidates!r} if m in sys.modules]))'
+    process = subprocess.run([sys.executable, '-c', code], cwd=project_dir(), capture_output=True, text=True)
+    if process.returncode != 0:
+        print(process.stderr)
+        raise Exception(f'Importing "{module}" failed with exit code {process.returncode}.')
+    return [m for m in process.stdout.strip().split(',') if m != '']
+
+
+def heaviest_imports(times: {str: [int, int]}, count: int) -> [[str, float]]:
+    # The slowest top level packages, besides the project modules themselves
+    packages = {}
+    for name, (self_us, cumulative_us) in times.items():
+        package = name.split('.')[0]
+        if os.path.exists(os.path.join(project_dir(), package + '.py')) or \
+                os.path.isdir(os.path.join(project_dir(), package)):
+            continue
+        packages[package] = max(packages.get(package, 0), cumulative_us)
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:count]
+    return [(name, cumulative_us / 1000) for name, cumulative_us in heaviest]
+
+
+def main(args):
+    results = []
+    failures = []
+    for module in args.modules:
+        import_times = []
+        process_times = []
+        times = None
+        for i in range(args.repeats):
+            import_ms, process_ms, times = measure_import(module=module)
+            import_times.append(import_ms)
+            process_times.append(process_ms)
+
+        result = {
+            'module': module,
+            'import_ms_p50': suite.percentile(values=import_times, share=0.5),
+            'import_ms_min': min(import_times),
+            'process_ms_p50': suite.percentile(values=process_times, share=0.5),
+            'heavy_modules_loaded': loaded_modules(module=module, candidates=args.heavy),
+            'heaviest_imports': heaviest_imports(times=times, count=5)
+        }
+        results.append(result)
+
+        if len(result['heavy_modules_loaded']) > 0:
+            failures.append(f'"{module}" loads {", ".join(result["heavy_modules_loaded"])}')
+        if args.max_ms is not None and result['import_ms_p50'] > args.max_ms:
+            failures.append(f'"{module}" takes {result["import_ms_p50"]:.1f} ms to import (at most {args.max_ms} ms)')
+
+    print(f'{"module":<22} {"import ms":>10} {"process ms":>11}  heaviest imports')
+    for r in results:
+        heaviest = ', '.join([f'{name} {ms:.0f} ms' for name, ms in r['heaviest_imports']])
+        print(f'{r["module"]:<22} {r["import_ms_p50"]:>10.1f} {r["process_ms_p50"]:>11.1f}  {heaviest}')
+
+    environment = suite.git_commit()
+    environment['python'] = platform.python_version()
+    environment['platform'] = platform.platform()
+    report = {
+        'timestamp': utils.gct(),
+        'environment': environment,
+        'parameters': {'repeats': args.repeats, 'max_ms': args.max_ms, 'heavy': args.heavy},
+        'modules': results,
+        'failures': failures
+    }
+
+    out_file_path = args.out
+    if out_file_path is None:
+        commit = str(environment['commit'])[:10]
+        out_file_path = log.log_dir_base + os.path.join('log', 'benchmark',
+                                                        f'import-{time.strftime("%Y%m%d-%H%M%S")}-{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out_file_path)), exist_ok=True)
+    f = open(out_file_path, 'w', encoding='utf-8')
+    json.dump(report, f, indent=2)
+    f.close()
+    print(f'Results saved to: {out_file_path}')
+
+    for failure in failures:
+        print(f'Failed: {failure}.')
+    return len(failures) == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the time it takes to import the modules of the CLI.')
+    parser.add_argument('--modules', type=str, nargs='+', required=False, default=default_modules,
+                        help=f'Modules to import. If empty: {", ".join(default_modules)}.')
+    parser.add_argument('--repeats', type=int, required=False, default=5,
+                        help='Imports of every module, each in a new process. The median is reported.')
+    parser.add_argument('--max_ms', type=float, required=False,
+                        help='Fails, if importing a module takes longer (median, in milliseconds).')
+    parser.add_argument('--heavy', type=str, nargs='+', required=False, default=default_heavy_modules,
+                        help=f'Modules which must not be loaded on startup. If empty: '
+                             f'{", ".join(default_heavy_modules)}.')
+    parser.add_argument('--out', type=str, required=False,
+                        help='File to save the results in. If empty, a new file in "log/benchmark/" is used.')
+    args = parser.parse_args()
+
+    if not main(args=args):
+        sys.exit(1)
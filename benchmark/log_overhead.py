@@ -0,0 +1,80 @@
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from util import log
+from util.utils import gct
+
+# Measures the time a caller spends per log record, for records that are only written to the log files.
+# Compares the file handling 'log.write' used to have (checking, opening and closing the file per record)
+# against the background writer.
+# Run from the project root: python -m benchmark.log_overhead --records 20000
+
+
+def legacy_write(output: str):
+    # The file handling of 'log._write', before records were written in the background
+    log_dir = log.log_dir_base + 'log' + os.sep
+    log_file = log_dir + 'log.txt'
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+    if not os.path.exists(log_file):
+        f = open(log_file, 'w')
+        f.close()
+
+    output = '[' + gct() + '] ' + output
+    if os.path.exists(log_file):
+        f = open(log_file, 'a')
+        f.write('\n')
+    else:
+        os.makedirs(Path(log_file).parent.absolute(), exist_ok=True)
+        f = open(log_file, 'w', encoding="utf-8")
+    f.write(output)
+    f.close()
+
+
+def background_write(output: str):
+    log.write(output, print_to_console=False)
+
+
+def measure(function, record_count: int) -> [float, float]:
+    # Returns the microseconds per record spent by the caller and until every record is on disk
+    start_time = time.perf_counter_ns()
+    for i in range(record_count):
+        function(f'Translated line #{i}: "Das Signal kommt von dort drüben."')
+    caller_ns = time.perf_counter_ns() - start_time
+    log.flush()
+    total_ns = time.perf_counter_ns() - start_time
+
+    return caller_ns / record_count / 1000, total_ns / record_count / 1000
+
+
+def main(record_count: int):
+    work_dir = tempfile.mkdtemp(prefix='log_overhead_')
+    log.set_log_dir(work_dir)
+
+    print(f'{"method":<20} {"caller µs/record":>18} {"on disk µs/record":>18}')
+    for name, function in [('legacy', legacy_write), ('background writer', background_write)]:
+        caller_us, total_us = measure(function=function, record_count=record_count)
+        print(f'{name:<20} {caller_us:>18.2f} {total_us:>18.2f}')
+
+    log.shutdown()
+    log_file = log.get_log_file_path()
+    f = open(log_file, 'r', encoding='utf-8')
+    written = sum(1 for line in f if line.strip() != '')
+    f.close()
+    print(f'{written} of {record_count * 2} records written.')
+
+    os.remove(log_file)
+    os.rmdir(os.path.dirname(log_file))
+    os.rmdir(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the overhead of writing log records.')
+    parser.add_argument('--records', type=int, required=False, default=20000,
+                        help='Number of records written by every method.')
+    args = parser.parse_args()
+
+    main(record_count=args.records)
@@ -0,0 +1,143 @@
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import gpt_model_interface
+
+# Measures the cost of a response record per API call: Creating it, serializing it for the dump and keeping it.
+# Compares the record this project used to have (serializing the response twice when created,
+# parsing it again for every dump) against the slots based record in 'gpt_model_interface.py'.
+# Run from the project root: python -m benchmark.response_record --responses 20000
+
+
+class FakeResponseObject(dict):
+    # Behaves like the response objects of the openAI library: Fields are readable as attributes
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def to_dict_recursive(self) -> {}:
+        return json.loads(json.dumps(self))
+
+
+def create_predictions(i: int) -> FakeResponseObject:
+    message = FakeResponseObject(role='assistant', content=f'[1] Das Signal kommt von dort drüben. #{i}\n'
+                                                           f'[2] Wir müssen jetzt los.')
+    return FakeResponseObject(
+        openai_id=f'chatcmpl-{i}', organization='benchmark', response_ms=420, id=f'chatcmpl-{i}',
+        object='chat.completion', created=1700000000 + i, model='gpt-3.5-turbo-0613',
+        usage=FakeResponseObject(prompt_tokens=180, completion_tokens=24, total_tokens=204),
+        choices=[FakeResponseObject(index=0, message=message, finish_reason='stop')])
+
+
+class LegacyResponseData:
+    # The record of 'gpt_model_interface.py', before it used slots and lazy serialization
+    def __init__(self, original_prompt: str, predictions):
+        self.original_prompt: str = original_prompt
+        self.response_timestamp: int = time.time_ns()
+        self.openai_id: str = predictions.openai_id
+        self.organization: str = predictions.organization
+        self.response_ms: int = predictions.response_ms
+        self.id: str = predictions.id
+        self.object: str = predictions.object
+        self.created: int = predictions.created
+        self.model: str = predictions.model
+        self.prompt_tokens: int = predictions.usage.prompt_tokens
+        self.completion_tokens: int = predictions.usage.completion_tokens
+        self.total_tokens: int = predictions.usage.total_tokens
+        self.selected_choice_index: int = 0
+        answer = predictions.choices[self.selected_choice_index]
+        message = answer.message
+        self.finish_reason: str = answer.finish_reason
+        self.answer_role: str = message.role
+        self.answer_content: str = message.content
+        self.summary_json: str = json.dumps(predictions.to_dict_recursive(), indent=2)
+        self.message_json: str = json.dumps(message.to_dict_recursive(), indent=2)
+
+    def to_dict(self) -> {}:
+        return {
+            'timestamp': self.response_timestamp, 'original_prompt': self.original_prompt,
+            'organization': self.organization, 'openai_id': self.openai_id, 'response_ms': self.response_ms,
+            'id': self.id, 'object': self.object, 'created': self.created, 'model': self.model,
+            'prompt_tokens': self.prompt_tokens, 'completion_tokens': self.completion_tokens,
+            'total_tokens': self.total_tokens, 'selected_choice_index': self.selected_choice_index,
+            'answer.finish_reason': self.finish_reason, 'message_role': self.answer_role,
+            'message_content': self.answer_content,
+            'summary': json.loads(self.summary_json), 'message': json.loads(self.message_json)
+        }
+
+    def dump(self) -> str:
+        json_dump = str(json.dumps(self.to_dict(), indent=2))
+        abs(hash(json_dump))
+        return json_dump
+
+
+class ArchiveStandIn:
+    # Serializes records like the response archive, without writing them
+    def __init__(self) -> None:
+        self.bytes_serialized: int = 0
+
+    def append(self, record: {}):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        self.bytes_serialized = self.bytes_serialized + len(line)
+
+
+def run_legacy(predictions: [FakeResponseObject]) -> []:
+    records = []
+    for p in predictions:
+        record = LegacyResponseData(original_prompt='[1] The signal is coming from over there.', predictions=p)
+        record.dump()
+        records.append(record)
+    return records
+
+
+def run_slots(predictions: [FakeResponseObject]) -> []:
+    archive = ArchiveStandIn()
+    records = []
+    for p in predictions:
+        record = gpt_model_interface.GPTResponseData(original_prompt='[1] The signal is coming from over there.',
+                                                     predictions=p)
+        record.dump_response(archive=archive)
+        records.append(record)
+    return records
+
+
+def main(response_count: int, repeats: int):
+    print(f'{"record":<10} {"µs/response":>12} {"retained bytes/response":>24}')
+    for name, function in [('legacy', run_legacy), ('slots', run_slots)]:
+        best_ns = None
+        for _ in range(repeats):
+            predictions = [create_predictions(i=i) for i in range(response_count)]
+            gc.collect()
+            start_time = time.perf_counter_ns()
+            function(predictions)
+            elapsed_ns = time.perf_counter_ns() - start_time
+            best_ns = elapsed_ns if best_ns is None else min(best_ns, elapsed_ns)
+
+        # Memory kept alive by the records, after the raw responses are gone (like 'TranslationEngine.responses')
+        predictions = [create_predictions(i=i) for i in range(response_count)]
+        gc.collect()
+        tracemalloc.start()
+        records = function(predictions)
+        del predictions
+        gc.collect()
+        retained_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del records
+
+        print(f'{name:<10} {best_ns / response_count / 1000:>12.2f} {retained_bytes / response_count:>24.0f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks creating, dumping and keeping response records.')
+    parser.add_argument('--responses', type=int, required=False, default=20000,
+                        help='Number of responses per run.')
+    parser.add_argument('--repeats', type=int, required=False, default=3,
+                        help='Runs per record type. The best time is reported.')
+    args = parser.parse_args()
+
+    main(response_count=args.responses, repeats=args.repeats)
@@ -0,0 +1,78 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import model_backend
+import translator
+from benchmark import corpus
+from util import distribution, log
+
+# Compares translating a revised subtitle file again from scratch against updating its previous translation
+# (--incremental), with the fake backend (see 'model_backend.py'), without network access or cost.
+# The file is translated once, then revised: Timing is shifted, a few cues are edited, removed or inserted.
+# Only the translation of the revised file is measured.
+# Run from the project root: python -m benchmark.revision --cues 1000 --edited 0.05
+modes: [str] = ['full', 'incremental']
+
+
+def translate(input_file_path: str, out_dir: str, overwrite: bool, args) -> {}:
+    backend = model_backend.FakeBackend(latency=distribution.Distribution.parse(args.latency), seed=args.seed)
+    translator.main(api_key_file_path=None, file_list=[input_file_path], out_dir=out_dir, country_alpha_2='de',
+                    language_alpha_2='de', output_country='Germany', output_language='German', delay=0.0,
+                    concurrency=args.concurrency, overwrite=overwrite, backend=backend,
+                    report_file_path=os.path.join(out_dir, 'report.json'), incremental=True)
+    return backend.usage.to_dict()
+
+
+def main(args):
+    work_dir = tempfile.mkdtemp(prefix='benchmark_revision_')
+    log.set_log_dir(work_dir)
+    try:
+        results = []
+        for mode in modes:
+            mode_dir = os.path.join(work_dir, mode)
+            os.makedirs(mode_dir, exist_ok=True)
+            input_file_path = os.path.join(mode_dir, 'input.srt')
+            corpus.create_srt_file(file_path=input_file_path, cue_count=args.cues, seed=args.seed)
+            translate(input_file_path=input_file_path, out_dir=mode_dir, overwrite=False, args=args)
+
+            cues = corpus.revise_srt_file(file_path=input_file_path, edited_share=args.edited,
+                                          inserted_share=args.inserted, removed_share=args.removed,
+                                          shift_ms=args.shift, seed=args.seed)
+            start_time = time.perf_counter()
+            usage = translate(input_file_path=input_file_path, out_dir=mode_dir, overwrite=mode == 'full',
+                              args=args)
+            results.append([mode, cues, time.perf_counter() - start_time, usage])
+    finally:
+        log.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f'{"mode":<12} {"cues":>7} {"seconds":>9} {"requests":>9} {"total tokens":>13}')
+    for mode, cues, seconds, usage in results:
+        print(f'{mode:<12} {cues:>7} {seconds:>9.2f} {usage["requests"]:>9} {usage["total_tokens"]:>13}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks updating the translation of a revised file '
+                                                 'against the fake backend.')
+    parser.add_argument('--cues', type=int, required=False, default=1000,
+                        help='Number of cues of the generated subtitle file.')
+    parser.add_argument('--edited', type=float, required=False, default=0.05,
+                        help='Share of cues edited by the revision.')
+    parser.add_argument('--inserted', type=float, required=False, default=0.01,
+                        help='Share of cues followed by a new cue after the revision.')
+    parser.add_argument('--removed', type=float, required=False, default=0.01,
+                        help='Share of cues removed by the revision.')
+    parser.add_argument('--shift', type=int, required=False, default=500,
+                        help='Milliseconds every cue is shifted by the revision.')
+    parser.add_argument('-c', '--concurrency', type=int, required=False, default=16,
+                        help='API calls in flight.')
+    parser.add_argument('--latency', type=str, required=False, default='0.05',
+                        help='Seconds the fake backend takes to answer. A number or a distribution.')
+    parser.add_argument('--seed', type=int, required=False, default=42,
+                        help='Seed of the generated file, its revision and the latencies.')
+    args = parser.parse_args()
+
+    main(args=args)
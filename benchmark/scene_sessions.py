@@ -0,0 +1,80 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import model_backend
+import run_report
+import translator
+from benchmark import corpus
+from util import distribution, log
+
+# Compares the ways to translate a file with the fake backend (see 'model_backend.py'), without network access or cost:
+# - history: one session history over the whole file, one request at a time (--keep_history)
+# - scenes: a session history per scene, all scenes at the same time (--keep_history with --concurrency)
+# - no_history: every request only sees the initial prompt, with the same concurrency
+# The generated file has pauses between its scenes, so they can be detected.
+# Run from the project root: python -m benchmark.scene_sessions --cues 1000 -c 16
+modes: [str] = ['history', 'scenes', 'no_history']
+
+
+def run_mode(mode: str, input_file_path: str, work_dir: str, args) -> run_report.RunReport:
+    out_dir = os.path.join(work_dir, mode)
+    os.makedirs(out_dir, exist_ok=True)
+    report_file_path = os.path.join(work_dir, f'{mode}.json')
+    backend = model_backend.FakeBackend(latency=distribution.Distribution.parse(args.latency), seed=args.seed)
+
+    translator.main(api_key_file_path=None, file_list=[input_file_path], out_dir=out_dir, country_alpha_2='de',
+                    language_alpha_2='de', output_country='Germany', output_language='German', delay=0.0,
+                    keep_history=mode != 'no_history', concurrency=1 if mode == 'history' else args.concurrency,
+                    batch_size=args.batch_size, overwrite=True, backend=backend, report_file_path=report_file_path,
+                    scene_overlap=args.overlap, scene_lines=args.scene_lines)
+    return backend.usage.to_dict()
+
+
+def main(args):
+    work_dir = tempfile.mkdtemp(prefix='benchmark_scenes_')
+    log.set_log_dir(work_dir)
+    try:
+        input_file_path = os.path.join(work_dir, 'input.srt')
+        corpus.create_srt_file(file_path=input_file_path, cue_count=args.cues, seed=args.seed,
+                               scene_cues=distribution.Distribution.parse(args.scene_cues))
+
+        results = []
+        for mode in modes:
+            start_time = time.perf_counter()
+            usage = run_mode(mode=mode, input_file_path=input_file_path, work_dir=work_dir, args=args)
+            results.append([mode, time.perf_counter() - start_time, usage])
+    finally:
+        log.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f'{"mode":<12} {"cues":>7} {"seconds":>9} {"requests":>9} {"prompt tokens":>14} '
+          f'{"tokens/cue":>11}')
+    for mode, seconds, usage in results:
+        print(f'{mode:<12} {args.cues:>7} {seconds:>9.2f} {usage["requests"]:>9} {usage["prompt_tokens"]:>14} '
+              f'{usage["total_tokens"] / args.cues:>11.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks session histories per scene against the fake backend.')
+    parser.add_argument('--cues', type=int, required=False, default=1000,
+                        help='Number of cues of the generated subtitle file.')
+    parser.add_argument('--scene_cues', type=str, required=False, default='uniform:5,40',
+                        help='Cues per scene of the generated file. A number or a distribution.')
+    parser.add_argument('-c', '--concurrency', type=int, required=False, default=16,
+                        help='API calls in flight, if not one history is kept over the whole file.')
+    parser.add_argument('-b', '--batch_size', type=int, required=False, default=1,
+                        help='Lines per API call.')
+    parser.add_argument('--overlap', type=int, required=False, default=3,
+                        help='Lines before a scene sent along as context.')
+    parser.add_argument('--scene_lines', type=int, required=False, default=40,
+                        help='Maximum lines of a scene with a session history of its own.')
+    parser.add_argument('--latency', type=str, required=False, default='0.05',
+                        help='Seconds the fake backend takes to answer. A number or a distribution.')
+    parser.add_argument('--seed', type=int, required=False, default=42,
+                        help='Seed of the generated file and the latencies.')
+    args = parser.parse_args()
+
+    main(args=args)
@@ -0,0 +1,158 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import subtitles
+from benchmark import corpus
+
+# Compares reading and writing large subtitle files:
+# The list based parser and the string concatenation of the formatter this project used to have,
+# against the streaming reader and writer in 'subtitles.py'.
+# The legacy parser drops the last cue of every file, so its output is not compared.
+# Run from the project root: python -m benchmark.subtitle_io --cues 200000
+
+
+def legacy_parse(input_file_path: str) -> [subtitles.Line]:
+    # The parser of 'Subtitles.__init__', before it was streamed
+    with open(input_file_path) as f:
+        lines_raw = [line.rstrip() for line in f]
+
+    lines = []
+    line_counter = 2
+    buffer_speaking_line = ''
+    buffer_start_time = ''
+    buffer_end_time = ''
+
+    for i in range(len(lines_raw)):
+        current_line = str(lines_raw[i]).strip()
+        separator_line_found = False
+
+        if current_line == str(line_counter):
+            separator_line_found = True
+            line_counter = line_counter + 1
+        elif '-->' in current_line:
+            buffer_start_time, buffer_end_time = current_line.strip().split(' --> ')
+            buffer_speaking_line = ''
+        else:
+            buffer_speaking_line = buffer_speaking_line + '\n' + current_line
+            buffer_speaking_line = buffer_speaking_line.strip()
+
+        if separator_line_found:
+            lines.append(subtitles.Line(index=line_counter - 2, start_time=buffer_start_time,
+                                        end_time=buffer_end_time, spoken_line=buffer_speaking_line.strip()))
+    return lines
+
+
+def legacy_format(lines: [subtitles.Line]) -> str:
+    # The formatter of 'Subtitles.format()', before it was joined
+    formatted_text = ''
+    for line in lines:
+        formatted_text = formatted_text + str(line.index) + '\n'
+        formatted_text = formatted_text + f'{line.start_time} --> {line.end_time}' + '\n'
+        formatted_text = formatted_text + line.spoken_line + '\n\n'
+    return formatted_text
+
+
+def run_legacy_parse(input_file_path: str, out_file_path: str):
+    legacy_parse(input_file_path=input_file_path)
+
+
+def run_parse(input_file_path: str, out_file_path: str):
+    for _ in subtitles.read_lines(input_file_path=input_file_path):
+        pass
+
+
+def run_legacy(input_file_path: str, out_file_path: str):
+    lines = legacy_parse(input_file_path=input_file_path)
+    f = open(out_file_path, 'w')
+    f.write(legacy_format(lines=lines))
+    f.close()
+
+
+def run_subtitles(input_file_path: str, out_file_path: str):
+    subs = subtitles.Subtitles(input_file_path=input_file_path)
+    f = open(out_file_path, 'w')
+    f.write(subs.format())
+    f.close()
+
+
+def run_streaming(input_file_path: str, out_file_path: str):
+    writer = subtitles.SubtitleWriter(out_file_path=out_file_path)
+    position = 0
+    for line in subtitles.read_lines(input_file_path=input_file_path):
+        writer.write(position=position, line=line)
+        position = position + 1
+    writer.finish()
+
+
+def measure(function, input_file_path: str, out_file_path: str, repeats: int) -> [float, float]:
+    # Returns the best time in ms and the peak of traced memory in MB
+    best_ms = None
+    for _ in range(repeats):
+        start_time = time.perf_counter_ns()
+        function(input_file_path, out_file_path)
+        elapsed_ms = (time.perf_counter_ns() - start_time) / 1_000_000
+        best_ms = elapsed_ms if best_ms is None else min(best_ms, elapsed_ms)
+
+    # measured separately, tracing slows everything down
+    tracemalloc.start()
+    function(input_file_path, out_file_path)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best_ms, peak_bytes / 1024 / 1024
+
+
+def main(cue_counts: [int], repeats: int, legacy_max_cues: int):
+    work_dir = tempfile.mkdtemp(prefix='subtitle_io_')
+    candidates = [('legacy parse', run_legacy_parse),
+                  ('streaming parse', run_parse),
+                  ('legacy parse + concat', run_legacy),
+                  ('Subtitles + join', run_subtitles),
+                  ('streaming read + write', run_streaming)]
+
+    print(f'{"cues":>10} {"size MB":>8} {"method":<24} {"best ms":>10} {"peak MB":>9}')
+    for cue_count in cue_counts:
+        input_file_path = os.path.join(work_dir, f'input_{cue_count}.srt')
+        corpus.create_srt_file(file_path=input_file_path, cue_count=cue_count)
+        size_mb = os.path.getsize(input_file_path) / 1024 / 1024
+
+        outputs = []
+        for name, function in candidates:
+            if function is run_legacy and cue_count > legacy_max_cues:
+                # the concatenation grows quadratically, larger files take minutes
+                print(f'{cue_count:>10} {size_mb:>8.1f} {name:<24} {"skipped":>10}')
+                continue
+
+            out_file_path = os.path.join(work_dir, f'output_{cue_count}_{len(outputs)}.srt')
+            best_ms, peak_mb = measure(function=function, input_file_path=input_file_path,
+                                       out_file_path=out_file_path, repeats=repeats)
+            print(f'{cue_count:>10} {size_mb:>8.1f} {name:<24} {best_ms:>10.1f} {peak_mb:>9.2f}')
+            if function not in [run_subtitles, run_streaming]:
+                continue
+
+            f = open(out_file_path, 'r')
+            outputs.append(f.read())
+            f.close()
+
+        if len(set(outputs)) != 1:
+            print('Warning: The methods produced different output.')
+
+    for file_name in os.listdir(work_dir):
+        os.remove(os.path.join(work_dir, file_name))
+    os.rmdir(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks reading and writing large subtitle files.')
+    parser.add_argument('--cues', type=int, nargs='+', required=False, default=[5000, 20000, 200000],
+                        help='Number of cues of the generated subtitle files. One run per value.')
+    parser.add_argument('--repeats', type=int, required=False, default=3,
+                        help='Runs per method. The best time is reported.')
+    parser.add_argument('--legacy_max_cues', type=int, required=False, default=20000,
+                        help='Files with more cues are not run with the legacy parser and formatter.')
+    args = parser.parse_args()
+
+    main(cue_counts=args.cues, repeats=args.repeats, legacy_max_cues=args.legacy_max_cues)
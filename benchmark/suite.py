@@ -0,0 +1,419 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cue_chunker
+import gpt_model_interface
+import model_backend
+import subtitles
+from benchmark import corpus
+from util import distribution, log, token_estimator, utils
+
+# End to end benchmark of the translation pipeline, without network access or cost.
+# Every stage runs on the same synthetic subtitle file, in its own process, so its peak memory is measured alone:
+# - parse: reading all cues with the streaming reader
+# - format: writing all cues with the subtitle writer
+# - prompt: building the request of every API call (initial prompt, batch prompt, parameters)
+# - chunk: packing all cues into batches up to '--batch_tokens', first with an empty and then with a filled memo
+# - log: writing one log record per cue
+# - translate: translating a file with the fake backend, including batching, concurrency, retries and the writer
+# The results are saved as JSON, together with the commit they were measured on, and can be compared across commits.
+# Run from the project root: python -m benchmark.suite --cues 20000 --compare log/benchmark/<older result>.json
+stage_names: [str] = ['parse', 'format', 'prompt', 'chunk', 'log', 'translate']
+
+# reported by 'compare', for every stage that measured them. True means higher is better.
+_compared_metrics: {str: bool} = {'cues_per_second': True, 'tokens_per_cue': False, 'latency_p50_ms': False,
+                                  'latency_p95_ms': False, 'peak_rss_mb': False}
+
+
+class TimedBackend(model_backend.ModelBackend):
+
+    def __init__(self, backend: model_backend.ModelBackend) -> None:
+        # Records the wall time of every request sent to the wrapped backend, failed ones included
+        super().__init__()
+        self.backend: model_backend.ModelBackend = backend
+        self.latencies_ms: [float] = []
+        self.errors: int = 0
+        self._lock = threading.Lock()
+
+    def create(self, **parameters):
+        start_time = time.perf_counter_ns()
+        try:
+            return self.backend.create(**parameters)
+        except Exception:
+            self._record_error()
+            raise
+        finally:
+            self._record(start_time=start_time)
+
+    async def acreate(self, **parameters):
+        start_time = time.perf_counter_ns()
+        try:
+            return await self.backend.acreate(**parameters)
+        except Exception:
+            self._record_error()
+            raise
+        finally:
+            self._record(start_time=start_time)
+
+    def connection_pool(self):
+        return self.backend.connection_pool()
+
+    def stats_text(self) -> str:
+        return self.backend.stats_text()
+
+    def _record(self, start_time: int):
+        with self._lock:
+            self.latencies_ms.append((time.perf_counter_ns() - start_time) / 1_000_000)
+
+    def _record_error(self):
+        with self._lock:
+            self.errors = self.errors + 1
+
+
+def percentile(values: [float], share: float) -> float:
+    # Nearest rank percentile, 'share' between 0 and 1
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(share * len(ordered) + 0.999999)))
+    return ordered[rank - 1]
+
+
+def best_of(function, repeats: int) -> float:
+    # Returns the best time of all repeats in seconds
+    best_ns = None
+    for _ in range(max(1, repeats)):
+        start_time = time.perf_counter_ns()
+        function()
+        elapsed_ns = time.perf_counter_ns() - start_time
+        best_ns = elapsed_ns if best_ns is None else min(best_ns, elapsed_ns)
+    return best_ns / 1_000_000_000
+
+
+def run_parse(input_file_path: str, work_dir: str, args) -> {}:
+    cues = [0]
+
+    def parse():
+        cues[0] = sum(1 for _ in subtitles.read_lines(input_file_path=input_file_path))
+
+    seconds = best_of(function=parse, repeats=args.repeats)
+    return {'cues': cues[0], 'seconds': seconds}
+
+
+def run_format(input_file_path: str, work_dir: str, args) -> {}:
+    lines = list(subtitles.read_lines(input_file_path=input_file_path))
+    out_file_path = os.path.join(work_dir, 'format.srt')
+
+    def write():
+        writer = subtitles.SubtitleWriter(out_file_path=out_file_path)
+        for position in range(len(lines)):
+            writer.write(position=position, line=lines[position])
+        writer.finish()
+
+    seconds = best_of(function=write, repeats=args.repeats)
+    return {'cues': len(lines), 'seconds': seconds}
+
+
+def run_prompt(input_file_path: str, work_dir: str, args) -> {}:
+    spoken_lines = [line.spoken_line for line in subtitles.read_lines(input_file_path=input_file_path)]
+    batch_size = max(1, args.batch_size)
+    batch_mode = batch_size > 1
+    model = gpt_model_interface.TranslationGPT(api_key='offline', output_language='German',
+                                               output_country='Germany', batch_mode=batch_mode,
+                                               backend=model_backend.FakeBackend())
+    estimated_tokens = [0]
+
+    def build():
+        tokens = 0
+        for i in range(0, len(spoken_lines), batch_size):
+            batch = spoken_lines[i:i + batch_size]
+            prompt = gpt_model_interface.create_batch_prompt(lines=batch) if batch_mode else batch[0]
+            messages = [{'role': 'system', 'content': model.create_initial_prompt()},
+                        {'role': 'user', 'content': model._check_prompt(prompt=prompt)}]
+            model._create_request_parameters(messages=messages, temperature=0.6, top_p=0.2,
+                                             frequency_penalty=0.0, presence_penalty=0.0)
+            tokens = tokens + gpt_model_interface.estimate_request_tokens(messages=messages)
+        estimated_tokens[0] = tokens
+
+    seconds = best_of(function=build, repeats=args.repeats)
+    model.archive.close()
+    return {'cues': len(spoken_lines), 'seconds': seconds, 'requests': -(-len(spoken_lines) // batch_size),
+            'tokens_per_cue': estimated_tokens[0] / max(1, len(spoken_lines))}
+
+
+def run_chunk(input_file_path: str, work_dir: str, args) -> {}:
+    lines = list(subtitles.read_lines(input_file_path=input_file_path))
+    estimator = token_estimator.TokenEstimator()
+    chunks = []
+
+    def pack():
+        chunks[:] = cue_chunker.create_chunks(lines=lines, max_cues=args.batch_size if args.batch_size > 1 else -1,
+                                              token_budget=args.batch_tokens,
+                                              estimator=estimator)
+
+    # the first run tokenizes every cue, later runs read the memo
+    start_time = time.perf_counter()
+    pack()
+    cold_seconds = time.perf_counter() - start_time
+    seconds = best_of(function=pack, repeats=args.repeats)
+    stats = cue_chunker.chunk_stats(lines=lines, chunks=chunks, estimator=estimator)
+    return {'cues': len(lines), 'seconds': seconds, 'cold_seconds': cold_seconds, 'requests': len(chunks),
+            'tokens_per_request': stats['average_tokens'], 'tokenizer': estimator.tokenizer_name()}
+
+
+def run_log(input_file_path: str, work_dir: str, args) -> {}:
+    spoken_lines = [line.spoken_line for line in subtitles.read_lines(input_file_path=input_file_path)]
+
+    def write():
+        for i in range(len(spoken_lines)):
+            log.write(f'Translated line #{i}: "{spoken_lines[i]}"', print_to_console=False)
+        log.flush()
+
+    seconds = best_of(function=write, repeats=args.repeats)
+    return {'cues': len(spoken_lines), 'seconds': seconds}
+
+
+def run_translate(input_file_path: str, work_dir: str, args) -> {}:
+    # imported here, the translator pulls in dependencies the other stages do not need
+    import translator
+
+    translate_dir = os.path.join(work_dir, 'translate')
+    out_dir = os.path.join(work_dir, 'translate_out')
+    os.makedirs(translate_dir, exist_ok=True)
+    os.makedirs(out_dir, exist_ok=True)
+    translate_file_path = os.path.join(translate_dir, 'benchmark.srt')
+    corpus.create_srt_file(file_path=translate_file_path, cue_count=args.translate_cues,
+                           words_per_line=distribution.Distribution.parse(args.words),
+                           two_line_share=args.two_line_share, seed=args.seed)
+
+    fake_backend = model_backend.FakeBackend(latency=distribution.Distribution.parse(args.latency),
+                                             rate_limit_probability=args.rate_limit, seed=args.seed)
+    backend = TimedBackend(backend=fake_backend)
+
+    start_time = time.perf_counter_ns()
+    translator.main(api_key_file_path=None, file_list=[translate_file_path], out_dir=out_dir,
+                    country_alpha_2='de', language_alpha_2='de', output_country='Germany', output_language='German',
+                    delay=0.0, concurrency=args.concurrency, batch_size=args.batch_size, overwrite=True,
+                    max_retries=args.max_retries, backend=backend)
+    seconds = (time.perf_counter_ns() - start_time) / 1_000_000_000
+
+    usage = fake_backend.usage.to_dict()
+    out_file_path = os.path.join(out_dir, os.listdir(out_dir)[0])
+    translated_cues = sum(1 for _ in subtitles.read_lines(input_file_path=out_file_path))
+    return {'cues': translated_cues, 'seconds': seconds, 'requests': usage['requests'],
+            'rate_limited': usage['rate_limited'], 'failed_requests': backend.errors,
+            'prompt_tokens': usage['prompt_tokens'], 'completion_tokens': usage['completion_tokens'],
+            'tokens_per_cue': usage['total_tokens'] / max(1, translated_cues),
+            'latency_p50_ms': percentile(values=backend.latencies_ms, share=0.5),
+            'latency_p95_ms': percentile(values=backend.latencies_ms, share=0.95)}
+
+
+_stage_functions = {'parse': run_parse, 'format': run_format, 'prompt': run_prompt, 'chunk': run_chunk, 'log': run_log,
+                    'translate': run_translate}
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS, in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def run_stage(args):
+    # Runs in its own process. Log files and outputs go to the work directory.
+    log.set_log_dir(args.work_dir)
+    result = _stage_functions[args.stage](input_file_path=args.input, work_dir=args.work_dir, args=args)
+    log.shutdown()
+
+    result['stage'] = args.stage
+    result['cues_per_second'] = result['cues'] / result['seconds'] if result['seconds'] > 0 else None
+    result['peak_rss_mb'] = peak_rss_mb()
+
+    f = open(args.result_file, 'w', encoding='utf-8')
+    json.dump(result, f)
+    f.close()
+
+
+def run_stage_process(stage: str, input_file_path: str, work_dir: str, args) -> {}:
+    stage_dir = os.path.join(work_dir, stage)
+    os.makedirs(stage_dir, exist_ok=True)
+    result_file = os.path.join(stage_dir, 'result.json')
+
+    command = [sys.executable, '-m', 'benchmark.suite', '--stage', stage, '--input', input_file_path,
+               '--work_dir', stage_dir, '--result_file', result_file]
+    for name in ['words', 'two_line_share', 'translate_cues', 'concurrency', 'batch_size', 'batch_tokens', 'latency',
+                 'rate_limit', 'max_retries', 'repeats', 'seed']:
+        command = command + [f'--{name}', str(getattr(args, name))]
+
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if process.returncode != 0 or not os.path.exists(result_file):
+        print(process.stdout)
+        raise Exception(f'Benchmark stage "{stage}" failed with exit code {process.returncode}.')
+
+    f = open(result_file, 'r', encoding='utf-8')
+    result = json.load(f)
+    f.close()
+    return result
+
+
+def git_commit() -> {}:
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=project_dir, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=project_dir,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit, 'dirty': status != ''}
+
+
+def format_value(value) -> str:
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.1f}' if value >= 10 else f'{value:.3f}'
+    return str(value)
+
+
+def print_results(results: [{}]):
+    print(f'{"stage":<10} {"cues":>8} {"seconds":>9} {"cues/s":>11} {"tokens/cue":>11} {"p50 ms":>8} '
+          f'{"p95 ms":>8} {"peak RSS MB":>12}')
+    for r in results:
+        print(f'{r["stage"]:<10} {r["cues"]:>8} {format_value(r["seconds"]):>9} '
+              f'{format_value(r["cues_per_second"]):>11} {format_value(r.get("tokens_per_cue", None)):>11} '
+              f'{format_value(r.get("latency_p50_ms", None)):>8} {format_value(r.get("latency_p95_ms", None)):>8} '
+              f'{format_value(r["peak_rss_mb"]):>12}')
+
+
+def compare(report: {}, baseline_file_path: str):
+    # Prints the ratio of every metric to the baseline. Above 1 is better, below 1 is worse.
+    f = open(baseline_file_path, 'r', encoding='utf-8')
+    baseline = json.load(f)
+    f.close()
+
+    baseline_commit = str(baseline.get('environment', {}).get('commit', None))[:10]
+    print(f'Compared to {os.path.basename(baseline_file_path)} (commit {baseline_commit}), '
+          f'higher is better:')
+    baseline_stages = {r['stage']: r for r in baseline.get('stages', [])}
+    for r in report['stages']:
+        old = baseline_stages.get(r['stage'], None)
+        if old is None:
+            continue
+        ratios = []
+        for metric, higher_is_better in _compared_metrics.items():
+            new_value = r.get(metric, None)
+            old_value = old.get(metric, None)
+            if new_value is None or old_value is None or new_value <= 0 or old_value <= 0:
+                continue
+            ratio = new_value / old_value if higher_is_better else old_value / new_value
+            ratios.append(f'{metric} x{ratio:.2f}')
+        print(f'{r["stage"]:<10} ' + ', '.join(ratios))
+
+
+def main(args):
+    stages = args.stages if args.stages is not None else stage_names
+    for stage in stages:
+        if stage not in stage_names:
+            raise AttributeError(f'Unknown stage: "{stage}". Choose from: {", ".join(stage_names)}.')
+
+    work_dir = tempfile.mkdtemp(prefix='benchmark_suite_')
+    try:
+        input_file_path = os.path.join(work_dir, 'input.srt')
+        corpus.create_srt_file(file_path=input_file_path, cue_count=args.cues,
+                               words_per_line=distribution.Distribution.parse(args.words),
+                               two_line_share=args.two_line_share, seed=args.seed)
+
+        results = []
+        for stage in stages:
+            print(f'Running stage: {stage}')
+            results.append(run_stage_process(stage=stage, input_file_path=input_file_path, work_dir=work_dir,
+                                             args=args))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    environment = git_commit()
+    environment['python'] = platform.python_version()
+    environment['platform'] = platform.platform()
+    environment['cpu_count'] = os.cpu_count()
+    report = {
+        'timestamp': utils.gct(),
+        'environment': environment,
+        'parameters': {'cues': args.cues, 'words': args.words, 'two_line_share': args.two_line_share,
+                       'translate_cues': args.translate_cues, 'concurrency': args.concurrency,
+                       'batch_size': args.batch_size, 'batch_tokens': args.batch_tokens, 'latency': args.latency,
+                       'rate_limit': args.rate_limit, 'max_retries': args.max_retries, 'repeats': args.repeats,
+                       'seed': args.seed},
+        'stages': results
+    }
+    print_results(results=results)
+
+    out_file_path = args.out
+    if out_file_path is None:
+        commit = str(environment['commit'])[:10]
+        out_file_path = log.log_dir_base + os.path.join('log', 'benchmark',
+                                                        f'suite-{time.strftime("%Y%m%d-%H%M%S")}-{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out_file_path)), exist_ok=True)
+    f = open(out_file_path, 'w', encoding='utf-8')
+    json.dump(report, f, indent=2)
+    f.close()
+    print(f'Results saved to: {out_file_path}')
+
+    if args.compare is not None:
+        compare(report=report, baseline_file_path=args.compare)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks every stage of the translation pipeline offline.')
+    parser.add_argument('--cues', type=int, required=False, default=20000,
+                        help='Number of cues of the generated subtitle file.')
+    parser.add_argument('--words', type=str, required=False, default='uniform:3,9',
+                        help='Words per text line. A number or a distribution, e.g. "normal:6,2.5".')
+    parser.add_argument('--two_line_share', type=float, required=False, default=0.5,
+                        help='Share of cues with two text lines, between 0 and 1.')
+    parser.add_argument('--translate_cues', type=int, required=False, default=2000,
+                        help='Number of cues translated by the translate stage.')
+    parser.add_argument('-c', '--concurrency', type=int, required=False, default=16,
+                        help='API calls in flight during the translate stage.')
+    parser.add_argument('-b', '--batch_size', type=int, required=False, default=1,
+                        help='Lines per API call during the prompt and translate stages.')
+    parser.add_argument('-bt', '--batch_tokens', type=int, required=False, default=800,
+                        help='Maximum tokens of the lines of an API call during the chunk stage.')
+    parser.add_argument('--latency', type=str, required=False, default='lognormal:0.05,0.5',
+                        help='Seconds the fake backend takes to answer. A number or a distribution.')
+    parser.add_argument('--rate_limit', type=float, required=False, default=0.0,
+                        help='Share of API calls answered with a rate limit error, between 0 and 1.')
+    parser.add_argument('--max_retries', type=int, required=False, default=8,
+                        help='Maximum number of retries of a failed API call.')
+    parser.add_argument('--repeats', type=int, required=False, default=3,
+                        help='Runs of the parse, format, prompt, chunk and log stages. The best time is reported.')
+    parser.add_argument('--seed', type=int, required=False, default=42,
+                        help='Seed of the generated file, the latencies and the rate limit errors.')
+    parser.add_argument('--stages', type=str, nargs='+', required=False,
+                        help=f'Stages to run. If empty, all are run: {", ".join(stage_names)}.')
+    parser.add_argument('--out', type=str, required=False,
+                        help='File to save the results in. If empty, a new file in "log/benchmark/" is used.')
+    parser.add_argument('--compare', type=str, required=False,
+                        help='Results of an earlier run, to compare against.')
+
+    # used by the process of a single stage
+    parser.add_argument('--stage', type=str, required=False, help=argparse.SUPPRESS)
+    parser.add_argument('--input', type=str, required=False, help=argparse.SUPPRESS)
+    parser.add_argument('--work_dir', type=str, required=False, help=argparse.SUPPRESS)
+    parser.add_argument('--result_file', type=str, required=False, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage is not None:
+        run_stage(args=args)
+    else:
+        main(args=args)
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+
+import subtitles
+from util import log, utils
+
+# The journal is synced to disk after this many lines or seconds, whichever comes first.
+# Syncing after every line would cost a disk round trip per line.
+_flush_interval_lines: int = 32
+_flush_interval_seconds: float = 5.0
+
+
+def line_fingerprint(text: str) -> str:
+    # Identifies the source text of a line, so journal entries are never applied to a different line
+    return str(utils.string_to_deterministic_hash(data=text))
+
+
+class TranslationJournal:
+
+    def __init__(self,
+                 journal_file_path: str,
+                 flush_interval_lines: int = _flush_interval_lines,
+                 flush_interval_seconds: float = _flush_interval_seconds) -> None:
+        super().__init__()
+        assert journal_file_path is not None
+
+        self.journal_file_path: str = str(journal_file_path)
+        self.flush_interval_lines: int = int(flush_interval_lines)
+        self.flush_interval_seconds: float = float(flush_interval_seconds)
+
+        self._lock = threading.Lock()
+        self._buffer: [str] = []
+        self._last_flush: float = time.monotonic()
+        self._file = None
+
+    def restore(self, subs: subtitles.Subtitles) -> [int]:
+        # Applies all translations found in the journal to the given subtitles.
+        # Returns the positions of all lines that still need to be translated.
+        fingerprints = [line_fingerprint(text=line.spoken_line) for line in subs.lines]
+        restored = 0
+
+        if os.path.exists(self.journal_file_path):
+            f = open(self.journal_file_path, 'r', encoding='utf-8')
+            for journal_line in f:
+                try:
+                    entry = json.loads(journal_line)
+                except ValueError:
+                    # The last entry may be incomplete, if the previous run was killed while writing it
+                    continue
+
+                position = int(entry['position'])
+                if position < len(subs) and fingerprints[position] == entry['source']:
+                    subs[position].spoken_line = entry['translation']
+                    fingerprints[position] = None
+                    restored = restored + 1
+            f.close()
+
+        if restored > 0:
+            log.write(f'Restored {restored} translated lines from: {self.journal_file_path}')
+
+        return [i for i in range(len(fingerprints)) if fingerprints[i] is not None]
+
+    def record(self, position: int, source_text: str, translation: str):
+        entry = json.dumps({
+            'position': int(position),
+            'source': line_fingerprint(text=source_text),
+            'translation': translation
+        })
+
+        with self._lock:
+            self._buffer.append(entry)
+            if len(self._buffer) >= self.flush_interval_lines or \
+                    time.monotonic() - self._last_flush >= self.flush_interval_seconds:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if len(self._buffer) == 0:
+            return
+
+        if self._file is None:
+            self._file = open(self.journal_file_path, 'a', encoding='utf-8')
+
+        self._file.write('\n'.join(self._buffer) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer = []
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def remove(self):
+        # Called once the translated file is saved. The journal is not needed anymore.
+        self.close()
+        if os.path.exists(self.journal_file_path):
+            os.remove(self.journal_file_path)
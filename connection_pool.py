@@ -0,0 +1,201 @@
+import threading
+import time
+
+import aiohttp
+import openai
+import requests
+import requests.adapters
+
+# Pooled HTTP connections of the openAI backend, kept alive between requests.
+# Without a pool, openAI opens a new aiohttp session (and connection, with a TLS handshake) for every async request.
+# HTTP/2 is not available: The openAI library sends its requests with 'requests' and 'aiohttp', both HTTP/1.1 only.
+DEFAULT_MAX_CONNECTIONS: int = 100
+DEFAULT_KEEPALIVE_SECONDS: float = 30.0
+DEFAULT_CONNECT_TIMEOUT: float = 10.0
+# the default of the openAI library
+DEFAULT_READ_TIMEOUT: float = 600.0
+
+
+class PoolStats:
+
+    def __init__(self) -> None:
+        # Updated by the requests of all threads and event loops
+        super().__init__()
+        self._lock = threading.Lock()
+        self.requests: int = 0
+        self.connections_created: int = 0
+        self.connections_reused: int = 0
+        self.connect_seconds: float = 0.0
+        self.waits: int = 0
+        self.wait_seconds: float = 0.0
+
+    def record_request(self):
+        with self._lock:
+            self.requests = self.requests + 1
+
+    def record_connection(self, seconds: float):
+        with self._lock:
+            self.connections_created = self.connections_created + 1
+            self.connect_seconds = self.connect_seconds + seconds
+
+    def record_reuse(self):
+        with self._lock:
+            self.connections_reused = self.connections_reused + 1
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.waits = self.waits + 1
+            self.wait_seconds = self.wait_seconds + seconds
+
+    def reuse_ratio(self) -> float:
+        # Share of requests sent over a connection that was already open
+        connections = self.connections_created + self.connections_reused
+        if connections == 0:
+            return None
+        return round(self.connections_reused / connections, 4)
+
+    def to_dict(self) -> {}:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'connections_created': self.connections_created,
+                'connections_reused': self.connections_reused,
+                'reuse_ratio': self.reuse_ratio(),
+                'connect_seconds': round(self.connect_seconds, 6),
+                'average_connect_ms': round(self.connect_seconds * 1000 / self.connections_created, 3)
+                if self.connections_created > 0 else None,
+                'waits_for_connection': self.waits,
+                'wait_seconds': round(self.wait_seconds, 6)
+            }
+
+    def text(self) -> str:
+        d = self.to_dict()
+        return f'{d["requests"]} requests over {d["connections_created"]} new connections ' \
+               f'(reuse ratio {d["reuse_ratio"]}, {d["connect_seconds"]:.3f}s connecting, ' \
+               f'{d["waits_for_connection"]} waits for a free connection, {d["wait_seconds"]:.3f}s waiting)'
+
+
+class ConnectionPool:
+
+    def __init__(self,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 keepalive_seconds: float = DEFAULT_KEEPALIVE_SECONDS,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 enabled: bool = True) -> None:
+        # At most 'max_connections' are open at the same time, further requests wait for a free one.
+        # Idle connections are closed after 'keepalive_seconds'.
+        # If not 'enabled', the openAI library handles its connections itself (used for comparisons).
+        super().__init__()
+        if int(max_connections) < 1:
+            raise AttributeError(f'Illegal maximum connections: {max_connections}. At least one is needed.')
+
+        self.max_connections: int = int(max_connections)
+        self.keepalive_seconds: float = float(keepalive_seconds)
+        self.connect_timeout: float = float(connect_timeout)
+        self.read_timeout: float = float(read_timeout)
+        self.enabled: bool = bool(enabled)
+        self.stats = PoolStats()
+
+        self._sync_session: requests.Session = None
+        self._sync_lock = threading.Lock()
+
+    def request_timeout(self) -> [float, float]:
+        # Passed with every request: seconds to connect, and seconds until the whole response is received
+        return self.connect_timeout, self.read_timeout
+
+    def install_sync_session(self):
+        # openAI reads the session of blocking requests from a global, once per thread
+        if not self.enabled:
+            return
+        with self._sync_lock:
+            if self._sync_session is None:
+                self._sync_session = self._create_sync_session()
+            openai.requestssession = self._sync_session
+
+    def collect_sync_connections(self) -> [int, int]:
+        # Blocking requests are counted by the connection pools of urllib3, which are read on demand
+        if self._sync_session is None:
+            return 0, 0
+        connections = 0
+        requests_sent = 0
+        # the same adapter is mounted for http and https
+        adapters = {id(adapter): adapter for adapter in self._sync_session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                connections = connections + pool.num_connections
+                requests_sent = requests_sent + pool.num_requests
+        return connections, requests_sent
+
+    def create_async_session(self) -> aiohttp.ClientSession:
+        # aiohttp sessions belong to an event loop, so every loop needs its own.
+        # Their connections are counted by tracing.
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_queued_start.append(self._on_start)
+        trace_config.on_connection_queued_end.append(self._on_queued_end)
+        trace_config.on_connection_create_start.append(self._on_start)
+        trace_config.on_connection_create_end.append(self._on_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_reuse)
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_seconds)
+        return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+
+    def stats_to_dict(self) -> {}:
+        d = self.stats.to_dict()
+        connections, requests_sent = self.collect_sync_connections()
+        if requests_sent > 0:
+            d['sync_requests'] = requests_sent
+            d['sync_connections_created'] = connections
+            d['sync_reuse_ratio'] = round(1 - connections / requests_sent, 4)
+        d['max_connections'] = self.max_connections
+        d['enabled'] = self.enabled
+        return d
+
+    def stats_text(self) -> str:
+        # Returns None, if no request was sent yet
+        texts = []
+        if self.stats.requests > 0:
+            texts.append(self.stats.text())
+        connections, requests_sent = self.collect_sync_connections()
+        if requests_sent > 0:
+            texts.append(f'{requests_sent} blocking requests over {connections} connections')
+        if len(texts) == 0:
+            return None
+        return ', '.join(texts)
+
+    def close(self):
+        with self._sync_lock:
+            if self._sync_session is not None:
+                if openai.requestssession is self._sync_session:
+                    openai.requestssession = None
+                self._sync_session.close()
+                self._sync_session = None
+
+    def _create_sync_session(self) -> requests.Session:
+        # like the session of openAI, with a pool of the configured size that blocks once every connection is used
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self.max_connections,
+                                                pool_block=True, max_retries=2)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    async def _on_request_start(self, session, context, params):
+        self.stats.record_request()
+
+    async def _on_start(self, session, context, params):
+        context.start_time = time.perf_counter()
+
+    async def _on_queued_end(self, session, context, params):
+        self.stats.record_wait(seconds=time.perf_counter() - context.start_time)
+
+    async def _on_create_end(self, session, context, params):
+        self.stats.record_connection(seconds=time.perf_counter() - context.start_time)
+
+    async def _on_reuse(self, session, context, params):
+        self.stats.record_reuse()
@@ -0,0 +1,109 @@
+import subtitles
+from util import token_estimator
+
+# Packs consecutive cues into chunks, every chunk is sent as one batched request.
+# A chunk is closed once it holds 'max_cues' cues, once the next cue exceeds the token budget
+# or once the next cue starts a new scene.
+# Scenes are separated by gaps in the timing: Lines after a long pause rarely continue the previous dialogue,
+# so they are not translated together with it.
+DEFAULT_SCENE_GAP_MS: int = 5000
+# tokens of the numbering of every cue in the batch prompt (e.g. '[12] ') and its line break
+_entry_tokens: int = 3
+
+
+def scene_starts(lines: [subtitles.Line], gap_ms: int = DEFAULT_SCENE_GAP_MS) -> {int}:
+    # Returns the positions of the lines that start a new scene, besides the first one.
+    # A value of 'gap_ms' below one disables scenes.
+    starts = set()
+    if gap_ms < 1:
+        return starts
+    for i in range(1, len(lines)):
+        if lines[i].start_ms - lines[i - 1].end_ms >= gap_ms:
+            starts.add(i)
+    return starts
+
+
+def scene_numbers(lines: [subtitles.Line], gap_ms: int = DEFAULT_SCENE_GAP_MS) -> [int]:
+    # Returns the scene of every line, counted from the start of the file
+    starts = scene_starts(lines=lines, gap_ms=gap_ms)
+    numbers = []
+    scene = 0
+    for i in range(len(lines)):
+        if i in starts:
+            scene = scene + 1
+        numbers.append(scene)
+    return numbers
+
+
+def cue_tokens(line: subtitles.Line, estimator: token_estimator.TokenEstimator = None) -> int:
+    # Tokens of the cue inside a batch prompt
+    if estimator is None:
+        estimator = token_estimator.default_estimator()
+    return estimator.count(line.spoken_line) + _entry_tokens
+
+
+def create_chunks(lines: [subtitles.Line],
+                  indices: [int] = None,
+                  max_cues: int = -1,
+                  token_budget: int = -1,
+                  scene_gap_ms: int = DEFAULT_SCENE_GAP_MS,
+                  estimator: token_estimator.TokenEstimator = None) -> [[int]]:
+    # Groups the line indices into chunks, greedily and in order. If 'indices' is None, all lines are grouped.
+    # Values of 'max_cues' and 'token_budget' below one disable the respective limit.
+    # A single cue above the budget still gets a chunk of its own.
+    if max_cues < 1 and token_budget <= 0:
+        raise AttributeError('Chunks need a maximum number of cues or a token budget.')
+    if indices is None:
+        indices = range(len(lines))
+    if estimator is None:
+        estimator = token_estimator.default_estimator()
+    scenes = scene_numbers(lines=lines, gap_ms=scene_gap_ms)
+
+    chunks = []
+    current_chunk = []
+    current_tokens = 0
+    current_scene = 0
+
+    for i in indices:
+        tokens = cue_tokens(line=lines[i], estimator=estimator)
+        chunk_full = 0 < max_cues <= len(current_chunk)
+        budget_exceeded = token_budget > 0 and current_tokens + tokens > token_budget
+        new_scene = scenes[i] != current_scene
+
+        if len(current_chunk) > 0 and (chunk_full or budget_exceeded or new_scene):
+            chunks.append(current_chunk)
+            current_chunk = []
+            current_tokens = 0
+
+        current_chunk.append(i)
+        current_tokens = current_tokens + tokens
+        current_scene = scenes[i]
+
+    if len(current_chunk) > 0:
+        chunks.append(current_chunk)
+
+    return chunks
+
+
+def chunk_stats(lines: [subtitles.Line],
+                chunks: [[int]],
+                estimator: token_estimator.TokenEstimator = None) -> {}:
+    # How evenly the chunks are packed, for logs and the run report
+    if estimator is None:
+        estimator = token_estimator.default_estimator()
+    tokens = [sum([cue_tokens(line=lines[i], estimator=estimator) for i in chunk]) for chunk in chunks]
+    if len(chunks) == 0:
+        return {'chunks': 0, 'cues': 0, 'tokens': 0, 'average_tokens': None, 'max_tokens': None}
+    return {
+        'chunks': len(chunks),
+        'cues': sum([len(chunk) for chunk in chunks]),
+        'tokens': sum(tokens),
+        'average_tokens': round(sum(tokens) / len(chunks), 1),
+        'max_tokens': max(tokens)
+    }
+
+
+def chunk_stats_text(lines: [subtitles.Line], chunks: [[int]]) -> str:
+    stats = chunk_stats(lines=lines, chunks=chunks)
+    return f'Packed {stats["cues"]} lines into {stats["chunks"]} batches of {stats["average_tokens"]} tokens ' \
+           f'on average, {stats["max_tokens"]} at most.'
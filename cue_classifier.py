@@ -0,0 +1,164 @@
+import re
+
+import subtitles
+from util import log, utils
+
+# Cues that need no model call are passed through as they are:
+# - 'symbols': Only punctuation, music notes, numbers or formatting tags (e.g. "♪", "...", "<i>-</i>", "1984")
+# - 'speaker': Only a speaker tag (e.g. "JOHN:", "- MAN 2:")
+# - 'target_language': Already written in the language to translate into
+REASON_SYMBOLS: str = 'symbols'
+REASON_SPEAKER: str = 'speaker'
+REASON_TARGET_LANGUAGE: str = 'target_language'
+
+# HTML-style tags ('<i>', '</font>') and ASS override tags ('{\an8}') used for formatting
+_tag_pattern = re.compile(r'<[^<>\n]*>|\{\\[^{}\n]*\}')
+_line_tags_pattern = re.compile(r'^((?:\s*(?:<[^<>\n]*>|\{\\[^{}\n]*\}))*\s*)(.*?)((?:\s*</?[^<>\n]*>)*\s*)$',
+                                flags=re.DOTALL)
+_letter_pattern = re.compile(r'[^\W\d_]')
+_word_pattern = re.compile(r'[^\W\d_]+')
+_speaker_pattern = re.compile(r'^-?\s*[A-Z][A-Z0-9 .\'-]{0,30}:$')
+
+# The most frequent words of every language. A cue is in a language, if enough of its words are among them.
+# Words shared by multiple languages count for all of them, so only a clear lead decides.
+_frequent_words: {str: set} = {
+    'en': set('the and you that was for are with his they this have from not but what all were when your can '
+              'there been one will would has how she him her them into just like know about yes'.split()),
+    'de': set('der die das und ist nicht ich sie mit den ein eine auch auf sich wir ihr mir dich dir was wie '
+              'hat haben sind aber noch nur schon jetzt hier kann bin bist doch ja nein'.split()),
+    'fr': set('le la les et est une des pas que qui dans pour vous nous sur avec mais sont ont fait elle ils '
+              'mon ton son suis êtes était oui non très bien ici'.split()),
+    'es': set('el los las que por una con para del pero más está como sus este esta muy también hay nos '
+              'qué sí estoy eres tengo tiene puedo ahora aquí'.split()),
+    'it': set('il lo gli che per una con del della sono non più come anche questo questa ho hai abbiamo '
+              'sei siamo cosa perché qui adesso molto bene'.split()),
+    'pt': set('os que para uma com não mais como mas foi ele ela seu sua isso está você estou tem são '
+              'muito aqui agora sim também'.split()),
+    'nl': set('de het een en van ik je dat die niet met zijn op voor maar wat heb hij zij wij ook nog '
+              'hier nu ja nee kan moet'.split())
+}
+_language_min_words: int = 3
+_language_min_share: float = 0.4
+
+
+def mask_tags(text: str) -> [str, [[str, str]]]:
+    # Removes the formatting tags around every line of the text, so they are not sent to the model.
+    # Returns the text and the tags of every line. Tags within a line are kept, the tags are None then.
+    lines = str(text).split('\n')
+    tags = []
+    masked_lines = []
+    for line in lines:
+        match = _line_tags_pattern.match(line)
+        if match is None or _tag_pattern.search(match.group(2)) is not None:
+            return text, None
+        tags.append((match.group(1), match.group(3)))
+        masked_lines.append(match.group(2))
+
+    if all([prefix == '' and suffix == '' for prefix, suffix in tags]):
+        return text, None
+    return '\n'.join(masked_lines), tags
+
+
+def restore_tags(translation: str, tags: [[str, str]]) -> str:
+    # Puts the tags of 'mask_tags' back around the translated lines
+    if tags is None or translation is None:
+        return translation
+
+    lines = str(translation).split('\n')
+    if len(lines) == len(tags):
+        return '\n'.join([tags[i][0] + lines[i] + tags[i][1] for i in range(len(lines))])
+    if all([t == tags[0] for t in tags]):
+        # every line is formatted the same way, e.g. in italics
+        return '\n'.join([tags[0][0] + line + tags[0][1] for line in lines])
+    # the model joined or split lines: the outermost tags still enclose the whole cue
+    return tags[0][0] + '\n'.join(lines) + tags[-1][1]
+
+
+def strip_tags(text: str) -> str:
+    return _tag_pattern.sub('', str(text))
+
+
+def detect_frequent_language(text: str) -> str:
+    # Returns the alpha 2 code of the language most words of the text belong to, or None if unsure
+    words = _word_pattern.findall(str(text).lower())
+    if len(words) < _language_min_words:
+        return None
+
+    scores = {language: sum([1 for w in words if w in frequent]) for language, frequent in _frequent_words.items()}
+    best_language = max(scores, key=scores.get)
+    best_score = scores[best_language]
+    if best_score / len(words) < _language_min_share:
+        return None
+    if len([score for score in scores.values() if score == best_score]) > 1:
+        return None
+    return best_language
+
+
+class CueClassifier:
+
+    def __init__(self,
+                 target_language_alpha_2: str = None,
+                 prompt_tokens_per_call: int = 0,
+                 lines_per_call: int = 1) -> None:
+        # Finds the cues that can be passed through without a model call.
+        # Cues already in the target language are only found for languages with a list of frequent words.
+        super().__init__()
+        self.target_language: str = str(target_language_alpha_2).lower() \
+            if target_language_alpha_2 is not None else None
+        self.prompt_tokens_per_call: int = int(prompt_tokens_per_call)
+        self.lines_per_call: int = max(1, int(lines_per_call))
+
+        # statistics
+        self.skipped: {str: int} = {REASON_SYMBOLS: 0, REASON_SPEAKER: 0, REASON_TARGET_LANGUAGE: 0}
+        self.tokens_saved: int = 0
+
+    def reason(self, text: str) -> str:
+        # Returns why the cue needs no translation, or None if it needs one
+        text = strip_tags(text).strip()
+        if _letter_pattern.search(text) is None:
+            return REASON_SYMBOLS
+        if _speaker_pattern.match(text) is not None:
+            return REASON_SPEAKER
+        if self.target_language in _frequent_words and detect_frequent_language(text) == self.target_language:
+            return REASON_TARGET_LANGUAGE
+        return None
+
+    def classify(self, subs: subtitles.Subtitles, pending: [int]) -> [{int: str}, [int], int]:
+        # Returns the positions to pass through with their reason, the positions still to translate
+        # and the estimated tokens saved
+        skipped = {}
+        remaining = []
+        for position in pending:
+            reason = self.reason(subs[position].spoken_line)
+            if reason is None:
+                remaining.append(position)
+            else:
+                skipped[position] = reason
+
+        tokens_saved = 0
+        for position, reason in skipped.items():
+            # The text is sent and about as many tokens are returned. Batches share the initial prompt.
+            tokens_saved = tokens_saved + 2 * utils.estimate_tokens(subs[position].spoken_line) + \
+                self.prompt_tokens_per_call // self.lines_per_call
+            self.skipped[reason] = self.skipped[reason] + 1
+        self.tokens_saved = self.tokens_saved + tokens_saved
+
+        if len(skipped) > 0:
+            log.write(f'{len(skipped)} of {len(pending)} lines need no translation and are kept as they are.',
+                      print_to_console=False)
+        return skipped, remaining, tokens_saved
+
+    def skipped_total(self) -> int:
+        return sum(self.skipped.values())
+
+    def stats_text(self) -> str:
+        return f'{self.skipped_total()} lines needed no translation ({self.skipped[REASON_SYMBOLS]} symbols, ' \
+               f'{self.skipped[REASON_SPEAKER]} speaker tags, {self.skipped[REASON_TARGET_LANGUAGE]} already ' \
+               f'translated), saving about {self.tokens_saved} tokens'
+
+    def to_dict(self) -> {}:
+        return {
+            'skipped': self.skipped_total(),
+            'skipped_by_reason': dict(self.skipped),
+            'estimated_tokens_saved': self.tokens_saved
+        }
@@ -0,0 +1,122 @@
+import re
+
+import subtitles
+from util import log, utils
+
+# Subtitles repeat a lot of cues exactly: "No.", "What?", song lyrics, recurring sound tags.
+# Only the first occurrence of every source text is sent to the model. Its translation is copied to every repeat.
+# Texts are compared after collapsing whitespace and line breaks. Case and punctuation are kept, as they change
+# the translation ("NO!" is not "no.").
+_whitespace_pattern = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    return _whitespace_pattern.sub(' ', str(text)).strip()
+
+
+class FileDuplicates:
+
+    def __init__(self, subs: subtitles.Subtitles, pending: [int], known: {str: str} = None) -> None:
+        # Groups the pending positions of a file by their source text.
+        # Texts found in 'known' (translated in earlier files) are not translated again.
+        super().__init__()
+        assert subs is not None
+        assert pending is not None
+
+        # positions still to translate, one per source text
+        self.pending: [int] = []
+        # repeats of every position to translate, which receive its translation once it is done
+        self.copies: {int: [int]} = {}
+        # normalized source text of every position to translate
+        self.keys: {int: str} = {}
+        # translations of positions found in 'known'
+        self.resolved: {int: str} = {}
+
+        first_positions: {str: int} = {}
+        for position in pending:
+            key = normalize_text(subs[position].spoken_line)
+            if known is not None and key in known:
+                self.resolved[position] = known[key]
+                continue
+
+            first_position = first_positions.get(key, None)
+            if first_position is None:
+                first_positions[key] = position
+                self.pending.append(position)
+                self.keys[position] = key
+            else:
+                self.copies.setdefault(first_position, []).append(position)
+
+    def repeat_count(self) -> int:
+        return sum([len(positions) for positions in self.copies.values()])
+
+    def copy_count(self, positions: [int]) -> int:
+        # Number of repeats of the given positions
+        return sum([len(self.copies.get(position, [])) for position in positions])
+
+    def with_copies(self, position: int) -> [int]:
+        return [position] + self.copies.get(position, [])
+
+
+class SourceIndex:
+
+    def __init__(self, across_files: bool = False, prompt_tokens_per_call: int = 0, lines_per_call: int = 1) -> None:
+        # Deduplicates every file of a run. If 'across_files', translations of finished files are reused as well.
+        # The tokens and API calls saved are estimated like the requests would have been sent.
+        super().__init__()
+        self.across_files: bool = bool(across_files)
+        self.prompt_tokens_per_call: int = int(prompt_tokens_per_call)
+        self.lines_per_call: int = max(1, int(lines_per_call))
+        self.known: {str: str} = {}
+
+        # statistics
+        self.cues_checked: int = 0
+        self.repeats: int = 0
+        self.reused: int = 0
+        self.tokens_saved: int = 0
+
+    def deduplicate(self, subs: subtitles.Subtitles, pending: [int]) -> FileDuplicates:
+        duplicates = FileDuplicates(subs=subs, pending=pending, known=self.known if self.across_files else None)
+
+        self.cues_checked = self.cues_checked + len(pending)
+        self.repeats = self.repeats + duplicates.repeat_count()
+        self.reused = self.reused + len(duplicates.resolved)
+
+        saved_positions = list(duplicates.resolved.keys())
+        for positions in duplicates.copies.values():
+            saved_positions.extend(positions)
+        for position in saved_positions:
+            # The text is sent and about as many tokens are returned. Batches share the initial prompt.
+            line_tokens = utils.estimate_tokens(subs[position].spoken_line)
+            self.tokens_saved = self.tokens_saved + 2 * line_tokens + \
+                self.prompt_tokens_per_call // self.lines_per_call
+
+        if len(saved_positions) > 0:
+            log.write(f'{len(saved_positions)} of {len(pending)} lines are repeats and not translated again '
+                      f'({len(duplicates.resolved)} from previous files).', print_to_console=False)
+        return duplicates
+
+    def remember(self, duplicates: FileDuplicates, subs: subtitles.Subtitles):
+        # Called once a file is translated, so later files reuse its translations
+        if not self.across_files:
+            return
+        for position, key in duplicates.keys.items():
+            self.known[key] = subs[position].spoken_line
+
+    def calls_saved(self) -> int:
+        saved = self.repeats + self.reused
+        return -(-saved // self.lines_per_call)
+
+    def stats_text(self) -> str:
+        return f'{self.repeats + self.reused} of {self.cues_checked} lines were repeats, ' \
+               f'saving about {self.calls_saved()} API calls and {self.tokens_saved} tokens'
+
+    def to_dict(self) -> {}:
+        return {
+            'across_files': self.across_files,
+            'cues_checked': self.cues_checked,
+            'repeats': self.repeats,
+            'reused_from_previous_files': self.reused,
+            'estimated_calls_saved': self.calls_saved(),
+            'estimated_tokens_saved': self.tokens_saved
+        }
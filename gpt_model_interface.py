@@ -1,14 +1,30 @@
 import json
 import os
+import re
 import time
 
-import openai
+import openai.error
 
 import initial_prompt
-from util import log, utils
+import cue_classifier
+import model_backend
+import response_archive
+import translation_cache
+from util import instrumentation, log, utils, rate_limiter, retry
+
+# Number of evicted exchanges to summarize at once, if the history window is only limited by tokens
+_history_summary_interval: int = 10
+
+# Matches the number in front of every entry of a batched prompt or reply. Example: "[12] Hello there."
+_batch_entry_pattern = re.compile(r'^\s*\[(\d+)\]\s?', flags=re.MULTILINE)
 
 
 class GPTResponseData:
+    # One instance is kept per API call, so only the fields in use are stored, without an instance dict
+    __slots__ = ['original_prompt', 'response_timestamp', 'openai_id', 'organization', 'response_ms', 'id', 'object',
+                 'created', 'model', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'selected_choice_index',
+                 'finish_reason', 'answer_role', 'answer_content', 'retry_count', 'backoff_ms', 'output_language',
+                 'output_country', 'kind', '_predictions']
 
     def __init__(self, original_prompt: str, predictions):
         # arguments
@@ -25,29 +41,40 @@ class GPTResponseData:
         self.model: str = predictions.model
 
         # extracting token info
-        self.prompt_tokens: int = predictions.usage.prompt_tokens
-        self.completion_tokens: int = predictions.usage.completion_tokens
-        self.total_tokens: int = predictions.usage.total_tokens
-
-        # extracting choices
-        choices = predictions.choices
+        usage = predictions.usage
+        self.prompt_tokens: int = usage.prompt_tokens
+        self.completion_tokens: int = usage.completion_tokens
+        self.total_tokens: int = usage.total_tokens
 
         # selecting a choice to use
         self.selected_choice_index: int = 0
 
-        answer = choices[self.selected_choice_index]
+        answer = predictions.choices[self.selected_choice_index]
         message = answer.message
         self.finish_reason: str = answer.finish_reason
         self.answer_role: str = message.role
         self.answer_content: str = message.content
 
-        # summary
-        self.summary_json: str = json.dumps(predictions.to_dict_recursive(), indent=2)
-        self.message_json: str = json.dumps(message.to_dict_recursive(), indent=2)
+        # retries, set by the model after the response arrived
+        self.retry_count: int = 0
+        self.backoff_ms: int = 0
+        # the language translated into, set by the model, so archived responses can be told apart by language
+        self.output_language: str = None
+        self.output_country: str = None
+        # what the response answers (see 'response_archive.KIND_TRANSLATION'), set by the model
+        self.kind: str = response_archive.KIND_TRANSLATION
+
+        # The full response is only converted, when it is dumped. It is released afterwards.
+        self._predictions = predictions
+
+    @property
+    def summary(self) -> {}:
+        # The full response, the message is part of it. None, once the response is dumped.
+        if self._predictions is None:
+            return None
+        return self._predictions.to_dict_recursive()
 
     def to_dict(self) -> {}:
-        summary = json.loads(self.summary_json)
-        message = json.loads(self.message_json)
         d = {
             # Class fields
             'timestamp': self.response_timestamp,
@@ -66,12 +93,16 @@ class GPTResponseData:
             'answer.finish_reason': self.finish_reason,
             'message_role': self.answer_role,
             'message_content': self.answer_content,
-
-            # Summaries
-            'summary': summary,
-            'message': message
+            'retry_count': self.retry_count,
+            'backoff_ms': self.backoff_ms,
+            'output_language': self.output_language,
+            'output_country': self.output_country,
+            'kind': self.kind
         }
 
+        summary = self.summary
+        if summary is not None:
+            d['summary'] = summary
         return d
 
     def answer_created_without_problems(self) -> bool:
@@ -80,17 +111,9 @@ class GPTResponseData:
     def to_json(self, indent: int = 2) -> str:
         return str(json.dumps(self.to_dict(), indent=indent))
 
-    def dump_response(self, out_dir: str, indent: int = 2):
-        json_dump = self.to_json(indent=indent)
-        json_dump = str(json_dump)
-        h = hash(json_dump)
-        h = abs(h)
-
-        os.makedirs(out_dir, exist_ok=True)
-        out_file_name = out_dir + os.sep + 'gpt_response_dump-' + str(self.id) + '-' + str(h) + '.json'
-        f = open(out_file_name, 'w', encoding="utf-8")
-        f.write(json_dump)
-        f.close()
+    def dump_response(self, archive: response_archive.ResponseArchive):
+        archive.append(record=self.to_dict())
+        self._predictions = None
 
     def __str__(self) -> str:
         return self.to_json()
@@ -102,7 +125,18 @@ class TranslationGPT:
                  api_key: str,
                  output_language: str,
                  output_country: str,
-                 gpt_model_name: str = 'gpt-3.5-turbo'):
+                 gpt_model_name: str = 'gpt-3.5-turbo',
+                 api_base: str = None,
+                 batch_mode: bool = False,
+                 cache: translation_cache.TranslationCache = None,
+                 limiter: rate_limiter.RateLimiter = None,
+                 retrier: retry.Retrier = None,
+                 history_size: int = -1,
+                 history_tokens: int = -1,
+                 summarize_history: bool = False,
+                 archive: response_archive.ResponseArchive = None,
+                 backend: model_backend.ModelBackend = None,
+                 mask_tags: bool = False):
         assert api_key is not None
         assert output_language is not None
         assert output_country is not None
@@ -111,22 +145,55 @@ class TranslationGPT:
         log.write('OpenAI API Key: ' + utils.chat_gpt_api_key_printable(api_key))
 
         # Setting fields
-        openai.api_key = api_key
+        if api_base is not None:
+            # Allows pointing the model at any OpenAI compatible endpoint (e.g. the local 'mock_server.py')
+            log.write('OpenAI API Base: ' + str(api_base))
+        self.backend: model_backend.ModelBackend = backend if backend is not None else \
+            model_backend.OpenAIBackend(api_key=api_key, api_base=api_base)
         self.gpt_model_name = str(gpt_model_name)
         self.output_language = str(output_language)
         self.output_country = str(output_country)
+        self.batch_mode = bool(batch_mode)
+        self.cache: translation_cache.TranslationCache = cache
+        self.limiter: rate_limiter.RateLimiter = limiter
+        self.retrier: retry.Retrier = retrier if retrier is not None else create_retrier()
+        self.archive: response_archive.ResponseArchive = archive if archive is not None else \
+            response_archive.ResponseArchive(archive_dir=log.log_dir_base + 'log' + os.sep + 'model')
+
+        # Window of the session history: Newest exchanges or estimated tokens to keep. Below one means unlimited.
+        self.history_size: int = int(history_size)
+        self.history_tokens: int = int(history_tokens)
+        self.summarize_history: bool = bool(summarize_history)
+        self.history_summary: str = None
+        self._evicted_history: [{}] = []
+        # responses of the summary requests, until they are reported (see 'take_summary_responses')
+        self.summary_responses: [GPTResponseData] = []
         self.session_history = None
         self.tokens_asked = 0
         self.tokens_generated = 0
 
+        # Formatting tags around a line are not sent to the model, they are put back around its translation
+        self.mask_tags: bool = bool(mask_tags)
+        self.lines_masked: int = 0
+        self.mask_tokens_saved: int = 0
+
+        # totals of every API call, never reset by a new session
+        self.requests_total: int = 0
+        self.prompt_tokens_total: int = 0
+        self.completion_tokens_total: int = 0
+
         # Setting up Model
         self.clear_session()
 
     def create_initial_prompt(self) -> str:
+        if self.batch_mode:
+            return initial_prompt.get_batch_prompt(language=self.output_language, country=self.output_country)
         return initial_prompt.get_prompt(language=self.output_language, country=self.output_country)
 
     def clear_session(self):
         self.session_history = [{'role': 'system', 'content': self.create_initial_prompt()}]
+        self.history_summary = None
+        self._evicted_history = []
         self.tokens_generated = 0
         self.tokens_asked = 0
 
@@ -156,48 +223,250 @@ class TranslationGPT:
                      # output. You can set it to a positive value (e.g., 0.2) to discourage the model from
                      # repeating the same phrases
 
-                     print_to_console: bool = False
+                     print_to_console: bool = False,
                      # silent. If true, nothing is printed into the console. Logs are still logged.
+
+                     kind: str = response_archive.KIND_TRANSLATION
+                     # what the prompt asks for, archived with the response
                      ):
-        # Checking if function can be called
-        if self.session_history is None:
-            raise AttributeError('The model did not receive an initial prompt. Please setup session first!')
-        if prompt is None:
-            raise TypeError('Illegal prompt: "' + str(prompt) + '"!')
-        prompt = str(prompt).strip()
+        prompt = self._check_prompt(prompt=prompt)
 
         # logging
         log.write('Prompting Model: "' + prompt + '".', print_to_console=print_to_console)
 
         # Creating the prompt history
         # and choosing
+        self._trim_history()
         self.session_history.append({'role': 'user', 'content': prompt})
-        predictions = openai.ChatCompletion.create(
+        try:
+            gpt_response = self._request(messages=self.session_history,
+                                         prompt=prompt,
+                                         print_to_console=print_to_console,
+                                         kind=kind,
+                                         temperature=temperature,
+                                         top_p=top_p,
+                                         frequency_penalty=frequency_penalty,
+                                         presence_penalty=presence_penalty)
+        except Exception:
+            # The prompt was not answered, so it must not stay in the history
+            self.session_history.pop()
+            raise
+
+        # History
+        self.session_history.append({'role': 'assistant', 'content': gpt_response.answer_content})
+        return gpt_response
+
+    def _request(self, messages: [{}], prompt: str, print_to_console: bool, kind: str,
+                 **parameters) -> GPTResponseData:
+        # Sends the messages as they are. Waits for the rate limit and retries transient errors.
+        with instrumentation.span(instrumentation.SPAN_PROMPT):
+            estimated_tokens = estimate_request_tokens(messages)
+            request_parameters = self._create_request_parameters(messages=messages, **parameters)
+
+        # every attempt reserves its share of the rate limit, retries are requests as well
+        reservations: [rate_limiter.Reservation] = []
+        try:
+            predictions, retry_stats = self.retrier.call(self._create, reservations=reservations,
+                                                         estimated_tokens=estimated_tokens, **request_parameters)
+        except Exception:
+            self._release_reservations(reservations=reservations)
+            raise
+        self._release_reservations(reservations=reservations[:-1])
+
+        # Manage Response
+        gpt_response = self._handle_response(prompt=prompt, predictions=predictions, retry_stats=retry_stats,
+                                             print_to_console=print_to_console, kind=kind)
+        if self.limiter is not None:
+            self.limiter.reconcile(reservation=reservations[-1], actual_tokens=gpt_response.total_tokens)
+        return gpt_response
+
+    def _trim_history(self):
+        # Keeps the initial prompt, the summary (if any) and only the newest exchanges that fit into the window.
+        # Without a window, the history grows with every line and so does the prompt of every request.
+        if self.history_size < 1 and self.history_tokens < 1:
+            return
+
+        # The summary, if there is one, directly follows the initial prompt
+        head = self.session_history[:1]
+        if self.history_summary is not None:
+            head.append({'role': 'system', 'content': 'Summary of the previous lines: ' + self.history_summary})
+        exchanges = self.session_history[len(head):]
+
+        with instrumentation.span(instrumentation.SPAN_PROMPT):
+            while len(exchanges) >= 2 and self._history_exceeds_window(head=head, exchanges=exchanges):
+                self._evicted_history.extend(exchanges[:2])
+                exchanges = exchanges[2:]
+
+        # Summarizing the evicted exchanges in chunks, so there is not a summary request for every line
+        summary_interval = self.history_size if self.history_size > 0 else _history_summary_interval
+        if self.summarize_history and len(self._evicted_history) >= 2 * summary_interval:
+            self._summarize_evicted_history()
+            head = head[:1] + [{'role': 'system', 'content': 'Summary of the previous lines: ' + self.history_summary}]
+
+        self.session_history = head + exchanges
+
+    def _history_exceeds_window(self, head: [{}], exchanges: [{}]) -> bool:
+        if 0 < self.history_size < len(exchanges) / 2:
+            return True
+        if self.history_tokens > 0 and utils.estimate_message_tokens(messages=head + exchanges) > self.history_tokens:
+            return True
+        return False
+
+    def _summarize_evicted_history(self):
+        dialogue = [message['content'] for message in self._evicted_history if message['role'] == 'assistant']
+        prompt = '\n'.join(dialogue)
+        if self.history_summary is not None:
+            prompt = 'Previous summary: ' + self.history_summary + '\n\n' + prompt
+
+        messages = [{'role': 'system', 'content': initial_prompt.get_summary_prompt(language=self.output_language)},
+                    {'role': 'user', 'content': prompt}]
+        try:
+            gpt_response = self._request(messages=messages, prompt=prompt, print_to_console=False,
+                                         kind=response_archive.KIND_SUMMARY, temperature=1.0, top_p=1.0,
+                                         frequency_penalty=0.0, presence_penalty=0.0)
+            self.history_summary = gpt_response.answer_content.strip()
+            self._evicted_history = []
+            self.summary_responses.append(gpt_response)
+        except Exception as e:
+            # The summary is optional. Translating continues without updating it.
+            log.write('Failed to summarize the session history.', print_to_console=False)
+            log.write_exception(exception=e, print_to_console_message=False)
+
+    def take_summary_responses(self) -> [GPTResponseData]:
+        # The responses of the summaries requested since the last call. A summary is requested while a line is
+        # translated, so callers report them with the responses of that line.
+        summary_responses = self.summary_responses
+        self.summary_responses = []
+        return summary_responses
+
+    async def prompt_model_async(self,
+                                 prompt: str,
+                                 temperature: float = 1.0,
+                                 top_p: float = 1.0,
+                                 frequency_penalty: float = 0.0,
+                                 presence_penalty: float = 0.0,
+                                 print_to_console: bool = False,
+                                 history: [{}] = None,
+                                 kind: str = response_archive.KIND_TRANSLATION
+                                 ):
+        # Same as 'prompt_model', but without the session history of the model: Every call only sees the initial
+        # prompt. Therefore, many of these calls can be in flight at the same time.
+        # A short session of its own can be kept in 'history' (see 'create_history'). It is sent with the prompt,
+        # and the prompt and its answer are added to it.
+        prompt = self._check_prompt(prompt=prompt)
+
+        # logging
+        log.write('Prompting Model (async): "' + prompt + '".', print_to_console=print_to_console)
+
+        with instrumentation.span(instrumentation.SPAN_PROMPT):
+            if history is not None:
+                messages = history + [{'role': 'user', 'content': prompt}]
+            else:
+                messages = [self.session_history[0], {'role': 'user', 'content': prompt}]
+            estimated_tokens = estimate_request_tokens(messages)
+            request_parameters = self._create_request_parameters(messages=messages,
+                                                                 temperature=temperature,
+                                                                 top_p=top_p,
+                                                                 frequency_penalty=frequency_penalty,
+                                                                 presence_penalty=presence_penalty)
+
+        reservations: [rate_limiter.Reservation] = []
+        try:
+            predictions, retry_stats = await self.retrier.call_async(self._acreate, reservations=reservations,
+                                                                     estimated_tokens=estimated_tokens,
+                                                                     **request_parameters)
+        except Exception:
+            self._release_reservations(reservations=reservations)
+            raise
+        self._release_reservations(reservations=reservations[:-1])
+
+        gpt_response = self._handle_response(prompt=prompt, predictions=predictions, retry_stats=retry_stats,
+                                             print_to_console=print_to_console, kind=kind)
+        if self.limiter is not None:
+            self.limiter.reconcile(reservation=reservations[-1], actual_tokens=gpt_response.total_tokens)
+
+        if history is not None:
+            history.append({'role': 'user', 'content': prompt})
+            history.append({'role': 'assistant', 'content': gpt_response.answer_content})
+        return gpt_response
+
+    def create_history(self, context: [str] = None) -> [{}]:
+        # A new session for 'prompt_model_async', starting with the initial prompt.
+        # The 'context' lines precede the lines of the session. They are only shown to the model, not translated.
+        history = [{'role': 'system', 'content': self.create_initial_prompt()}]
+        if context is not None and len(context) > 0:
+            history.append({'role': 'system', 'content': initial_prompt.get_context_prompt(lines=context)})
+        return history
+
+    def _create(self, reservations: [rate_limiter.Reservation], estimated_tokens: int, **parameters):
+        # A single attempt. It waits for the rate limit and adds its reservation to 'reservations'.
+        # Every attempt is measured on its own, so the backoff between retries is not counted as network time
+        if self.limiter is not None:
+            reservations.append(self.limiter.acquire(estimated_tokens=estimated_tokens))
+        with instrumentation.span(instrumentation.SPAN_NETWORK):
+            return self.backend.create(**parameters)
+
+    async def _acreate(self, reservations: [rate_limiter.Reservation], estimated_tokens: int, **parameters):
+        if self.limiter is not None:
+            reservations.append(await self.limiter.acquire_async(estimated_tokens=estimated_tokens))
+        with instrumentation.span(instrumentation.SPAN_NETWORK):
+            return await self.backend.acreate(**parameters)
+
+    def _release_reservations(self, reservations: [rate_limiter.Reservation]):
+        # Failed attempts used no tokens. They still count as requests of the window.
+        if self.limiter is None:
+            return
+        for reservation in reservations:
+            self.limiter.reconcile(reservation=reservation, actual_tokens=0)
+
+    def _check_prompt(self, prompt: str) -> str:
+        # Checking if function can be called
+        if self.session_history is None:
+            raise AttributeError('The model did not receive an initial prompt. Please setup session first!')
+        if prompt is None:
+            raise TypeError('Illegal prompt: "' + str(prompt) + '"!')
+        return str(prompt).strip()
+
+    def _create_request_parameters(self,
+                                   messages: [{}],
+                                   temperature: float,
+                                   top_p: float,
+                                   frequency_penalty: float,
+                                   presence_penalty: float) -> {}:
+        return {
             # setting model parameters
-            temperature=temperature,
-            top_p=top_p,
-            frequency_penalty=frequency_penalty,
-            presence_penalty=presence_penalty,
+            'temperature': temperature,
+            'top_p': top_p,
+            'frequency_penalty': frequency_penalty,
+            'presence_penalty': presence_penalty,
 
             # choosing model name
-            model=self.gpt_model_name,
+            'model': self.gpt_model_name,
             # providing the 'chat history'
-            messages=self.session_history
-        )
-
-        out_dir = log.log_dir_base + os.sep + 'log' + os.sep + 'model'
-        os.makedirs(out_dir, exist_ok=True)
+            'messages': messages
+        }
 
-        # Manage Response
+    def _handle_response(self,
+                         prompt: str,
+                         predictions,
+                         retry_stats: retry.RetryStats,
+                         print_to_console: bool,
+                         kind: str) -> GPTResponseData:
         gpt_response = GPTResponseData(original_prompt=prompt, predictions=predictions)
-        gpt_response.dump_response(out_dir=out_dir)
+        gpt_response.retry_count = retry_stats.retry_count
+        gpt_response.backoff_ms = retry_stats.backoff_ms
+        gpt_response.output_language = self.output_language
+        gpt_response.output_country = self.output_country
+        gpt_response.kind = kind
+        gpt_response.dump_response(archive=self.archive)
         log.write('GPT responded in ' + str(gpt_response.response_ms) + ' ms', print_to_console=print_to_console)
         log.write('GPT response: "' + gpt_response.answer_content + '"', print_to_console=print_to_console)
 
-        # History
-        self.session_history.append({'role': 'assistant', 'content': gpt_response.answer_content})
         self.tokens_generated = self.tokens_generated + gpt_response.completion_tokens
         self.tokens_asked = self.tokens_asked + gpt_response.prompt_tokens
+        self.requests_total = self.requests_total + 1
+        self.prompt_tokens_total = self.prompt_tokens_total + gpt_response.prompt_tokens
+        self.completion_tokens_total = self.completion_tokens_total + gpt_response.completion_tokens
         return gpt_response
 
     def prompt_history(self) -> [{}]:
@@ -213,6 +482,264 @@ class TranslationGPT:
         return json.dumps(self.prompt_history(), indent=indent)
 
     def translate_line(self, line: str, silent: bool = False) -> [str, GPTResponseData]:
+        # The returned response is None, if the translation was found in the cache.
+        line, tags = self._mask_line(line=line)
+        translation, gpt_response = self._translate_line(line=line, silent=silent)
+        return cue_classifier.restore_tags(translation=translation, tags=tags), gpt_response
+
+    def _translate_line(self, line: str, silent: bool) -> [str, GPTResponseData]:
+        cached_translation = self._get_cached_translation(line=line)
+        if cached_translation is not None:
+            # The cached translation is added to the history, as if the model had just answered it
+            self.session_history.append({'role': 'user', 'content': str(line).strip()})
+            self.session_history.append({'role': 'assistant', 'content': cached_translation})
+            return cached_translation, None
+
         gpt_response = self.prompt_model(prompt=line, print_to_console=not silent)
-        translated_line = gpt_response.answer_content
-        return utils.remove_quotations(translated_line), gpt_response
+        translated_line = utils.remove_quotations(gpt_response.answer_content)
+        self._put_cached_translation(line=line, translation=translated_line)
+        return translated_line, gpt_response
+
+    async def translate_line_async(self,
+                                   line: str,
+                                   silent: bool = True,
+                                   history: [{}] = None) -> [str, GPTResponseData]:
+        line, tags = self._mask_line(line=line)
+        translation, gpt_response = await self._translate_line_async(line=line, silent=silent, history=history)
+        return cue_classifier.restore_tags(translation=translation, tags=tags), gpt_response
+
+    async def _translate_line_async(self, line: str, silent: bool, history: [{}] = None) -> [str, GPTResponseData]:
+        cached_translation = self._get_cached_translation(line=line)
+        if cached_translation is not None:
+            if history is not None:
+                # as if the model had just answered it, like in the session history of 'translate_line'
+                history.append({'role': 'user', 'content': str(line).strip()})
+                history.append({'role': 'assistant', 'content': cached_translation})
+            return cached_translation, None
+
+        gpt_response = await self.prompt_model_async(prompt=line, print_to_console=not silent, history=history)
+        translated_line = utils.remove_quotations(gpt_response.answer_content)
+        self._put_cached_translation(line=line, translation=translated_line)
+        return translated_line, gpt_response
+
+    def translate_lines(self, lines: [str], silent: bool = True) -> [[str], [GPTResponseData]]:
+        # Translates multiple lines with a single request. Requires the model to be in batch mode.
+        # Only lines that are not found in the cache are sent to the model.
+        assert self.batch_mode
+        assert len(lines) > 0
+
+        masked_lines, tags = self._mask_lines(lines=lines)
+        translations = [self._get_cached_translation(line=line) for line in masked_lines]
+        missing = [i for i in range(len(lines)) if translations[i] is None]
+        if len(missing) == 0:
+            return _restore_lines(translations=translations, tags=tags), []
+
+        missing_translations, gpt_responses = self._translate_batch(lines=[masked_lines[i] for i in missing],
+                                                                    silent=silent)
+        for i in range(len(missing)):
+            translations[missing[i]] = missing_translations[i]
+            self._put_cached_translation(line=masked_lines[missing[i]], translation=missing_translations[i])
+
+        return _restore_lines(translations=translations, tags=tags), gpt_responses
+
+    async def translate_lines_async(self,
+                                    lines: [str],
+                                    silent: bool = True,
+                                    history: [{}] = None) -> [[str], [GPTResponseData]]:
+        # Same as 'translate_lines', but without the session history of the model. See 'prompt_model_async'.
+        assert self.batch_mode
+        assert len(lines) > 0
+
+        masked_lines, tags = self._mask_lines(lines=lines)
+        translations = [self._get_cached_translation(line=line) for line in masked_lines]
+        missing = [i for i in range(len(lines)) if translations[i] is None]
+        if len(missing) == 0:
+            return _restore_lines(translations=translations, tags=tags), []
+
+        missing_translations, gpt_responses = await self._translate_batch_async(
+            lines=[masked_lines[i] for i in missing], silent=silent, history=history)
+        for i in range(len(missing)):
+            translations[missing[i]] = missing_translations[i]
+            self._put_cached_translation(line=masked_lines[missing[i]], translation=missing_translations[i])
+
+        return _restore_lines(translations=translations, tags=tags), gpt_responses
+
+    def _translate_batch(self, lines: [str], silent: bool) -> [[str], [GPTResponseData]]:
+        # If the reply does not contain exactly one translation per line, the batch is split in half and retried.
+        with instrumentation.span(instrumentation.SPAN_PROMPT):
+            prompt = create_batch_prompt(lines=lines)
+        gpt_response = self.prompt_model(prompt=prompt, print_to_console=not silent,
+                                         kind=response_archive.KIND_BATCH)
+        translations = parse_batch_answer(answer=gpt_response.answer_content, expected_count=len(lines))
+        if translations is not None:
+            return translations, [gpt_response]
+
+        # The failed exchange must not stay in the history, or the model learns from its own mistake
+        self.session_history = self.session_history[:-2]
+        if len(lines) == 1:
+            return [utils.remove_quotations(_strip_batch_numbers(gpt_response.answer_content))], [gpt_response]
+
+        log.write(f'Batch reply did not match {len(lines)} lines. Splitting the batch.', print_to_console=not silent)
+        half = len(lines) // 2
+        translations_head, responses_head = self._translate_batch(lines=lines[:half], silent=silent)
+        translations_tail, responses_tail = self._translate_batch(lines=lines[half:], silent=silent)
+        return translations_head + translations_tail, [gpt_response] + responses_head + responses_tail
+
+    async def _translate_batch_async(self,
+                                     lines: [str],
+                                     silent: bool,
+                                     history: [{}] = None) -> [[str], [GPTResponseData]]:
+        with instrumentation.span(instrumentation.SPAN_PROMPT):
+            prompt = create_batch_prompt(lines=lines)
+        gpt_response = await self.prompt_model_async(prompt=prompt, print_to_console=not silent, history=history,
+                                                     kind=response_archive.KIND_BATCH)
+        translations = parse_batch_answer(answer=gpt_response.answer_content, expected_count=len(lines))
+        if translations is not None:
+            return translations, [gpt_response]
+
+        if history is not None:
+            # The failed exchange must not stay in the history, or the model learns from its own mistake
+            del history[-2:]
+
+        if len(lines) == 1:
+            return [utils.remove_quotations(_strip_batch_numbers(gpt_response.answer_content))], [gpt_response]
+
+        log.write(f'Batch reply did not match {len(lines)} lines. Splitting the batch.', print_to_console=not silent)
+        half = len(lines) // 2
+        translations_head, responses_head = await self._translate_batch_async(lines=lines[:half], silent=silent,
+                                                                              history=history)
+        translations_tail, responses_tail = await self._translate_batch_async(lines=lines[half:], silent=silent,
+                                                                              history=history)
+        return translations_head + translations_tail, [gpt_response] + responses_head + responses_tail
+
+    def _mask_line(self, line: str) -> [str, [[str, str]]]:
+        # Returns the line without its formatting tags, and the tags to restore. The tags are None, if not masked.
+        if not self.mask_tags:
+            return line, None
+        masked_line, tags = cue_classifier.mask_tags(text=line)
+        if tags is None or masked_line.strip() == '':
+            return line, None
+
+        # the tags are neither sent nor returned by the model
+        self.lines_masked = self.lines_masked + 1
+        self.mask_tokens_saved = self.mask_tokens_saved + \
+            2 * (utils.estimate_tokens(line) - utils.estimate_tokens(masked_line))
+        return masked_line, tags
+
+    def _mask_lines(self, lines: [str]) -> [[str], [[[str, str]]]]:
+        masked = [self._mask_line(line=line) for line in lines]
+        return [m[0] for m in masked], [m[1] for m in masked]
+
+    def tag_masking_text(self) -> str:
+        return f'{self.lines_masked} lines sent without their formatting tags, ' \
+               f'saving about {self.mask_tokens_saved} tokens'
+
+    def tag_masking_dict(self) -> {}:
+        return {
+            'enabled': self.mask_tags,
+            'lines_masked': self.lines_masked,
+            'estimated_tokens_saved': self.mask_tokens_saved
+        }
+
+    def _cache_key(self, line: str) -> str:
+        return translation_cache.TranslationCache.create_key(gpt_model_name=self.gpt_model_name,
+                                                             initial_prompt=self.create_initial_prompt(),
+                                                             output_language=self.output_language,
+                                                             output_country=self.output_country,
+                                                             text=line)
+
+    def _get_cached_translation(self, line: str) -> str:
+        if self.cache is None:
+            return None
+        return self.cache.get(key=self._cache_key(line=line))
+
+    def _put_cached_translation(self, line: str, translation: str):
+        if self.cache is None:
+            return
+        self.cache.put(key=self._cache_key(line=line), translation=translation)
+
+    def warm_cache(self, dump_dir: str, skip_unknown_language: bool = False) -> int:
+        # 'skip_unknown_language' must be set, if other languages are translated into with the same archive
+        assert self.cache is not None
+        return self.cache.warm_from_dumps(dump_dir=dump_dir,
+                                          gpt_model_name=self.gpt_model_name,
+                                          initial_prompt=self.create_initial_prompt(),
+                                          output_language=self.output_language,
+                                          output_country=self.output_country,
+                                          batch_answer_parser=split_batch_answer,
+                                          skip_unknown_language=skip_unknown_language)
+
+
+def create_retrier(max_retries: int = None) -> retry.Retrier:
+    # Retry policies for transient openAI errors. 'max_retries' overrides the retries of every policy.
+    policies = {
+        openai.error.RateLimitError: retry.RetryPolicy(max_retries=8, base_delay=2.0, max_delay=60.0,
+                                                       trips_circuit_breaker=True),
+        openai.error.ServiceUnavailableError: retry.RetryPolicy(max_retries=6, base_delay=2.0, max_delay=60.0),
+        openai.error.APIConnectionError: retry.RetryPolicy(max_retries=5, base_delay=1.0, max_delay=30.0),
+        openai.error.Timeout: retry.RetryPolicy(max_retries=5, base_delay=1.0, max_delay=30.0),
+        openai.error.TryAgain: retry.RetryPolicy(max_retries=5, base_delay=1.0, max_delay=30.0),
+        openai.error.APIError: retry.RetryPolicy(max_retries=3, base_delay=1.0, max_delay=30.0)
+    }
+    if max_retries is not None:
+        for exception_class in policies:
+            policies[exception_class].max_retries = int(max_retries)
+
+    return retry.Retrier(policies=policies,
+                         circuit_breaker=retry.CircuitBreaker(failure_threshold=5, pause_seconds=30.0),
+                         is_retryable=is_retryable_error)
+
+
+def is_retryable_error(exception: Exception) -> bool:
+    # An exhausted quota is reported as rate limit error, but waiting does not help
+    return getattr(exception, 'code', None) != 'insufficient_quota'
+
+
+def _restore_lines(translations: [str], tags: [[[str, str]]]) -> [str]:
+    return [cue_classifier.restore_tags(translation=translations[i], tags=tags[i]) for i in range(len(translations))]
+
+
+def estimate_request_tokens(messages: [{}]) -> int:
+    # Prompt tokens of the whole history, plus a completion about as long as the newest message
+    return utils.estimate_message_tokens(messages=messages) + utils.estimate_tokens(messages[-1]['content'])
+
+
+def create_batch_prompt(lines: [str]) -> str:
+    entries = []
+    for i in range(len(lines)):
+        entries.append(f'[{i + 1}] ' + str(lines[i]).strip())
+    return '\n'.join(entries)
+
+
+def parse_batch_answer(answer: str, expected_count: int) -> [str]:
+    # Returns None, if the answer does not contain exactly the numbers 1 to 'expected_count' in order.
+    # Guessing which translation belongs to which line would shift translations onto the wrong lines.
+    translations = split_batch_answer(answer=answer)
+    if translations is None or len(translations) != expected_count:
+        return None
+    return translations
+
+
+def split_batch_answer(answer: str) -> [str]:
+    # Splits a numbered batch into its entries. Returns None, if the entries are not numbered 1, 2, 3, ...
+    if answer is None:
+        return None
+
+    answer = str(answer)
+    matches = list(_batch_entry_pattern.finditer(answer))
+    if len(matches) == 0:
+        return None
+
+    entries = []
+    for i in range(len(matches)):
+        if int(matches[i].group(1)) != i + 1:
+            return None
+
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(answer)
+        entries.append(utils.remove_quotations(answer[matches[i].end():end]))
+
+    return entries
+
+
+def _strip_batch_numbers(answer: str) -> str:
+    return _batch_entry_pattern.sub('', str(answer))
@@ -10,9 +10,47 @@ def get_prompt(language: str, country: str):
            f'Translate into {language} ({country}).'
 
 
+def get_batch_prompt(language: str, country: str):
+    assert language is not None
+
+    language = str(language).strip().lower().capitalize()
+
+    return f'I need help translating subtitles. ' \
+           f'I will give you several numbered lines at a time. Every line starts with its number, like "[1]". ' \
+           f'Reply with exactly one translation per line, starting with the same number. ' \
+           f'Never merge, split or skip lines. ' \
+           f'Keep sensible line breaks. ' \
+           f'Your replies are only translations of my input. ' \
+           f'Translate into {language} ({country}).'
+
+
+def get_summary_prompt(language: str):
+    assert language is not None
+
+    language = str(language).strip().lower().capitalize()
+
+    return f'I am translating subtitles. ' \
+           f'Summarize the following subtitle lines in a few sentences, in {language}. ' \
+           f'Keep names, places and who is speaking to whom. ' \
+           f'If there is a previous summary, merge it into your new summary. ' \
+           f'Your replies are only the summary.'
+
+
+def get_context_prompt(lines: [str]):
+    # The lines spoken right before the lines to translate, so a scene is not translated without its beginning
+    context = '\n'.join([str(line).strip() for line in lines])
+    return f'For context only, these subtitle lines were spoken right before. Do not translate them:\n{context}'
+
+
 if __name__ == '__main__':
     print('Initial prompt, for "English":')
     print('')
     print('####################')
     print(get_prompt(language='English', country='USA'))
     print('####################')
+    print('')
+    print('Initial prompt for batches, for "English":')
+    print('')
+    print('####################')
+    print(get_batch_prompt(language='English', country='USA'))
+    print('####################')
@@ -0,0 +1,330 @@
+import re
+
+# Countries and the language spoken there, to find the language to translate into without loading pycountry.
+# Created from pycountry 22.3.5 (ISO 3166-1 and ISO 639-1) and the official languages of every country in the CLDR.
+# Countries without an official language (e.g. Antarctica) are missing.
+# country alpha 2: (country alpha 3, country name, language alpha 2, language name)
+_countries: {str: [str, str, str, str]} = {
+    'AD': ('AND', 'Andorra', 'ca', 'Catalan'),
+    'AE': ('ARE', 'United Arab Emirates', 'ar', 'Arabic'),
+    'AF': ('AFG', 'Afghanistan', 'fa', 'Persian'),
+    'AG': ('ATG', 'Antigua and Barbuda', 'en', 'English'),
+    'AI': ('AIA', 'Anguilla', 'en', 'English'),
+    'AL': ('ALB', 'Albania', 'sq', 'Albanian'),
+    'AM': ('ARM', 'Armenia', 'hy', 'Armenian'),
+    'AO': ('AGO', 'Angola', 'pt', 'Portuguese'),
+    'AR': ('ARG', 'Argentina', 'es', 'Spanish'),
+    'AS': ('ASM', 'American Samoa', 'sm', 'Samoan'),
+    'AT': ('AUT', 'Austria', 'de', 'German'),
+    'AU': ('AUS', 'Australia', 'en', 'English'),
+    'AW': ('ABW', 'Aruba', 'nl', 'Dutch'),
+    'AX': ('ALA', 'Åland Islands', 'sv', 'Swedish'),
+    'AZ': ('AZE', 'Azerbaijan', 'az', 'Azerbaijani'),
+    'BA': ('BIH', 'Bosnia and Herzegovina', 'bs', 'Bosnian'),
+    'BB': ('BRB', 'Barbados', 'en', 'English'),
+    'BD': ('BGD', 'Bangladesh', 'bn', 'Bengali'),
+    'BE': ('BEL', 'Belgium', 'nl', 'Dutch'),
+    'BF': ('BFA', 'Burkina Faso', 'fr', 'French'),
+    'BG': ('BGR', 'Bulgaria', 'bg', 'Bulgarian'),
+    'BH': ('BHR', 'Bahrain', 'ar', 'Arabic'),
+    'BI': ('BDI', 'Burundi', 'rn', 'Rundi'),
+    'BJ': ('BEN', 'Benin', 'fr', 'French'),
+    'BL': ('BLM', 'Saint Barthélemy', 'fr', 'French'),
+    'BM': ('BMU', 'Bermuda', 'en', 'English'),
+    'BN': ('BRN', 'Brunei Darussalam', 'ms', 'Malay (macrolanguage)'),
+    'BO': ('BOL', 'Bolivia, Plurinational State of', 'es', 'Spanish'),
+    'BQ': ('BES', 'Bonaire, Sint Eustatius and Saba', 'nl', 'Dutch'),
+    'BR': ('BRA', 'Brazil', 'pt', 'Portuguese'),
+    'BS': ('BHS', 'Bahamas', 'en', 'English'),
+    'BT': ('BTN', 'Bhutan', 'dz', 'Dzongkha'),
+    'BW': ('BWA', 'Botswana', 'en', 'English'),
+    'BY': ('BLR', 'Belarus', 'be', 'Belarusian'),
+    'BZ': ('BLZ', 'Belize', 'en', 'English'),
+    'CA': ('CAN', 'Canada', 'en', 'English'),
+    'CC': ('CCK', 'Cocos (Keeling) Islands', 'en', 'English'),
+    'CD': ('COD', 'Congo, The Democratic Republic of the', 'fr', 'French'),
+    'CF': ('CAF', 'Central African Republic', 'sg', 'Sango'),
+    'CG': ('COG', 'Congo', 'fr', 'French'),
+    'CH': ('CHE', 'Switzerland', 'de', 'German'),
+    'CI': ('CIV', "Côte d'Ivoire", 'fr', 'French'),
+    'CK': ('COK', 'Cook Islands', 'en', 'English'),
+    'CL': ('CHL', 'Chile', 'es', 'Spanish'),
+    'CM': ('CMR', 'Cameroon', 'fr', 'French'),
+    'CN': ('CHN', 'China', 'zh', 'Chinese'),
+    'CO': ('COL', 'Colombia', 'es', 'Spanish'),
+    'CR': ('CRI', 'Costa Rica', 'es', 'Spanish'),
+    'CU': ('CUB', 'Cuba', 'es', 'Spanish'),
+    'CV': ('CPV', 'Cabo Verde', 'pt', 'Portuguese'),
+    'CW': ('CUW', 'Curaçao', 'nl', 'Dutch'),
+    'CX': ('CXR', 'Christmas Island', 'en', 'English'),
+    'CY': ('CYP', 'Cyprus', 'el', 'Modern Greek (1453-)'),
+    'CZ': ('CZE', 'Czechia', 'cs', 'Czech'),
+    'DE': ('DEU', 'Germany', 'de', 'German'),
+    'DJ': ('DJI', 'Djibouti', 'fr', 'French'),
+    'DK': ('DNK', 'Denmark', 'da', 'Danish'),
+    'DM': ('DMA', 'Dominica', 'en', 'English'),
+    'DO': ('DOM', 'Dominican Republic', 'es', 'Spanish'),
+    'DZ': ('DZA', 'Algeria', 'ar', 'Arabic'),
+    'EC': ('ECU', 'Ecuador', 'es', 'Spanish'),
+    'EE': ('EST', 'Estonia', 'et', 'Estonian'),
+    'EG': ('EGY', 'Egypt', 'ar', 'Arabic'),
+    'EH': ('ESH', 'Western Sahara', 'ar', 'Arabic'),
+    'ER': ('ERI', 'Eritrea', 'ti', 'Tigrinya'),
+    'ES': ('ESP', 'Spain', 'es', 'Spanish'),
+    'ET': ('ETH', 'Ethiopia', 'am', 'Amharic'),
+    'FI': ('FIN', 'Finland', 'fi', 'Finnish'),
+    'FJ': ('FJI', 'Fiji', 'en', 'English'),
+    'FK': ('FLK', 'Falkland Islands (Malvinas)', 'en', 'English'),
+    'FM': ('FSM', 'Micronesia, Federated States of', 'en', 'English'),
+    'FO': ('FRO', 'Faroe Islands', 'fo', 'Faroese'),
+    'FR': ('FRA', 'France', 'fr', 'French'),
+    'GA': ('GAB', 'Gabon', 'fr', 'French'),
+    'GB': ('GBR', 'United Kingdom', 'en', 'English'),
+    'GD': ('GRD', 'Grenada', 'en', 'English'),
+    'GE': ('GEO', 'Georgia', 'ka', 'Georgian'),
+    'GF': ('GUF', 'French Guiana', 'fr', 'French'),
+    'GG': ('GGY', 'Guernsey', 'en', 'English'),
+    'GH': ('GHA', 'Ghana', 'en', 'English'),
+    'GI': ('GIB', 'Gibraltar', 'en', 'English'),
+    'GL': ('GRL', 'Greenland', 'kl', 'Kalaallisut'),
+    'GM': ('GMB', 'Gambia', 'en', 'English'),
+    'GN': ('GIN', 'Guinea', 'fr', 'French'),
+    'GP': ('GLP', 'Guadeloupe', 'fr', 'French'),
+    'GQ': ('GNQ', 'Equatorial Guinea', 'es', 'Spanish'),
+    'GR': ('GRC', 'Greece', 'el', 'Modern Greek (1453-)'),
+    'GS': ('SGS', 'South Georgia and the South Sandwich Islands', 'en', 'English'),
+    'GT': ('GTM', 'Guatemala', 'es', 'Spanish'),
+    'GU': ('GUM', 'Guam', 'en', 'English'),
+    'GW': ('GNB', 'Guinea-Bissau', 'pt', 'Portuguese'),
+    'GY': ('GUY', 'Guyana', 'en', 'English'),
+    'HK': ('HKG', 'Hong Kong', 'en', 'English'),
+    'HN': ('HND', 'Honduras', 'es', 'Spanish'),
+    'HR': ('HRV', 'Croatia', 'hr', 'Croatian'),
+    'HT': ('HTI', 'Haiti', 'ht', 'Haitian'),
+    'HU': ('HUN', 'Hungary', 'hu', 'Hungarian'),
+    'ID': ('IDN', 'Indonesia', 'id', 'Indonesian'),
+    'IE': ('IRL', 'Ireland', 'en', 'English'),
+    'IL': ('ISR', 'Israel', 'he', 'Hebrew'),
+    'IM': ('IMN', 'Isle of Man', 'en', 'English'),
+    'IN': ('IND', 'India', 'hi', 'Hindi'),
+    'IO': ('IOT', 'British Indian Ocean Territory', 'en', 'English'),
+    'IQ': ('IRQ', 'Iraq', 'ar', 'Arabic'),
+    'IR': ('IRN', 'Iran, Islamic Republic of', 'fa', 'Persian'),
+    'IS': ('ISL', 'Iceland', 'is', 'Icelandic'),
+    'IT': ('ITA', 'Italy', 'it', 'Italian'),
+    'JE': ('JEY', 'Jersey', 'en', 'English'),
+    'JM': ('JAM', 'Jamaica', 'en', 'English'),
+    'JO': ('JOR', 'Jordan', 'ar', 'Arabic'),
+    'JP': ('JPN', 'Japan', 'ja', 'Japanese'),
+    'KE': ('KEN', 'Kenya', 'sw', 'Swahili (macrolanguage)'),
+    'KG': ('KGZ', 'Kyrgyzstan', 'ky', 'Kirghiz'),
+    'KH': ('KHM', 'Cambodia', 'km', 'Central Khmer'),
+    'KI': ('KIR', 'Kiribati', 'en', 'English'),
+    'KM': ('COM', 'Comoros', 'ar', 'Arabic'),
+    'KN': ('KNA', 'Saint Kitts and Nevis', 'en', 'English'),
+    'KP': ('PRK', "Korea, Democratic People's Republic of", 'ko', 'Korean'),
+    'KR': ('KOR', 'Korea, Republic of', 'ko', 'Korean'),
+    'KW': ('KWT', 'Kuwait', 'ar', 'Arabic'),
+    'KY': ('CYM', 'Cayman Islands', 'en', 'English'),
+    'KZ': ('KAZ', 'Kazakhstan', 'ru', 'Russian'),
+    'LA': ('LAO', "Lao People's Democratic Republic", 'lo', 'Lao'),
+    'LB': ('LBN', 'Lebanon', 'ar', 'Arabic'),
+    'LC': ('LCA', 'Saint Lucia', 'en', 'English'),
+    'LI': ('LIE', 'Liechtenstein', 'de', 'German'),
+    'LK': ('LKA', 'Sri Lanka', 'si', 'Sinhala'),
+    'LR': ('LBR', 'Liberia', 'en', 'English'),
+    'LS': ('LSO', 'Lesotho', 'st', 'Southern Sotho'),
+    'LT': ('LTU', 'Lithuania', 'lt', 'Lithuanian'),
+    'LU': ('LUX', 'Luxembourg', 'fr', 'French'),
+    'LV': ('LVA', 'Latvia', 'lv', 'Latvian'),
+    'LY': ('LBY', 'Libya', 'ar', 'Arabic'),
+    'MA': ('MAR', 'Morocco', 'ar', 'Arabic'),
+    'MC': ('MCO', 'Monaco', 'fr', 'French'),
+    'MD': ('MDA', 'Moldova, Republic of', 'ro', 'Romanian'),
+    'MF': ('MAF', 'Saint Martin (French part)', 'fr', 'French'),
+    'MG': ('MDG', 'Madagascar', 'mg', 'Malagasy'),
+    'MH': ('MHL', 'Marshall Islands', 'en', 'English'),
+    'MK': ('MKD', 'North Macedonia', 'mk', 'Macedonian'),
+    'ML': ('MLI', 'Mali', 'fr', 'French'),
+    'MM': ('MMR', 'Myanmar', 'my', 'Burmese'),
+    'MN': ('MNG', 'Mongolia', 'mn', 'Mongolian'),
+    'MO': ('MAC', 'Macao', 'pt', 'Portuguese'),
+    'MP': ('MNP', 'Northern Mariana Islands', 'en', 'English'),
+    'MQ': ('MTQ', 'Martinique', 'fr', 'French'),
+    'MR': ('MRT', 'Mauritania', 'ar', 'Arabic'),
+    'MS': ('MSR', 'Montserrat', 'en', 'English'),
+    'MT': ('MLT', 'Malta', 'mt', 'Maltese'),
+    'MU': ('MUS', 'Mauritius', 'fr', 'French'),
+    'MV': ('MDV', 'Maldives', 'dv', 'Dhivehi'),
+    'MW': ('MWI', 'Malawi', 'ny', 'Nyanja'),
+    'MX': ('MEX', 'Mexico', 'es', 'Spanish'),
+    'MY': ('MYS', 'Malaysia', 'ms', 'Malay (macrolanguage)'),
+    'MZ': ('MOZ', 'Mozambique', 'pt', 'Portuguese'),
+    'NA': ('NAM', 'Namibia', 'en', 'English'),
+    'NC': ('NCL', 'New Caledonia', 'fr', 'French'),
+    'NE': ('NER', 'Niger', 'fr', 'French'),
+    'NF': ('NFK', 'Norfolk Island', 'en', 'English'),
+    'NG': ('NGA', 'Nigeria', 'en', 'English'),
+    'NI': ('NIC', 'Nicaragua', 'es', 'Spanish'),
+    'NL': ('NLD', 'Netherlands', 'nl', 'Dutch'),
+    'NO': ('NOR', 'Norway', 'no', 'Norwegian'),
+    'NP': ('NPL', 'Nepal', 'ne', 'Nepali (macrolanguage)'),
+    'NR': ('NRU', 'Nauru', 'en', 'English'),
+    'NU': ('NIU', 'Niue', 'en', 'English'),
+    'NZ': ('NZL', 'New Zealand', 'en', 'English'),
+    'OM': ('OMN', 'Oman', 'ar', 'Arabic'),
+    'PA': ('PAN', 'Panama', 'es', 'Spanish'),
+    'PE': ('PER', 'Peru', 'es', 'Spanish'),
+    'PF': ('PYF', 'French Polynesia', 'fr', 'French'),
+    'PG': ('PNG', 'Papua New Guinea', 'en', 'English'),
+    'PH': ('PHL', 'Philippines', 'en', 'English'),
+    'PK': ('PAK', 'Pakistan', 'ur', 'Urdu'),
+    'PL': ('POL', 'Poland', 'pl', 'Polish'),
+    'PM': ('SPM', 'Saint Pierre and Miquelon', 'fr', 'French'),
+    'PN': ('PCN', 'Pitcairn', 'en', 'English'),
+    'PR': ('PRI', 'Puerto Rico', 'es', 'Spanish'),
+    'PS': ('PSE', 'Palestine, State of', 'ar', 'Arabic'),
+    'PT': ('PRT', 'Portugal', 'pt', 'Portuguese'),
+    'PW': ('PLW', 'Palau', 'en', 'English'),
+    'PY': ('PRY', 'Paraguay', 'gn', 'Guarani'),
+    'QA': ('QAT', 'Qatar', 'ar', 'Arabic'),
+    'RE': ('REU', 'Réunion', 'fr', 'French'),
+    'RO': ('ROU', 'Romania', 'ro', 'Romanian'),
+    'RS': ('SRB', 'Serbia', 'sr', 'Serbian'),
+    'RU': ('RUS', 'Russian Federation', 'ru', 'Russian'),
+    'RW': ('RWA', 'Rwanda', 'rw', 'Kinyarwanda'),
+    'SA': ('SAU', 'Saudi Arabia', 'ar', 'Arabic'),
+    'SB': ('SLB', 'Solomon Islands', 'en', 'English'),
+    'SC': ('SYC', 'Seychelles', 'fr', 'French'),
+    'SD': ('SDN', 'Sudan', 'en', 'English'),
+    'SE': ('SWE', 'Sweden', 'sv', 'Swedish'),
+    'SG': ('SGP', 'Singapore', 'en', 'English'),
+    'SH': ('SHN', 'Saint Helena, Ascension and Tristan da Cunha', 'en', 'English'),
+    'SI': ('SVN', 'Slovenia', 'sl', 'Slovenian'),
+    'SJ': ('SJM', 'Svalbard and Jan Mayen', 'nb', 'Norwegian Bokmål'),
+    'SK': ('SVK', 'Slovakia', 'sk', 'Slovak'),
+    'SL': ('SLE', 'Sierra Leone', 'en', 'English'),
+    'SM': ('SMR', 'San Marino', 'it', 'Italian'),
+    'SN': ('SEN', 'Senegal', 'wo', 'Wolof'),
+    'SO': ('SOM', 'Somalia', 'so', 'Somali'),
+    'SR': ('SUR', 'Suriname', 'nl', 'Dutch'),
+    'SS': ('SSD', 'South Sudan', 'en', 'English'),
+    'ST': ('STP', 'Sao Tome and Principe', 'pt', 'Portuguese'),
+    'SV': ('SLV', 'El Salvador', 'es', 'Spanish'),
+    'SX': ('SXM', 'Sint Maarten (Dutch part)', 'en', 'English'),
+    'SY': ('SYR', 'Syrian Arab Republic', 'ar', 'Arabic'),
+    'SZ': ('SWZ', 'Eswatini', 'en', 'English'),
+    'TC': ('TCA', 'Turks and Caicos Islands', 'en', 'English'),
+    'TD': ('TCD', 'Chad', 'ar', 'Arabic'),
+    'TG': ('TGO', 'Togo', 'fr', 'French'),
+    'TH': ('THA', 'Thailand', 'th', 'Thai'),
+    'TJ': ('TJK', 'Tajikistan', 'tg', 'Tajik'),
+    'TK': ('TKL', 'Tokelau', 'en', 'English'),
+    'TL': ('TLS', 'Timor-Leste', 'pt', 'Portuguese'),
+    'TM': ('TKM', 'Turkmenistan', 'tk', 'Turkmen'),
+    'TN': ('TUN', 'Tunisia', 'ar', 'Arabic'),
+    'TO': ('TON', 'Tonga', 'to', 'Tonga (Tonga Islands)'),
+    'TR': ('TUR', 'Turkey', 'tr', 'Turkish'),
+    'TT': ('TTO', 'Trinidad and Tobago', 'en', 'English'),
+    'TV': ('TUV', 'Tuvalu', 'en', 'English'),
+    'TZ': ('TZA', 'Tanzania, United Republic of', 'sw', 'Swahili (macrolanguage)'),
+    'UA': ('UKR', 'Ukraine', 'uk', 'Ukrainian'),
+    'UG': ('UGA', 'Uganda', 'sw', 'Swahili (macrolanguage)'),
+    'UM': ('UMI', 'United States Minor Outlying Islands', 'en', 'English'),
+    'US': ('USA', 'United States', 'en', 'English'),
+    'UY': ('URY', 'Uruguay', 'es', 'Spanish'),
+    'UZ': ('UZB', 'Uzbekistan', 'uz', 'Uzbek'),
+    'VA': ('VAT', 'Holy See (Vatican City State)', 'it', 'Italian'),
+    'VC': ('VCT', 'Saint Vincent and the Grenadines', 'en', 'English'),
+    'VE': ('VEN', 'Venezuela, Bolivarian Republic of', 'es', 'Spanish'),
+    'VG': ('VGB', 'Virgin Islands, British', 'en', 'English'),
+    'VI': ('VIR', 'Virgin Islands, U.S.', 'en', 'English'),
+    'VN': ('VNM', 'Viet Nam', 'vi', 'Vietnamese'),
+    'VU': ('VUT', 'Vanuatu', 'bi', 'Bislama'),
+    'WF': ('WLF', 'Wallis and Futuna', 'fr', 'French'),
+    'WS': ('WSM', 'Samoa', 'sm', 'Samoan'),
+    'YE': ('YEM', 'Yemen', 'ar', 'Arabic'),
+    'YT': ('MYT', 'Mayotte', 'fr', 'French'),
+    'ZA': ('ZAF', 'South Africa', 'en', 'English'),
+    'ZM': ('ZMB', 'Zambia', 'en', 'English'),
+    'ZW': ('ZWE', 'Zimbabwe', 'sn', 'Shona'),
+}
+
+# Created on the first lookup
+_alpha_3_index: {str: str} = None
+_name_index: {str: str} = None
+
+_whitespace_pattern = re.compile(r'\s+')
+
+
+class Country:
+    __slots__ = ['alpha_2', 'alpha_3', 'name']
+
+    def __init__(self, alpha_2: str, alpha_3: str, name: str) -> None:
+        super().__init__()
+        self.alpha_2: str = alpha_2
+        self.alpha_3: str = alpha_3
+        self.name: str = name
+
+
+class Language:
+    __slots__ = ['alpha_2', 'name']
+
+    def __init__(self, alpha_2: str, name: str) -> None:
+        super().__init__()
+        self.alpha_2: str = alpha_2
+        self.name: str = name
+
+
+def country_count() -> int:
+    return len(_countries)
+
+
+def get(alpha_2: str) -> [Country, Language]:
+    # Returns None, if the country is unknown
+    entry = _countries.get(str(alpha_2).upper(), None)
+    if entry is None:
+        return None
+    return Country(alpha_2=str(alpha_2).upper(), alpha_3=entry[0], name=entry[1]), \
+        Language(alpha_2=entry[2], name=entry[3])
+
+
+def lookup(text: str) -> [Country, Language]:
+    # Finds the country by its alpha 2 or alpha 3 code or by its name, ignoring case.
+    # Other names (e.g. official names or misspellings) are searched with pycountry, if it is installed.
+    # Returns None, if no country is found.
+    global _alpha_3_index, _name_index
+    text = _whitespace_pattern.sub(' ', str(text)).strip()
+
+    if len(text) == 2:
+        return get(alpha_2=text)
+
+    if _alpha_3_index is None:
+        _alpha_3_index = {entry[0]: alpha_2 for alpha_2, entry in _countries.items()}
+        _name_index = {entry[1].lower(): alpha_2 for alpha_2, entry in _countries.items()}
+
+    alpha_2 = _alpha_3_index.get(text.upper(), None) if len(text) == 3 else None
+    if alpha_2 is None:
+        alpha_2 = _name_index.get(text.lower(), None)
+    if alpha_2 is None:
+        alpha_2 = _search_pycountry(text=text)
+    if alpha_2 is None:
+        return None
+    return get(alpha_2=alpha_2)
+
+
+def _search_pycountry(text: str) -> str:
+    # Loading pycountry takes a while, so it is only done for names not found in the table
+    try:
+        import pycountry
+    except ImportError:
+        return None
+
+    try:
+        return pycountry.countries.lookup(text).alpha_2
+    except LookupError:
+        pass
+    try:
+        return pycountry.countries.search_fuzzy(text)[0].alpha_2
+    except LookupError:
+        return None
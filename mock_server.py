@@ -0,0 +1,144 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import model_backend
+from util import distribution, log
+
+# A local stand-in for the openAI chat completions endpoint.
+# Used to benchmark the translation pipeline without network access or cost.
+# Point the translator at it via: --api_base http://127.0.0.1:<port>/v1
+
+DEFAULT_PORT: int = 8089
+
+
+class MockChatCompletionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self,
+                 port: int = DEFAULT_PORT,
+                 latency: distribution.Distribution = None,
+                 rate_limit_probability: float = 0.0,
+                 requests_per_minute: int = -1,
+                 tokens_per_minute: int = -1,
+                 seed: int = None) -> None:
+        # Rate limit errors (HTTP 429) are sent randomly and for every request exceeding the given limits
+        super().__init__(('127.0.0.1', int(port)), MockChatCompletionHandler)
+        self.latency: distribution.Distribution = latency if latency is not None else \
+            distribution.Distribution()
+        self.injector = model_backend.RateLimitInjector(rate_limit_probability=rate_limit_probability,
+                                                        requests_per_minute=requests_per_minute,
+                                                        tokens_per_minute=tokens_per_minute, seed=seed)
+        self.usage = model_backend.UsageStats()
+        # every accepted connection, to see how often clients reuse them
+        self.connection_count: int = 0
+        self._connection_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._connection_lock:
+            self.connection_count = self.connection_count + 1
+        super().process_request(request, client_address)
+
+    @property
+    def request_count(self) -> int:
+        return self.usage.requests
+
+    def api_base(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/v1'
+
+    def create_completion(self, request: {}) -> {}:
+        completion = model_backend.create_echo_completion(request=request)
+        self.usage.record_completion(completion=completion)
+        return completion
+
+
+class MockChatCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # Token accounting of all requests so far
+        if self.path.rstrip('/').endswith('/stats'):
+            self._send_json(status=200, payload=dict(self.server.usage.to_dict(),
+                                                     connections=self.server.connection_count))
+            return
+        self._send_json(status=404, payload={'error': {'message': f'Unknown path: {self.path}'}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(status=404, payload={'error': {'message': f'Unknown path: {self.path}'}})
+            return
+
+        start_time = time.time_ns()
+        content_length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(content_length).decode('utf-8'))
+
+        latency = self.server.latency.sample()
+        if latency > 0:
+            time.sleep(latency)
+
+        retry_after = self.server.injector.check(request=request)
+        if retry_after is not None:
+            self.server.usage.record_rate_limited()
+            self._send_json(status=429, payload={'error': {
+                'message': 'Rate limit reached (injected by the mock server).',
+                'type': 'requests',
+                'code': 'rate_limit_exceeded'
+            }}, extra_headers={'retry-after-ms': str(int(retry_after * 1000))})
+            return
+
+        completion = self.server.create_completion(request=request)
+        processing_ms = int((time.time_ns() - start_time) / 1_000_000)
+        self._send_json(status=200, payload=completion, extra_headers={
+            'openai-processing-ms': str(processing_ms),
+            'openai-organization': 'mock-organization'
+        })
+
+    def _send_json(self, status: int, payload: {}, extra_headers: {} = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if extra_headers is not None:
+            for key in extra_headers:
+                self.send_header(key, extra_headers[key])
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # silencing the default stderr logging of every request
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs a local mock of the openAI chat completions API.')
+    parser.add_argument('-p', '--port', type=int, required=False, default=DEFAULT_PORT,
+                        help='Port to listen on.')
+    parser.add_argument('--latency', type=str, required=False, default='0.5',
+                        help='Seconds to wait before answering every request. Either a number or a distribution:'
+                             ' "uniform:min,max", "normal:mean,deviation", "lognormal:median,sigma",'
+                             ' "exponential:mean".')
+    parser.add_argument('--rate_limit', type=float, required=False, default=0.0,
+                        help='Share of requests answered with a rate limit error (between 0 and 1).')
+    parser.add_argument('-rpm', '--requests_per_minute', type=int, required=False, default=-1,
+                        help='Requests exceeding this limit are answered with a rate limit error.')
+    parser.add_argument('-tpm', '--tokens_per_minute', type=int, required=False, default=-1,
+                        help='Requests exceeding this limit of estimated tokens are answered with a rate limit error.')
+    parser.add_argument('--seed', type=int, required=False,
+                        help='Seed of the random rate limit errors.')
+    args = parser.parse_args()
+
+    server = MockChatCompletionServer(port=args.port,
+                                      latency=distribution.Distribution.parse(args.latency),
+                                      rate_limit_probability=args.rate_limit,
+                                      requests_per_minute=args.requests_per_minute,
+                                      tokens_per_minute=args.tokens_per_minute,
+                                      seed=args.seed)
+    log.write(f'Mock chat completions server running at: {server.api_base()} (latency: {server.latency})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    log.write(f'Mock server answered {server.usage.text()}.')
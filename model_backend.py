@@ -0,0 +1,285 @@
+import asyncio
+import contextlib
+import json
+import random
+import threading
+import time
+import uuid
+
+import openai
+import openai.error
+
+import connection_pool
+from util import distribution, log, rate_limiter, utils
+
+# The model sends its chat completion requests to a backend:
+# - 'OpenAIBackend' talks to the openAI API, or any compatible HTTP endpoint (e.g. 'mock_server.py')
+# - 'FakeBackend' answers in-process, without network access or cost. Used to measure the pipeline itself.
+BACKEND_OPENAI: str = 'openai'
+BACKEND_FAKE: str = 'fake'
+backend_names: [str] = [BACKEND_OPENAI, BACKEND_FAKE]
+
+
+class ModelBackend:
+
+    def __init__(self) -> None:
+        super().__init__()
+
+    def create(self, **parameters):
+        # Sends a chat completion request and returns the response, like 'openai.ChatCompletion.create'
+        raise NotImplementedError()
+
+    async def acreate(self, **parameters):
+        raise NotImplementedError()
+
+    @contextlib.asynccontextmanager
+    async def connection_pool(self):
+        # Wraps a batch of async requests. Backends may share connections between them.
+        yield
+
+    def stats_text(self) -> str:
+        return None
+
+    def connection_stats(self) -> {}:
+        # Statistics of the HTTP connections, if the backend uses any
+        return None
+
+    def close(self):
+        pass
+
+
+class OpenAIBackend(ModelBackend):
+
+    def __init__(self, api_key: str, api_base: str = None, pool: connection_pool.ConnectionPool = None) -> None:
+        # The key and base are sent with every request, instead of being set globally for the openAI library
+        super().__init__()
+        assert api_key is not None
+        self.api_key: str = str(api_key)
+        self.api_base: str = str(api_base) if api_base is not None else None
+        self.pool: connection_pool.ConnectionPool = pool if pool is not None else connection_pool.ConnectionPool()
+
+    def create(self, **parameters):
+        self.pool.install_sync_session()
+        return openai.ChatCompletion.create(api_key=self.api_key, api_base=self.api_base,
+                                            request_timeout=self.pool.request_timeout(), **parameters)
+
+    async def acreate(self, **parameters):
+        return await openai.ChatCompletion.acreate(api_key=self.api_key, api_base=self.api_base,
+                                                   request_timeout=self.pool.request_timeout(), **parameters)
+
+    @contextlib.asynccontextmanager
+    async def connection_pool(self):
+        # By default, openAI opens a new HTTP session for every async request.
+        # Sharing one pooled session lets all requests in flight reuse its connections.
+        if not self.pool.enabled or openai.aiosession.get() is not None:
+            # an outer caller already provides a session
+            yield
+            return
+
+        session = self.pool.create_async_session()
+        token = openai.aiosession.set(session)
+        try:
+            yield
+        finally:
+            openai.aiosession.reset(token)
+            await session.close()
+
+    def stats_text(self) -> str:
+        pool_text = self.pool.stats_text()
+        return f'Connections: {pool_text}' if pool_text is not None else None
+
+    def connection_stats(self) -> {}:
+        return self.pool.stats_to_dict()
+
+    def close(self):
+        self.pool.close()
+
+
+class UsageStats:
+
+    def __init__(self) -> None:
+        # Token accounting of a fake backend or server. Shared by all threads answering requests.
+        super().__init__()
+        self._lock = threading.Lock()
+        self.requests: int = 0
+        self.rate_limited: int = 0
+        self.prompt_tokens: int = 0
+        self.completion_tokens: int = 0
+
+    def record_completion(self, completion: {}):
+        with self._lock:
+            self.requests = self.requests + 1
+            self.prompt_tokens = self.prompt_tokens + completion['usage']['prompt_tokens']
+            self.completion_tokens = self.completion_tokens + completion['usage']['completion_tokens']
+
+    def record_rate_limited(self):
+        with self._lock:
+            self.requests = self.requests + 1
+            self.rate_limited = self.rate_limited + 1
+
+    def to_dict(self) -> {}:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'rate_limited': self.rate_limited,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'total_tokens': self.prompt_tokens + self.completion_tokens
+            }
+
+    def text(self) -> str:
+        d = self.to_dict()
+        return f'{d["requests"]} requests ({d["rate_limited"]} rate limited), ' \
+               f'{d["prompt_tokens"]} prompt and {d["completion_tokens"]} completion tokens'
+
+
+class RateLimitInjector:
+
+    def __init__(self,
+                 rate_limit_probability: float = 0.0,
+                 requests_per_minute: int = -1,
+                 tokens_per_minute: int = -1,
+                 seed: int = None) -> None:
+        # Decides which fake requests are answered with a rate limit error (HTTP 429):
+        # Randomly with the given probability, and every request exceeding the given limits.
+        super().__init__()
+        self.rate_limit_probability: float = float(rate_limit_probability)
+        self.limiter = rate_limiter.RateLimiter(requests_per_minute=requests_per_minute,
+                                                tokens_per_minute=tokens_per_minute)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def check(self, request: {}) -> float:
+        # Returns None, if the request is accepted. Otherwise, the seconds the client should wait.
+        with self._lock:
+            if self.rate_limit_probability > 0 and self._rng.random() < self.rate_limit_probability:
+                return 1.0
+
+        if not self.limiter.is_limited():
+            return None
+        estimated_tokens = utils.estimate_message_tokens(request.get('messages', []))
+        wait_seconds, reservation = self.limiter.try_acquire(estimated_tokens=estimated_tokens)
+        if reservation is None:
+            return max(wait_seconds, 0.001)
+        return None
+
+
+def create_echo_completion(request: {}) -> {}:
+    # Answers with the newest message. Batches stay numbered, so they are mapped back correctly.
+    messages = request.get('messages', [])
+    prompt_text = ''.join([str(m.get('content', '')) for m in messages])
+    answer = str(messages[-1].get('content', '')) if len(messages) > 0 else ''
+
+    prompt_tokens = utils.estimate_tokens(prompt_text)
+    completion_tokens = utils.estimate_tokens(answer)
+
+    return {
+        'id': 'chatcmpl-fake-' + uuid.uuid4().hex,
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request.get('model', 'fake'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': answer},
+            'finish_reason': 'stop'
+        }],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+    }
+
+
+class FakeResponse(dict):
+    # Behaves like the response objects of the openAI library: Fields are readable as attributes
+    def __init__(self, payload: {}, organization: str = 'fake-organization', response_ms: int = 0) -> None:
+        super().__init__({key: FakeResponse.wrap(payload[key]) for key in payload})
+        self.__dict__['organization'] = organization
+        self.__dict__['response_ms'] = int(response_ms)
+
+    @staticmethod
+    def wrap(value):
+        if isinstance(value, dict):
+            return FakeResponse(payload=value)
+        if isinstance(value, list):
+            return [FakeResponse.wrap(v) for v in value]
+        return value
+
+    @property
+    def openai_id(self) -> str:
+        return self.get('id', None)
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def to_dict_recursive(self) -> {}:
+        return json.loads(json.dumps(self))
+
+
+class FakeBackend(ModelBackend):
+
+    def __init__(self,
+                 latency: distribution.Distribution = None,
+                 rate_limit_probability: float = 0.0,
+                 requests_per_minute: int = -1,
+                 tokens_per_minute: int = -1,
+                 seed: int = None) -> None:
+        # Answers every request in-process with the newest message, after a sampled latency.
+        # Rate limit errors are raised like the openAI library does, so retries and backoff are exercised too.
+        super().__init__()
+        self.latency: distribution.Distribution = latency if latency is not None else distribution.Distribution()
+        self.injector = RateLimitInjector(rate_limit_probability=rate_limit_probability,
+                                          requests_per_minute=requests_per_minute,
+                                          tokens_per_minute=tokens_per_minute, seed=seed)
+        self.usage = UsageStats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def create(self, **parameters):
+        latency = self._sample_latency()
+        time.sleep(latency)
+        return self._answer(request=parameters, latency=latency)
+
+    async def acreate(self, **parameters):
+        latency = self._sample_latency()
+        await asyncio.sleep(latency)
+        return self._answer(request=parameters, latency=latency)
+
+    def stats_text(self) -> str:
+        return f'Fake backend: {self.usage.text()}'
+
+    def _sample_latency(self) -> float:
+        with self._rng_lock:
+            return self.latency.sample(rng=self._rng)
+
+    def _answer(self, request: {}, latency: float) -> FakeResponse:
+        retry_after = self.injector.check(request=request)
+        if retry_after is not None:
+            self.usage.record_rate_limited()
+            raise openai.error.RateLimitError('Rate limit reached (injected by the fake backend).',
+                                              http_status=429,
+                                              headers={'retry-after-ms': str(int(retry_after * 1000))})
+
+        completion = create_echo_completion(request=request)
+        self.usage.record_completion(completion=completion)
+        return FakeResponse(payload=completion, response_ms=int(latency * 1000))
+
+
+def create_backend(name: str,
+                   api_key: str = None,
+                   api_base: str = None,
+                   fake_latency: str = None,
+                   fake_rate_limit: float = 0.0,
+                   pool: connection_pool.ConnectionPool = None) -> ModelBackend:
+    name = str(name).strip().lower()
+    if name == BACKEND_OPENAI:
+        return OpenAIBackend(api_key=api_key, api_base=api_base, pool=pool)
+    if name == BACKEND_FAKE:
+        latency = distribution.Distribution.parse(fake_latency) if fake_latency is not None else None
+        log.write(f'Using the fake backend. Latency: {latency}, rate limit errors: {fake_rate_limit}')
+        return FakeBackend(latency=latency, rate_limit_probability=fake_rate_limit)
+    raise AttributeError(f'Unknown backend: "{name}". Choose from: {", ".join(backend_names)}.')
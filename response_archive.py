@@ -0,0 +1,235 @@
+import argparse
+import atexit
+import glob
+import gzip
+import json
+import os
+import re
+import threading
+
+from util import log
+
+# Every response of the model is appended to a compressed JSONL segment in 'log/model/'.
+# Segments are rotated after a number of records, so a season run leaves a handful of files instead of one per call.
+# 'index.tsv' maps the id of every response to its segment and line.
+_segment_max_records: int = 10000
+_flush_interval_records: int = 64
+
+_segment_file_pattern = re.compile(r'^responses-(\d+)\.jsonl\.gz$')
+_index_file_name: str = 'index.tsv'
+
+# Responses were dumped as one JSON file per API call, before the archive existed
+_legacy_dump_file_pattern: str = 'gpt_response_dump-*.json'
+
+# What a response answers, recorded as 'kind'. Only translations and batches of translations are reused by the cache.
+KIND_TRANSLATION: str = 'translation'
+KIND_BATCH: str = 'batch'
+KIND_SUMMARY: str = 'summary'
+
+
+def segment_file_name(segment_number: int) -> str:
+    return f'responses-{segment_number:05d}.jsonl.gz'
+
+
+class ResponseArchive:
+
+    def __init__(self,
+                 archive_dir: str,
+                 segment_max_records: int = _segment_max_records,
+                 flush_interval_records: int = _flush_interval_records) -> None:
+        super().__init__()
+        assert archive_dir is not None
+
+        self.archive_dir: str = str(archive_dir)
+        self.segment_max_records: int = max(1, int(segment_max_records))
+        self.flush_interval_records: int = max(1, int(flush_interval_records))
+
+        self._lock = threading.Lock()
+        self._segment_file = None
+        self._index_file = None
+        self._segment_number: int = 0
+        self._segment_records: int = 0
+        self._pending_records: int = 0
+        self.records_written: int = 0
+
+    def append(self, record: {}):
+        # Serializes the record once, as a single compact line
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        record_id = str(record.get('id', ''))
+
+        with self._lock:
+            if self._segment_file is None or self._segment_records >= self.segment_max_records:
+                self._rotate()
+
+            self._segment_file.write(line + '\n')
+            self._index_file.write(f'{record_id}\t{self._segment_number}\t{self._segment_records}\n')
+            self._segment_records = self._segment_records + 1
+            self._pending_records = self._pending_records + 1
+            self.records_written = self.records_written + 1
+
+            if self._pending_records >= self.flush_interval_records:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+            if self._index_file is not None:
+                self._index_file.close()
+                self._index_file = None
+                atexit.unregister(self.close)
+
+    def _flush(self):
+        self._pending_records = 0
+        if self._segment_file is not None:
+            # a sync flush makes everything written so far readable, even if the process is killed afterwards
+            self._segment_file.flush()
+            self._index_file.flush()
+
+    def _rotate(self):
+        self._close_segment()
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        # A new run never appends to the segment of a previous run, as it might not be complete
+        self._segment_number = max([0] + list_segment_numbers(archive_dir=self.archive_dir)) + 1
+        self._segment_records = 0
+        segment_file_path = os.path.join(self.archive_dir, segment_file_name(segment_number=self._segment_number))
+        self._segment_file = gzip.open(segment_file_path, 'wt', encoding='utf-8')
+
+        if self._index_file is None:
+            self._index_file = open(os.path.join(self.archive_dir, _index_file_name), 'a', encoding='utf-8')
+            # The last records must reach the disk, even if nobody closes the archive.
+            # Only registered while files are open, so closed archives are not kept alive until the exit.
+            atexit.register(self.close)
+        log.write(f'Archiving model responses in: {segment_file_path}', print_to_console=False)
+
+    def _close_segment(self):
+        if self._segment_file is None:
+            return
+        self._flush()
+        self._segment_file.close()
+        self._segment_file = None
+
+
+def list_segment_numbers(archive_dir: str) -> [int]:
+    if not os.path.isdir(archive_dir):
+        return []
+
+    numbers = []
+    for file_name in os.listdir(archive_dir):
+        match = _segment_file_pattern.match(file_name)
+        if match is not None:
+            numbers.append(int(match.group(1)))
+    return sorted(numbers)
+
+
+class ResponseArchiveReader:
+
+    def __init__(self, archive_dir: str) -> None:
+        super().__init__()
+        assert archive_dir is not None
+        self.archive_dir: str = str(archive_dir)
+
+    def load_index(self) -> {str: [int, int]}:
+        # Maps the id of every archived response to its segment number and line
+        index = {}
+        index_file_path = os.path.join(self.archive_dir, _index_file_name)
+        if not os.path.exists(index_file_path):
+            return index
+
+        f = open(index_file_path, 'r', encoding='utf-8')
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) == 3:
+                index[parts[0]] = (int(parts[1]), int(parts[2]))
+        f.close()
+        return index
+
+    def get(self, record_id: str) -> {}:
+        # Returns the archived response with the given id, or None
+        location = self.load_index().get(str(record_id), None)
+        if location is None:
+            return None
+
+        segment_number, line_number = location
+        for i, record in enumerate(self.segment_records(segment_number=segment_number)):
+            if i == line_number:
+                return record
+        return None
+
+    def segment_records(self, segment_number: int):
+        segment_file_path = os.path.join(self.archive_dir, segment_file_name(segment_number=segment_number))
+        f = gzip.open(segment_file_path, 'rt', encoding='utf-8')
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # the last record may be incomplete, if the run was killed while writing it
+                    return
+        except (EOFError, OSError):
+            # segments of killed runs end without a gzip trailer
+            return
+        finally:
+            f.close()
+
+    def records(self, include_legacy_dumps: bool = True):
+        # Yields every archived response, oldest segments first. The dumps of older versions follow.
+        for segment_number in list_segment_numbers(archive_dir=self.archive_dir):
+            yield from self.segment_records(segment_number=segment_number)
+
+        if not include_legacy_dumps:
+            return
+        for dump_file in glob.glob(os.path.join(self.archive_dir, _legacy_dump_file_pattern)):
+            try:
+                f = open(dump_file, 'r', encoding='utf-8')
+                dump = json.load(f)
+                f.close()
+            except Exception as e:
+                log.write(f'Failed to read dump: {dump_file}', print_to_console=False)
+                log.write_exception(exception=e, print_to_console_message=False)
+                continue
+            yield dump
+
+    def query(self, model: str = None, contains: str = None, limit: int = -1):
+        # Yields the responses of models starting with 'model', whose prompt or answer contains 'contains'
+        found = 0
+        for record in self.records():
+            if 0 <= limit <= found:
+                return
+            if model is not None and not str(record.get('model', '')).startswith(model):
+                continue
+            if contains is not None and contains not in str(record.get('original_prompt', '')) and \
+                    contains not in str(record.get('message_content', '')):
+                continue
+            found = found + 1
+            yield record
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Queries the archive of model responses.')
+    parser.add_argument('-dir', '--directory', type=str, required=False, default='log' + os.sep + 'model',
+                        help='The archive directory. If empty, "log/model" is used.')
+    parser.add_argument('--id', type=str, required=False,
+                        help='Prints the response with this id.')
+    parser.add_argument('--model', type=str, required=False,
+                        help='Prints the responses of models starting with this name.')
+    parser.add_argument('--contains', type=str, required=False,
+                        help='Prints the responses whose prompt or answer contains this text.')
+    parser.add_argument('--limit', type=int, required=False, default=-1,
+                        help='Maximum number of responses to print. If empty, all are printed.')
+    parser.add_argument('--count', action='store_true',
+                        help='Prints the number of matching responses instead of the responses.')
+    args = parser.parse_args()
+
+    reader = ResponseArchiveReader(archive_dir=args.directory)
+    if args.id is not None:
+        print(json.dumps(reader.get(record_id=args.id), indent=2, ensure_ascii=False))
+    elif args.count:
+        print(sum(1 for _ in reader.query(model=args.model, contains=args.contains, limit=args.limit)))
+    else:
+        for r in reader.query(model=args.model, contains=args.contains, limit=args.limit):
+            print(json.dumps(r, ensure_ascii=False))
@@ -0,0 +1,313 @@
+import json
+import os
+import threading
+import time
+
+from util import instrumentation, log
+
+# Estimated prices in USD per 1000 prompt and completion tokens. Check https://openai.com/pricing for changes.
+# Model names are matched by their longest known prefix, e.g. 'gpt-3.5-turbo-0613' uses the 'gpt-3.5-turbo' price.
+_prices_per_1k_tokens: {str: [float, float]} = {
+    'gpt-3.5-turbo': (0.0015, 0.002),
+    'gpt-3.5-turbo-16k': (0.003, 0.004),
+    'gpt-4': (0.03, 0.06),
+    'gpt-4-32k': (0.06, 0.12)
+}
+
+
+def price_per_1k_tokens(gpt_model_name: str) -> [float, float]:
+    # Returns None, if the price of the model is unknown
+    matches = [name for name in _prices_per_1k_tokens if str(gpt_model_name).startswith(name)]
+    if len(matches) == 0:
+        return None
+    return _prices_per_1k_tokens[max(matches, key=len)]
+
+
+def estimate_cost(gpt_model_name: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price = price_per_1k_tokens(gpt_model_name=gpt_model_name)
+    if price is None:
+        return None
+    return round((prompt_tokens * price[0] + completion_tokens * price[1]) / 1000, 6)
+
+
+def create_report_file_path(name: str = 'run') -> str:
+    return log.log_dir_base + 'log' + os.sep + 'report' + os.sep + f'{name}-{time.strftime("%Y%m%d-%H%M%S")}.json'
+
+
+class FileReport:
+
+    def __init__(self, file_path: str, out_file_path: str, cues: int, pending: int, skipped: int = 0,
+                 skip_tokens_saved: int = 0, reused: int = 0) -> None:
+        # Accounting of a single translated file. 'pending' are the cues that still need to be translated.
+        # 'skipped' of them needed no translation and were kept as they are.
+        # 'reused' cues kept their translation from before the source was revised, they are not pending.
+        super().__init__()
+        self.file_path: str = str(file_path)
+        self.out_file_path: str = str(out_file_path)
+        self.cues: int = int(cues)
+        self.pending: int = int(pending)
+        self.skipped: int = int(skipped)
+        self.skip_tokens_saved: int = int(skip_tokens_saved)
+        self.reused: int = int(reused)
+
+        self.requests: int = 0
+        self.prompt_tokens: int = 0
+        self.completion_tokens: int = 0
+        self.retries: int = 0
+        self.backoff_ms: int = 0
+
+        self.elapsed_ms: int = 0
+        self.spans: {str: {}} = None
+        self._start_time: int = None
+        self._spans_at_start: {} = None
+
+    def start(self, measure_spans: bool = True):
+        # Files translated at the same time share their spans, so they can only be measured for the whole run
+        self._start_time = time.time_ns()
+        self._spans_at_start = instrumentation.snapshot() if measure_spans else None
+
+    def record_responses(self, gpt_responses: []):
+        for gpt_response in gpt_responses:
+            self.requests = self.requests + 1
+            self.prompt_tokens = self.prompt_tokens + gpt_response.prompt_tokens
+            self.completion_tokens = self.completion_tokens + gpt_response.completion_tokens
+            self.retries = self.retries + gpt_response.retry_count
+            self.backoff_ms = self.backoff_ms + gpt_response.backoff_ms
+
+    def finish(self):
+        if self._start_time is not None:
+            self.elapsed_ms = int((time.time_ns() - self._start_time) / 1_000_000)
+        if self._spans_at_start is not None:
+            self.spans = instrumentation.since(older_snapshot=self._spans_at_start)
+
+    def cues_per_second(self) -> float:
+        if self.elapsed_ms <= 0:
+            return None
+        return round(self.pending / (self.elapsed_ms / 1000), 3)
+
+    def text(self, gpt_model_name: str) -> str:
+        cost = estimate_cost(gpt_model_name=gpt_model_name, prompt_tokens=self.prompt_tokens,
+                             completion_tokens=self.completion_tokens)
+        cost_text = f', about ${cost:.4f}' if cost is not None else ''
+        skipped_text = f', {self.skipped} lines skipped (about {self.skip_tokens_saved} tokens saved)' \
+            if self.skipped > 0 else ''
+        reused_text = f', {self.reused} unchanged lines reused' if self.reused > 0 else ''
+        return f'{self.requests} API calls, {self.prompt_tokens} prompt and {self.completion_tokens} completion ' \
+               f'tokens{cost_text}, {self.cues_per_second()} cues/s{skipped_text}{reused_text}'
+
+    def to_dict(self, gpt_model_name: str) -> {}:
+        d = {
+            'file': self.file_path,
+            'output': self.out_file_path,
+            'cues': self.cues,
+            'cues_translated': self.pending,
+            'cues_skipped': self.skipped,
+            'skip_tokens_saved': self.skip_tokens_saved,
+            'cues_reused': self.reused,
+            'elapsed_seconds': self.elapsed_ms / 1000,
+            'cues_per_second': self.cues_per_second(),
+            'requests': self.requests,
+            'retries': self.retries,
+            'backoff_seconds': self.backoff_ms / 1000,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.prompt_tokens + self.completion_tokens,
+            'estimated_cost_usd': estimate_cost(gpt_model_name=gpt_model_name, prompt_tokens=self.prompt_tokens,
+                                                completion_tokens=self.completion_tokens)
+        }
+        if self.spans is not None:
+            d['spans'] = self.spans
+            d['throttled_seconds'] = instrumentation.throttled_seconds(spans=self.spans)
+        return d
+
+
+class RunReport:
+
+    def __init__(self, gpt_model_name: str, parameters: {} = None, measure_spans: bool = True) -> None:
+        # Accounting of a whole run: Every file, and the totals of every API call (e.g. history summaries too)
+        # Runs at the same time as other runs share their spans, they are not measured (see 'measure_spans').
+        super().__init__()
+        self.gpt_model_name: str = str(gpt_model_name)
+        self.parameters: {} = parameters if parameters is not None else {}
+        self.files: [FileReport] = []
+        # statistics of the deduplication of repeated lines, if used
+        self.deduplication: {} = None
+        # statistics of the lines kept as they are and of the formatting tags not sent to the model, if used
+        self.classifier: {} = None
+        self.tag_masking: {} = None
+        # statistics of the HTTP connections to the API, if the backend uses any
+        self.connection_pool: {} = None
+        # tokenizer used for estimates, and how many of them were memoized
+        self.token_estimates: {} = None
+
+        self.requests: int = 0
+        self.prompt_tokens: int = 0
+        self.completion_tokens: int = 0
+
+        self.elapsed_ms: int = 0
+        self.spans: {str: {}} = None
+        self._start_time: int = time.time_ns()
+        self._spans_at_start: {} = instrumentation.snapshot() if measure_spans else None
+
+    def add_file(self, file_report: FileReport):
+        self.files.append(file_report)
+
+    def finish(self, requests: int, prompt_tokens: int, completion_tokens: int):
+        self.requests = int(requests)
+        self.prompt_tokens = int(prompt_tokens)
+        self.completion_tokens = int(completion_tokens)
+        self.elapsed_ms = int((time.time_ns() - self._start_time) / 1_000_000)
+        if self._spans_at_start is not None:
+            self.spans = instrumentation.since(older_snapshot=self._spans_at_start)
+
+    def throttled_seconds(self) -> float:
+        if self.spans is None:
+            return None
+        return instrumentation.throttled_seconds(spans=self.spans)
+
+    def to_dict(self) -> {}:
+        cues_translated = sum([f.pending for f in self.files])
+        elapsed_seconds = self.elapsed_ms / 1000
+        spans = self.spans
+        if spans is None and self._spans_at_start is not None:
+            spans = instrumentation.since(older_snapshot=self._spans_at_start)
+        d = {
+            'model': self.gpt_model_name,
+            'parameters': self.parameters,
+            'files_translated': len(self.files),
+            'cues_translated': cues_translated,
+            'cues_reused': sum([f.reused for f in self.files]),
+            'elapsed_seconds': elapsed_seconds,
+            'cues_per_second': round(cues_translated / elapsed_seconds, 3) if elapsed_seconds > 0 else None,
+            'requests': self.requests,
+            'retries': sum([f.retries for f in self.files]),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.prompt_tokens + self.completion_tokens,
+            'estimated_cost_usd': estimate_cost(gpt_model_name=self.gpt_model_name, prompt_tokens=self.prompt_tokens,
+                                                completion_tokens=self.completion_tokens),
+            'throttled_seconds': instrumentation.throttled_seconds(spans=spans) if spans is not None else None,
+            'spans': spans,
+            'files': [f.to_dict(gpt_model_name=self.gpt_model_name) for f in self.files]
+        }
+        if self.deduplication is not None:
+            d['deduplication'] = self.deduplication
+        if self.classifier is not None:
+            d['classifier'] = self.classifier
+        if self.tag_masking is not None:
+            d['tag_masking'] = self.tag_masking
+        if self.connection_pool is not None:
+            d['connection_pool'] = self.connection_pool
+        if self.token_estimates is not None:
+            d['token_estimates'] = self.token_estimates
+        return d
+
+    def save(self, report_file_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(report_file_path)), exist_ok=True)
+        f = open(report_file_path, 'w', encoding='utf-8')
+        json.dump(self.to_dict(), f, indent=2)
+        f.close()
+        log.write(f'Saved run report: {report_file_path}')
+
+
+def target_report_file_path(report_file_path: str, target: str) -> str:
+    # The report of a single language next to the report of all languages, e.g. 'run.json' and 'run.de.de.json'
+    base, extension = os.path.splitext(report_file_path)
+    return f'{base}.{target}{extension if extension != "" else ".json"}'
+
+
+class FanOutReport:
+
+    def __init__(self, gpt_model_name: str, parameters: {} = None) -> None:
+        # Accounting of a run translating the same files into several languages at the same time.
+        # Every language has a run report of its own. Their time per stage overlaps, as all languages run at once.
+        super().__init__()
+        self.gpt_model_name: str = str(gpt_model_name)
+        self.parameters: {} = parameters if parameters is not None else {}
+        self.reports: {str: RunReport} = {}
+        self.files_parsed: int = 0
+        self.copies: int = 0
+
+        # the spans of all languages together, they cannot be told apart per language
+        self.spans: {str: {}} = None
+
+        self.elapsed_ms: int = 0
+        self._start_time: int = time.time_ns()
+        self._spans_at_start: {} = instrumentation.snapshot()
+        self._lock = threading.Lock()
+
+    def add(self, target: str, report: RunReport):
+        with self._lock:
+            self.reports[target] = report
+
+    def finish(self, files_parsed: int, copies: int):
+        self.files_parsed = int(files_parsed)
+        self.copies = int(copies)
+        self.elapsed_ms = int((time.time_ns() - self._start_time) / 1_000_000)
+        self.spans = instrumentation.since(older_snapshot=self._spans_at_start)
+
+    def target_dict(self, target: str) -> {}:
+        report = self.reports[target]
+        cues_translated = sum([f.pending for f in report.files])
+        elapsed_seconds = report.elapsed_ms / 1000
+        return {
+            'files_translated': len(report.files),
+            'cues_translated': cues_translated,
+            'elapsed_seconds': elapsed_seconds,
+            'cues_per_second': round(cues_translated / elapsed_seconds, 3) if elapsed_seconds > 0 else None,
+            'requests': report.requests,
+            'prompt_tokens': report.prompt_tokens,
+            'completion_tokens': report.completion_tokens,
+            'total_tokens': report.prompt_tokens + report.completion_tokens,
+            'estimated_cost_usd': estimate_cost(gpt_model_name=self.gpt_model_name,
+                                                prompt_tokens=report.prompt_tokens,
+                                                completion_tokens=report.completion_tokens)
+        }
+
+    def target_text(self, target: str) -> str:
+        d = self.target_dict(target=target)
+        cost_text = f', about ${d["estimated_cost_usd"]:.4f}' if d['estimated_cost_usd'] is not None else ''
+        return f'{d["cues_translated"]} cues in {d["elapsed_seconds"]:.1f}s ({d["cues_per_second"]} cues/s), ' \
+               f'{d["requests"]} API calls, {d["total_tokens"]} tokens{cost_text}'
+
+    def to_dict(self) -> {}:
+        with self._lock:
+            targets = {target: self.target_dict(target=target) for target in sorted(self.reports.keys())}
+        prompt_tokens = sum([d['prompt_tokens'] for d in targets.values()])
+        completion_tokens = sum([d['completion_tokens'] for d in targets.values()])
+        cues_translated = sum([d['cues_translated'] for d in targets.values()])
+        elapsed_seconds = self.elapsed_ms / 1000
+        spans = self.spans if self.spans is not None else instrumentation.since(older_snapshot=self._spans_at_start)
+        return {
+            'model': self.gpt_model_name,
+            'parameters': self.parameters,
+            'languages': len(targets),
+            'files_parsed': self.files_parsed,
+            'file_copies': self.copies,
+            'cues_translated': cues_translated,
+            'elapsed_seconds': elapsed_seconds,
+            'cues_per_second': round(cues_translated / elapsed_seconds, 3) if elapsed_seconds > 0 else None,
+            'requests': sum([d['requests'] for d in targets.values()]),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'estimated_cost_usd': estimate_cost(gpt_model_name=self.gpt_model_name, prompt_tokens=prompt_tokens,
+                                                completion_tokens=completion_tokens),
+            'throttled_seconds': instrumentation.throttled_seconds(spans=spans),
+            'spans': spans,
+            'targets': targets
+        }
+
+    def text(self) -> str:
+        d = self.to_dict()
+        cost_text = f', about ${d["estimated_cost_usd"]:.4f}' if d['estimated_cost_usd'] is not None else ''
+        return f'{d["cues_translated"]} cues into {d["languages"]} languages in {d["elapsed_seconds"]:.1f}s ' \
+               f'({d["cues_per_second"]} cues/s), {d["files_parsed"]} files parsed once, {d["requests"]} API calls, ' \
+               f'{d["total_tokens"]} tokens{cost_text}'
+
+    def save(self, report_file_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(report_file_path)), exist_ok=True)
+        f = open(report_file_path, 'w', encoding='utf-8')
+        json.dump(self.to_dict(), f, indent=2)
+        f.close()
+        log.write(f'Saved fan-out report: {report_file_path}')
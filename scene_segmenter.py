@@ -0,0 +1,83 @@
+import cue_chunker
+import subtitles
+
+# Splits subtitles into scenes at pauses in the dialogue (see 'cue_chunker.scene_starts').
+# With a session history, every scene is translated in a short session of its own, all scenes at the same time.
+# The lines right before a scene are sent along as context, so its first lines are not translated blindly.
+# This keeps most of the cohesion of one history over the whole file, without translating one line at a time.
+DEFAULT_OVERLAP: int = 3
+DEFAULT_MAX_SCENE_LINES: int = 40
+DEFAULT_MIN_SCENE_LINES: int = 3
+
+
+class Scene:
+    __slots__ = ['number', 'start', 'end', 'context']
+
+    def __init__(self, number: int, start: int, end: int, context: [int]) -> None:
+        # The lines at the positions from 'start' up to 'end' (excluded), and the positions of its context lines
+        super().__init__()
+        self.number: int = int(number)
+        self.start: int = int(start)
+        self.end: int = int(end)
+        self.context: [int] = context
+
+    def positions(self) -> range:
+        return range(self.start, self.end)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __str__(self):
+        return f'Scene #{self.number}: lines {self.start} to {self.end - 1}, {len(self.context)} lines of context'
+
+
+def segment(lines: [subtitles.Line],
+            gap_ms: int = cue_chunker.DEFAULT_SCENE_GAP_MS,
+            overlap: int = DEFAULT_OVERLAP,
+            max_lines: int = DEFAULT_MAX_SCENE_LINES,
+            min_lines: int = DEFAULT_MIN_SCENE_LINES) -> [Scene]:
+    # Scenes shorter than 'min_lines' are added to the previous scene: Their context would cost more than it helps.
+    # Scenes longer than 'max_lines' are split, so no session grows too long. Below one disables the limit.
+    # Every scene but the first gets up to 'overlap' lines before it as context.
+    if len(lines) == 0:
+        return []
+    starts = sorted(cue_chunker.scene_starts(lines=lines, gap_ms=gap_ms))
+
+    bounds = []
+    start = 0
+    for scene_start in starts + [len(lines)]:
+        if len(bounds) > 0 and scene_start - start < min_lines:
+            # too short, joining the previous scene
+            bounds[-1][1] = scene_start
+        else:
+            bounds.append([start, scene_start])
+        start = scene_start
+
+    if max_lines > 0:
+        split_bounds = []
+        for start, end in bounds:
+            # parts of about the same size, instead of a full and a short one
+            length = end - start
+            parts = -(-length // max_lines)
+            for part in range(parts):
+                split_bounds.append([start + length * part // parts, start + length * (part + 1) // parts])
+        bounds = split_bounds
+
+    scenes = []
+    for start, end in bounds:
+        context = list(range(max(0, start - max(0, overlap)), start))
+        scenes.append(Scene(number=len(scenes), start=start, end=end, context=context))
+    return scenes
+
+
+def scene_stats(scenes: [Scene]) -> {}:
+    if len(scenes) == 0:
+        return {'scenes': 0, 'lines': 0, 'average_lines': None, 'max_lines': None, 'context_lines': 0}
+    lengths = [len(scene) for scene in scenes]
+    return {
+        'scenes': len(scenes),
+        'lines': sum(lengths),
+        'average_lines': round(sum(lengths) / len(scenes), 1),
+        'max_lines': max(lengths),
+        'context_lines': sum([len(scene.context) for scene in scenes])
+    }
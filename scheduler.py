@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+
+import checkpoint
+import deduplication
+import run_report
+import source_revision
+import subtitles
+import translation_engine
+from util import log
+
+
+class FileJob:
+
+    def __init__(self,
+                 subs: subtitles.Subtitles,
+                 out_file_path: str,
+                 journal: checkpoint.TranslationJournal,
+                 pending: [int],
+                 writer: subtitles.SubtitleWriter = None,
+                 report: run_report.FileReport = None,
+                 duplicates: deduplication.FileDuplicates = None,
+                 revision: source_revision.FileRevision = None) -> None:
+        super().__init__()
+        assert subs is not None
+        assert out_file_path is not None
+
+        self.subs: subtitles.Subtitles = subs
+        self.out_file_path: str = str(out_file_path)
+        self.journal: checkpoint.TranslationJournal = journal
+        self.pending: [int] = pending if pending is not None else list(range(len(subs)))
+        self.writer: subtitles.SubtitleWriter = writer
+        self.report: run_report.FileReport = report
+        self.duplicates: deduplication.FileDuplicates = duplicates
+        self.revision: source_revision.FileRevision = revision
+
+        self.batches: [[int]] = []
+        self.translations: {int: str} = {}
+        self.lines_remaining: int = len(self.pending)
+        self.batches_in_flight: int = 0
+        self.finished: bool = False
+
+    def copy_count(self, positions: [int] = None) -> int:
+        # Repeats of the given positions, which are not translated themselves. If None, of every pending position.
+        if self.duplicates is None:
+            return 0
+        return self.duplicates.copy_count(positions=positions if positions is not None else self.pending)
+
+    def is_done(self) -> bool:
+        return len(self.batches) == 0 and self.batches_in_flight == 0
+
+
+class FileScheduler:
+
+    def __init__(self,
+                 engine: translation_engine.TranslationEngine,
+                 jobs: [FileJob],
+                 on_file_finished=None,
+                 progress_callback=None) -> None:
+        # Translates multiple files at the same time. All files share the request slots of the engine.
+        # The next request is always taken from the file with the most lines remaining,
+        # so the longest files do not end up being translated alone at the end.
+        super().__init__()
+        assert engine is not None
+        assert jobs is not None
+
+        self.engine: translation_engine.TranslationEngine = engine
+        self.jobs: [FileJob] = jobs
+        self.on_file_finished = on_file_finished
+        self.progress_callback = progress_callback
+
+        self.lines_total: int = sum([len(job.subs) for job in jobs])
+        self.lines_completed: int = sum([len(job.subs) - len(job.pending) - job.copy_count() for job in jobs])
+        self.files_finished: int = 0
+        self.elapsed_ms: int = 0
+
+    def run(self):
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        for job in self.jobs:
+            job.batches = self.engine.create_batches(subs=job.subs, pending=job.pending)
+
+        log.write(f'Translating {len(self.jobs)} files with up to {self.engine.concurrency} requests in flight.',
+                  print_to_console=False)
+        start_time = time.time_ns()
+
+        # Files without pending lines are finished right away
+        for job in self.jobs:
+            if job.is_done():
+                self._finish(job=job)
+
+        async with self.engine.model.backend.connection_pool():
+            workers = [self._work() for _ in range(self.engine.concurrency)]
+            await asyncio.gather(*workers)
+
+        self.elapsed_ms = int((time.time_ns() - start_time) / 1_000_000)
+
+    def _next_job(self) -> FileJob:
+        candidates = [job for job in self.jobs if len(job.batches) > 0]
+        if len(candidates) == 0:
+            return None
+        return max(candidates, key=lambda job: job.lines_remaining)
+
+    async def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            batch = job.batches.pop(0)
+            job.batches_in_flight = job.batches_in_flight + 1
+            job.lines_remaining = job.lines_remaining - len(batch)
+
+            translations, gpt_responses = await self.engine.translate_batch_async(subs=job.subs, batch=batch,
+                                                                                  journal=job.journal,
+                                                                                  writer=job.writer,
+                                                                                  duplicates=job.duplicates)
+            for i in range(len(batch)):
+                job.translations[batch[i]] = translations[i]
+                if job.duplicates is not None:
+                    for position in job.duplicates.copies.get(batch[i], []):
+                        job.translations[position] = translations[i]
+            job.batches_in_flight = job.batches_in_flight - 1
+            if job.report is not None:
+                job.report.record_responses(gpt_responses=gpt_responses)
+
+            self.lines_completed = self.lines_completed + len(batch) + job.copy_count(positions=batch)
+            if self.progress_callback is not None:
+                self.progress_callback(self, gpt_responses)
+
+            if job.is_done():
+                self._finish(job=job)
+
+    def _finish(self, job: FileJob):
+        if job.finished:
+            return
+
+        for position in job.translations:
+            job.subs[position].spoken_line = job.translations[position]
+
+        job.finished = True
+        self.files_finished = self.files_finished + 1
+        log.write(f'Finished translating: {os.path.basename(job.out_file_path)}', print_to_console=False)
+        if self.on_file_finished is not None:
+            self.on_file_finished(job)
@@ -0,0 +1,141 @@
+import difflib
+import json
+import os
+
+import checkpoint
+import deduplication
+import subtitles
+from util import log
+
+# Source subtitles are often revised after they were translated: timing fixes, a few corrected lines.
+# Next to every translation, a snapshot of the source texts it was translated from is kept.
+# Once the source is revised, it is compared to this snapshot: Lines whose text is unchanged keep their previous
+# translation, with the timing of the revised source. Only new and edited lines are sent to the model.
+# Texts are compared like duplicates are (see 'deduplication.normalize_text').
+_snapshot_version: int = 1
+
+
+def snapshot_file_path(out_file_path: str) -> str:
+    # Not ending in '.srt', so the snapshot is never taken for a subtitle file to translate
+    return str(out_file_path) + '.source.json'
+
+
+def remove_snapshot(out_file_path: str):
+    # A translation created without a snapshot makes an older snapshot wrong
+    file_path = snapshot_file_path(out_file_path=out_file_path)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+        log.write(f'Removed outdated source snapshot: {file_path}', print_to_console=False)
+
+
+class FileRevision:
+
+    def __init__(self, subs: subtitles.Subtitles, out_file_path: str) -> None:
+        # Must be created before any line of 'subs' is translated, as it keeps their source texts for the snapshot
+        super().__init__()
+        assert subs is not None
+        assert out_file_path is not None
+
+        self.out_file_path: str = str(out_file_path)
+        self.snapshot_file_path: str = snapshot_file_path(out_file_path=out_file_path)
+        self.source_texts: [str] = [line.spoken_line for line in subs.lines]
+
+        # lines at the same place as in the snapshot, lines found elsewhere in it, lines to translate
+        self.unchanged: int = 0
+        self.moved: int = 0
+        self.changed: int = 0
+
+    def has_snapshot(self) -> bool:
+        return os.path.exists(self.snapshot_file_path) and os.path.exists(self.out_file_path)
+
+    def restore(self, subs: subtitles.Subtitles, pending: [int],
+                journal: checkpoint.TranslationJournal = None) -> [int]:
+        # Applies the previous translation of every pending line whose source text is unchanged.
+        # Returns the positions of all lines that still need to be translated.
+        # Restored lines are recorded in the journal, as the previous translation is replaced once the file is done.
+        if not self.has_snapshot():
+            return pending
+
+        previous_texts, previous_translations = self._load_previous()
+        if previous_texts is None:
+            return pending
+
+        # unchanged lines in the same order are matched by position, so repeated texts keep their own translation
+        texts = [deduplication.normalize_text(text) for text in self.source_texts]
+        previous_positions: {int: int} = {}
+        matcher = difflib.SequenceMatcher(a=previous_texts, b=texts, autojunk=False)
+        for previous_start, start, size in matcher.get_matching_blocks():
+            for offset in range(size):
+                previous_positions[start + offset] = previous_start + offset
+
+        # lines moved elsewhere are matched by their text
+        translations_by_text: {str: str} = {}
+        for previous_text, previous_translation in zip(previous_texts, previous_translations):
+            translations_by_text.setdefault(previous_text, previous_translation)
+
+        remaining = []
+        for position in pending:
+            previous_position = previous_positions.get(position, None)
+            if previous_position is not None:
+                translation = previous_translations[previous_position]
+                self.unchanged = self.unchanged + 1
+            elif texts[position] in translations_by_text:
+                translation = translations_by_text[texts[position]]
+                self.moved = self.moved + 1
+            else:
+                remaining.append(position)
+                continue
+
+            if journal is not None:
+                journal.record(position=position, source_text=subs[position].spoken_line, translation=translation)
+            subs[position].spoken_line = translation
+        self.changed = len(remaining)
+
+        log.write(f'Revision: {self.stats_text()}.')
+        return remaining
+
+    def reused(self) -> int:
+        return self.unchanged + self.moved
+
+    def stats_text(self) -> str:
+        return f'{self.reused()} lines unchanged since the previous translation ({self.moved} of them moved), ' \
+               f'{self.changed} new or edited lines to translate'
+
+    def save(self):
+        # Called once the translation is saved, so the snapshot always belongs to the translation next to it
+        snapshot = {
+            'version': _snapshot_version,
+            'cues': len(self.source_texts),
+            'sources': self.source_texts
+        }
+        tmp_file_path = self.snapshot_file_path + '.tmp'
+        f = open(tmp_file_path, 'w', encoding='utf-8')
+        json.dump(snapshot, f, ensure_ascii=False)
+        f.close()
+        os.replace(tmp_file_path, self.snapshot_file_path)
+
+    def _load_previous(self) -> [[str], [str]]:
+        # Returns the normalized source texts of the snapshot and the translations of the previous output.
+        # None, if they cannot be used: Then every line is translated again.
+        try:
+            f = open(self.snapshot_file_path, 'r', encoding='utf-8')
+            snapshot = json.load(f)
+            f.close()
+            previous_subs = subtitles.Subtitles(input_file_path=self.out_file_path)
+        except Exception as e:
+            log.write(f'Failed to read the previous translation. Translating every line: {self.out_file_path}')
+            log.write_exception(exception=e, print_to_console_message=False)
+            return None, None
+
+        if snapshot.get('version', None) != _snapshot_version:
+            log.write(f'Unknown source snapshot version. Translating every line: {self.snapshot_file_path}')
+            return None, None
+        sources = snapshot.get('sources', [])
+        if len(sources) != len(previous_subs):
+            # the translation was replaced by a run without snapshots, or edited by hand
+            log.write(f'The previous translation does not match its source snapshot. Translating every line: '
+                      f'{self.out_file_path}')
+            return None, None
+
+        return [deduplication.normalize_text(text) for text in sources], \
+            [line.spoken_line for line in previous_subs.lines]
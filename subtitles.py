@@ -1,4 +1,7 @@
+import codecs
 import os
+import re
+import threading
 
 from util import log
 
@@ -7,7 +10,8 @@ compatible_file_formats = ['srt']
 
 class Subtitles:
 
-    def __init__(self, input_file_path: str) -> None:
+    def __init__(self, input_file_path: str, lines: [] = None) -> None:
+        # If 'lines' are given, they are used instead of reading the file again
         super().__init__()
 
         assert input_file_path is not None
@@ -22,50 +26,21 @@ class Subtitles:
         self.file_name = os.path.basename(input_file_path)
         self._iter_progress: int = 0
 
-        # reading line by line
-        lines_raw = None
-        with open(input_file_path) as f:
-            lines_raw = [line.rstrip() for line in f]
-
-        self.lines = []
-        line_counter = 2
-
-        buffer_speaking_line = ''
-        buffer_start_time = ''
-        buffer_end_time = ''
+        self.input_file_path: str = input_file_path
+        if lines is not None:
+            self.lines: [Line] = lines
+            return
 
+        # reading line by line
         log.write(f'Parsing {self.file_name}', print_to_console=False)
-        for i in range(len(lines_raw)):
-            current_line = lines_raw[i]
-            current_line = str(current_line).strip()
-            separator_line_found = False
-
-            if current_line == str(line_counter):
-                # separator line found
-                separator_line_found = True
-                line_counter = line_counter + 1
-
-            elif '-->' in current_line:
-                # timestamp line found
-                buffer_start_time, buffer_end_time = current_line.strip().split(' --> ')
-                buffer_speaking_line = ''
-
-            else:
-                # default speaking line found
-                buffer_speaking_line = buffer_speaking_line + '\n' + current_line
-                buffer_speaking_line = buffer_speaking_line.strip()
-
-            # committing line
-            if separator_line_found:
-                self.lines.append(Line(
-                    index=line_counter - 2,
-                    start_time=buffer_start_time,
-                    end_time=buffer_end_time,
-                    spoken_line=buffer_speaking_line.strip()
-                ))
+        self.lines: [Line] = list(read_lines(input_file_path=input_file_path))
 
         log.write(f'Finished parsing {len(self.lines)} lines.', print_to_console=False)
 
+    def copy(self):
+        # The lines are copied too, so translating the copy does not change these lines
+        return Subtitles(input_file_path=self.input_file_path, lines=[line.copy() for line in self.lines])
+
     def file_name_without_extension(self):
         return self.file_name[:-4]
 
@@ -92,33 +67,285 @@ class Subtitles:
         return self.lines[progress]
 
     def format(self) -> str:
-        formatted_text = ''
-
-        for i in range(len(self)):
-            line: Line = self[i]
-
-            formatted_text = formatted_text + str(line.index) + '\n'
-            formatted_text = formatted_text + f'{line.start_time} --> {line.end_time}' + '\n'
-            formatted_text = formatted_text + line.spoken_line + '\n\n'
-
-        return formatted_text
+        return ''.join([line.format() for line in self.lines])
 
 
 class Line:
-    def __init__(self, index: int, start_time: str, end_time: str, spoken_line: str) -> None:
+    def __init__(self, index: int, start_time: [str, int], end_time: [str, int], spoken_line: str) -> None:
+        # Timestamps are given as SRT text (e.g. '00:01:02,500') or as milliseconds
         super().__init__()
         assert index is not None and start_time is not None and end_time is not None and spoken_line is not None
 
         self.index: int = int(index)
-        self.start_time: str = str(start_time).strip()
-        self.end_time: str = str(end_time).strip()
+        self.start_ms: int = start_time if isinstance(start_time, int) else parse_timestamp(text=start_time)
+        self.end_ms: int = end_time if isinstance(end_time, int) else parse_timestamp(text=end_time)
         self.spoken_line: str = str(spoken_line).strip()
 
+    @property
+    def start_time(self) -> str:
+        return format_timestamp(ms=self.start_ms)
+
+    @property
+    def end_time(self) -> str:
+        return format_timestamp(ms=self.end_ms)
+
+    def format(self) -> str:
+        return f'{self.index}\n{self.start_time} --> {self.end_time}\n{self.spoken_line}\n\n'
+
+    def copy(self):
+        return Line(index=self.index, start_time=self.start_ms, end_time=self.end_ms, spoken_line=self.spoken_line)
+
     def __str__(self):
         short_line = self.spoken_line.replace('\n', ' ').replace('  ', ' ').strip()
         return f'Subtitle line #{self.index}: "{short_line}": {self.start_time} -> {self.end_time}'
 
 
+# Matches the timing line of a cue, e.g. '00:01:02,500 --> 00:01:04,000'.
+# Dots are accepted instead of commas and anything after the end time (e.g. positions) is ignored.
+_timestamp_pattern = re.compile(r'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})')
+_timing_line_pattern = re.compile(r'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})')
+
+# Encodings tried in this order, if the file has no byte order mark. 'latin-1' accepts every byte.
+_fallback_encodings: [str] = ['utf-8', 'cp1252', 'latin-1']
+_byte_order_marks: [(bytes, str)] = [(codecs.BOM_UTF8, 'utf-8-sig'),
+                                     (codecs.BOM_UTF32_LE, 'utf-32'),
+                                     (codecs.BOM_UTF32_BE, 'utf-32'),
+                                     (codecs.BOM_UTF16_LE, 'utf-16'),
+                                     (codecs.BOM_UTF16_BE, 'utf-16')]
+_encoding_chunk_size: int = 1024 * 1024
+
+
+def parse_timestamp(text: str) -> int:
+    # Returns the milliseconds of a SRT timestamp
+    match = _timestamp_pattern.fullmatch(str(text).strip())
+    if match is None:
+        raise Exception(f'Invalid subtitle timestamp: "{text}"')
+
+    return _timestamp_to_ms(*match.groups())
+
+
+def _timestamp_to_ms(hours: str, minutes: str, seconds: str, fraction: str) -> int:
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction.ljust(3, '0'))
+
+
+def format_timestamp(ms: int) -> str:
+    return f'{ms // 3_600_000:02d}:{ms // 60_000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}'
+
+
+def detect_encoding(input_file_path: str) -> str:
+    f = open(input_file_path, 'rb')
+    try:
+        head = f.read(4)
+        # UTF-32 marks start with the UTF-16 ones, so they are checked first
+        for byte_order_mark, encoding in _byte_order_marks:
+            if head.startswith(byte_order_mark):
+                return encoding
+
+        for encoding in _fallback_encodings:
+            # decoding chunk by chunk, so large files are never held in memory
+            f.seek(0)
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                chunk = f.read(_encoding_chunk_size)
+                while len(chunk) > 0:
+                    decoder.decode(chunk)
+                    chunk = f.read(_encoding_chunk_size)
+                decoder.decode(b'', final=True)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+    finally:
+        f.close()
+
+    return _fallback_encodings[-1]
+
+
+def read_lines(input_file_path: str, encoding: str = None):
+    # Yields the subtitle lines of a file one by one, while it is read.
+    # Only the lines of the current cue are held in memory.
+    # Cues are separated by their timing lines and blank lines, their numbers are only kept as index.
+    # Missing, repeated or non-sequential numbers never merge cues.
+    if encoding is None:
+        encoding = detect_encoding(input_file_path=input_file_path)
+
+    last_index = 0
+    # the line with the number of the next cue, kept as text, in case it turns out to be part of the cue before it
+    next_index: str = None
+
+    # the current cue. It is only yielded once the next timing line is found, as a blank line inside its text
+    # would otherwise drop the text after it. Closed by a blank line, it takes no further text but such text.
+    cue_open = False
+    in_cue = False
+    cue_index = 0
+    cue_start = 0
+    cue_end = 0
+    cue_text: [str] = []
+
+    # newline=None: CRLF and CR line endings are read as LF
+    f = open(input_file_path, 'r', encoding=encoding, newline=None)
+    try:
+        for line_number, current_line in enumerate(f, start=1):
+            current_line = current_line.strip()
+
+            timing_match = _timing_line_pattern.match(current_line) if '-->' in current_line else None
+            if timing_match is not None:
+                if cue_open:
+                    # the previous cue was not closed by a blank line: its last line is the number of this cue
+                    if in_cue and len(cue_text) > 0 and cue_text[-1].isdigit():
+                        next_index = cue_text.pop()
+                    yield Line(index=cue_index, start_time=cue_start, end_time=cue_end,
+                               spoken_line='\n'.join(cue_text))
+
+                # timing line found, opening a new cue
+                cue_open = True
+                in_cue = True
+                cue_index = int(next_index) if next_index is not None else last_index + 1
+                groups = timing_match.groups()
+                cue_start = _timestamp_to_ms(*groups[:4])
+                cue_end = _timestamp_to_ms(*groups[4:])
+                cue_text = []
+                last_index = cue_index
+                next_index = None
+
+            elif current_line == '':
+                # a blank line closes the cue, unless it has no text yet
+                if in_cue and len(cue_text) > 0:
+                    in_cue = False
+
+            elif in_cue:
+                # default speaking line found
+                cue_text.append(current_line)
+
+            elif current_line.isdigit():
+                # number of the next cue. A number before it was part of the text of the closed cue (e.g. a year).
+                if next_index is not None and cue_open:
+                    log.write(f'Blank line inside the cue #{cue_index} of {os.path.basename(input_file_path)}, '
+                              f'adding the number before line {line_number} to it: "{next_index}"',
+                              print_to_console=False)
+                    cue_text.append(next_index)
+                next_index = current_line
+
+            elif cue_open:
+                # text after a blank line inside the cue, it continues the cue instead of being lost
+                log.write(f'Blank line inside the cue #{cue_index} of {os.path.basename(input_file_path)}, '
+                          f'adding line {line_number} to it: "{current_line}"', print_to_console=False)
+                if next_index is not None:
+                    # the number was part of the text as well
+                    cue_text.append(next_index)
+                    next_index = None
+                cue_text.append(current_line)
+                in_cue = True
+
+            else:
+                log.write(f'Ignoring line {line_number} of {os.path.basename(input_file_path)} before the first cue: '
+                          f'"{current_line}"', print_to_console=False)
+
+        # committing the last cue, even if the file does not end with a blank line
+        if cue_open:
+            yield Line(index=cue_index, start_time=cue_start, end_time=cue_end, spoken_line='\n'.join(cue_text))
+    finally:
+        f.close()
+
+
+class ParsedSubtitles:
+
+    def __init__(self) -> None:
+        # Parses every file only once, when it is translated into several languages at the same time.
+        # Every caller gets a copy of the lines, which it may change.
+        super().__init__()
+        self._parsed: {str: Subtitles} = {}
+        self._locks: {str: threading.Lock} = {}
+        self._lock = threading.Lock()
+        self.files_parsed: int = 0
+        self.copies: int = 0
+
+    def get(self, input_file_path: str) -> Subtitles:
+        key = os.path.abspath(input_file_path)
+        with self._lock:
+            file_lock = self._locks.setdefault(key, threading.Lock())
+
+        # a file requested by several callers at the same time is parsed by the first of them
+        with file_lock:
+            subs = self._parsed.get(key)
+            if subs is None:
+                subs = Subtitles(input_file_path=input_file_path)
+                self._parsed[key] = subs
+                self.files_parsed = self.files_parsed + 1
+
+        copy = subs.copy()
+        with self._lock:
+            self.copies = self.copies + 1
+        return copy
+
+
+class SubtitleWriter:
+
+    def __init__(self, out_file_path: str, buffer_lines: int = 64) -> None:
+        # Writes subtitle lines to disk while they are translated. Lines may arrive in any order:
+        # A line is only written once all lines before it are written.
+        # The file is written to a temporary path first: An existing output file always means a finished translation.
+        super().__init__()
+        assert out_file_path is not None
+
+        self.out_file_path: str = str(out_file_path)
+        self.tmp_file_path: str = self.out_file_path + '.tmp'
+        self.buffer_lines: int = max(1, int(buffer_lines))
+
+        self.next_position: int = 0
+        self._waiting: {int: str} = {}
+        self._buffer: [str] = []
+        self._file = None
+        self._file_opened: bool = False
+
+    def write(self, position: int, line: Line):
+        # Lines are formatted right away, so later changes to the line do not matter
+        position = int(position)
+        if position < self.next_position or position in self._waiting:
+            return
+        self._waiting[position] = line.format()
+
+        while self.next_position in self._waiting:
+            self._buffer.append(self._waiting.pop(self.next_position))
+            self.next_position = self.next_position + 1
+
+        if len(self._buffer) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        if len(self._buffer) == 0:
+            return
+
+        self._open()
+        self._file.write(''.join(self._buffer))
+        self._file.flush()
+        self._buffer = []
+
+    def finish(self, lines: [Line] = None):
+        # Writes every given line that was not written yet and moves the file to its final path
+        if lines is not None:
+            for position in range(self.next_position, len(lines)):
+                self.write(position=position, line=lines[position])
+
+        if len(self._waiting) > 0:
+            raise Exception(f'Cannot finish {self.out_file_path}: Line #{self.next_position} was never written.')
+
+        self._open()
+        self.close()
+        os.replace(self.tmp_file_path, self.out_file_path)
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        # A closed writer continues the file it started, if it is written to again
+        if self._file is None:
+            self._file = open(self.tmp_file_path, 'a' if self._file_opened else 'w', encoding='utf-8')
+            self._file_opened = True
+
+
 if __name__ == '__main__':
     print('Cannot run this file.')
 
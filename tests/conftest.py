@@ -0,0 +1,11 @@
+import pytest
+
+from util import log
+
+
+@pytest.fixture(autouse=True)
+def log_dir(tmp_path):
+    # Every test logs into a directory of its own, instead of the working directory
+    log.set_log_dir(str(tmp_path))
+    yield
+    log.shutdown()
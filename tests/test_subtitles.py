@@ -0,0 +1,36 @@
+import subtitles
+
+
+def write_file(tmp_path, text: str) -> str:
+    file_path = tmp_path / 'input.srt'
+    file_path.write_text(text, encoding='utf-8')
+    return str(file_path)
+
+
+def test_number_after_blank_line_inside_cue_is_kept(tmp_path):
+    file_path = write_file(tmp_path, '1\n00:00:01,000 --> 00:00:02,000\nIt was\n\n1984\n\n'
+                                     '2\n00:00:05,000 --> 00:00:06,000\nNext\n')
+    lines = list(subtitles.read_lines(input_file_path=file_path))
+
+    assert [line.index for line in lines] == [1, 2]
+    assert lines[0].spoken_line == 'It was\n1984'
+    assert lines[1].spoken_line == 'Next'
+    assert lines[1].start_ms == 5000
+
+
+def test_text_after_blank_line_inside_cue_is_kept(tmp_path):
+    file_path = write_file(tmp_path, '1\n00:00:01,000 --> 00:00:02,000\nHello\n\nthere\n\n'
+                                     '2\n00:00:03,000 --> 00:00:04,000\nSecond\n')
+    lines = list(subtitles.read_lines(input_file_path=file_path))
+
+    assert [line.spoken_line for line in lines] == ['Hello\nthere', 'Second']
+
+
+def test_cue_numbers_are_kept_as_index(tmp_path):
+    file_path = write_file(tmp_path, '7\n00:00:01,000 --> 00:00:02,000\nFirst\n\n'
+                                     '9\n00:00:03,000 --> 00:00:04,000\nSecond\n'
+                                     '12\n00:00:05,000 --> 00:00:06,000\nThird')
+    lines = list(subtitles.read_lines(input_file_path=file_path))
+
+    assert [line.index for line in lines] == [7, 9, 12]
+    assert [line.spoken_line for line in lines] == ['First', 'Second', 'Third']
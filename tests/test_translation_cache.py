@@ -0,0 +1,61 @@
+import response_archive
+import translation_cache
+
+_model_name = 'gpt-3.5-turbo'
+_initial_prompt = 'Translate into German.'
+
+
+def create_record(record_id: str, prompt: str, answer: str, kind: str = None) -> {}:
+    record = {
+        'id': record_id,
+        'model': _model_name + '-0613',
+        'answer.finish_reason': 'stop',
+        'original_prompt': prompt,
+        'message_content': answer,
+        'output_language': 'German',
+        'output_country': None
+    }
+    if kind is not None:
+        record['kind'] = kind
+    return record
+
+
+def write_archive(archive_dir: str, records: [{}]):
+    archive = response_archive.ResponseArchive(archive_dir=archive_dir)
+    for record in records:
+        archive.append(record)
+    archive.close()
+
+
+def warm_cache(tmp_path, records: [{}]) -> translation_cache.TranslationCache:
+    archive_dir = str(tmp_path / 'model')
+    write_archive(archive_dir=archive_dir, records=records)
+    cache = translation_cache.TranslationCache(cache_file_path=str(tmp_path / 'cache' / 'translations.sqlite'))
+    cache.warm_from_dumps(dump_dir=archive_dir, gpt_model_name=_model_name, initial_prompt=_initial_prompt,
+                          output_language='German', output_country=None)
+    return cache
+
+
+def cached_translation(cache: translation_cache.TranslationCache, text: str) -> str:
+    key = cache.create_key(gpt_model_name=_model_name, initial_prompt=_initial_prompt, output_language='German',
+                           output_country=None, text=text)
+    return cache.get(key=key)
+
+
+def test_summaries_are_not_warmed_as_translations(tmp_path):
+    cache = warm_cache(tmp_path, records=[
+        create_record('1', 'Hello', 'Hallo', kind=response_archive.KIND_TRANSLATION),
+        create_record('2', 'Hallo', 'Jemand grüßt.', kind=response_archive.KIND_SUMMARY)
+    ])
+
+    assert len(cache) == 1
+    assert cached_translation(cache, 'Hello') == 'Hallo'
+    assert cached_translation(cache, 'Hallo') is None
+    cache.close()
+
+
+def test_records_without_kind_are_warmed_as_translations(tmp_path):
+    cache = warm_cache(tmp_path, records=[create_record('1', 'Hello', 'Hallo')])
+
+    assert cached_translation(cache, 'Hello') == 'Hallo'
+    cache.close()
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import response_archive
+from util import log, utils
+
+# Number of cache writes that are collected before committing them to disk
+_commit_interval: int = 64
+
+
+def normalize_text(text: str) -> str:
+    # Whitespace differences must not lead to cache misses. Line breaks are kept, as they are part of the cue.
+    lines = str(text).strip().splitlines()
+    return '\n'.join([' '.join(line.split()) for line in lines])
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(str(text).encode(encoding='utf-8')).hexdigest()
+
+
+class TranslationCache:
+
+    def __init__(self, cache_file_path: str, max_entries: int = 100000) -> None:
+        super().__init__()
+        assert cache_file_path is not None
+        assert max_entries is not None
+
+        max_entries = int(max_entries)
+        if max_entries < 1:
+            raise AttributeError(f'Illegal cache size: {max_entries}. The cache must hold at least one entry.')
+
+        self.cache_file_path: str = str(cache_file_path)
+        self.max_entries: int = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+
+        parent_dir = os.path.dirname(os.path.abspath(self.cache_file_path))
+        os.makedirs(parent_dir, exist_ok=True)
+
+        # The connection is shared between threads, so every access is guarded by a lock
+        self._lock = threading.Lock()
+        self._pending_writes: int = 0
+        self._connection = sqlite3.connect(self.cache_file_path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS translations ('
+                                 'key TEXT PRIMARY KEY, '
+                                 'translation TEXT NOT NULL, '
+                                 'last_used INTEGER NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)')
+        self._connection.commit()
+        self._size: int = self._connection.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+
+        log.write(f'Translation cache: {self.cache_file_path} ({self._size} entries)', print_to_console=False)
+
+    @staticmethod
+    def create_key(gpt_model_name: str, initial_prompt: str, output_language: str, output_country: str,
+                   text: str) -> str:
+        return hash_text('\0'.join([
+            str(gpt_model_name),
+            hash_text(initial_prompt),
+            str(output_language).strip().lower(),
+            str(output_country).strip().lower(),
+            normalize_text(text)
+        ]))
+
+    def get(self, key: str) -> str:
+        with self._lock:
+            row = self._connection.execute('SELECT translation FROM translations WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses = self.misses + 1
+                return None
+
+            # Refreshing the entry, so it is evicted last
+            self.hits = self.hits + 1
+            self._connection.execute('UPDATE translations SET last_used = ? WHERE key = ?', (time.time_ns(), key))
+            self._count_write()
+            return row[0]
+
+    def put(self, key: str, translation: str):
+        if translation is None:
+            return
+
+        with self._lock:
+            exists = self._connection.execute('SELECT 1 FROM translations WHERE key = ?', (key,)).fetchone()
+            self._connection.execute('INSERT OR REPLACE INTO translations (key, translation, last_used) '
+                                     'VALUES (?, ?, ?)', (key, str(translation), time.time_ns()))
+            if exists is None:
+                self._size = self._size + 1
+
+            if self._size > self.max_entries:
+                self._evict(count=self._size - self.max_entries)
+            self._count_write()
+
+    def _evict(self, count: int):
+        # Removing the least recently used entries
+        self._connection.execute('DELETE FROM translations WHERE key IN '
+                                 '(SELECT key FROM translations ORDER BY last_used ASC LIMIT ?)', (count,))
+        self._size = self._size - count
+
+    def _count_write(self):
+        self._pending_writes = self._pending_writes + 1
+        if self._pending_writes >= _commit_interval:
+            self._connection.commit()
+            self._pending_writes = 0
+
+    def flush(self):
+        with self._lock:
+            self._connection.commit()
+            self._pending_writes = 0
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self):
+        return self._size
+
+    def stats_text(self) -> str:
+        return f'cache: {self.hits} hits, {self.misses} misses'
+
+    def warm_from_dumps(self, dump_dir: str, gpt_model_name: str, initial_prompt: str, output_language: str,
+                        output_country: str, batch_answer_parser=None, skip_unknown_language: bool = False) -> int:
+        # Fills the cache with the responses archived in 'log/model/'.
+        # Dumps translated into another language or country are skipped.
+        # Dumps of older versions do not record their language. They are assumed to be translations into the given
+        # language, unless 'skip_unknown_language' is set, as other languages are translated into as well.
+        # Batched dumps are split into their lines, if a 'batch_answer_parser' is provided.
+        # Other responses, like the summaries of the session history, are not translations and are skipped.
+        assert dump_dir is not None
+
+        reader = response_archive.ResponseArchiveReader(archive_dir=dump_dir)
+        added = 0
+        skipped_languages = 0
+        skipped_kinds = 0
+
+        log.write(f'Warming translation cache from the responses archived in: {dump_dir}')
+        for dump in reader.records():
+            # Skipping dumps of other models and incomplete answers
+            if not str(dump.get('model', '')).startswith(str(gpt_model_name)):
+                continue
+            if str(dump.get('answer.finish_reason', '')).strip().lower() != 'stop':
+                continue
+            # Older dumps do not record their kind. They are assumed to be translations.
+            dump_kind = dump.get('kind', None)
+            if dump_kind is not None and dump_kind not in (response_archive.KIND_TRANSLATION,
+                                                           response_archive.KIND_BATCH):
+                skipped_kinds = skipped_kinds + 1
+                continue
+            dump_language = dump.get('output_language', None)
+            if dump_language is None:
+                other_language = skip_unknown_language
+            else:
+                other_language = dump_language != output_language or \
+                    dump.get('output_country', None) != output_country
+            if other_language:
+                skipped_languages = skipped_languages + 1
+                continue
+
+            sources = [dump['original_prompt']]
+            translations = [utils.remove_quotations(dump['message_content'])]
+            if batch_answer_parser is not None and dump_kind != response_archive.KIND_TRANSLATION:
+                batch_sources = batch_answer_parser(sources[0])
+                if batch_sources is not None:
+                    batch_translations = batch_answer_parser(dump['message_content'])
+                    if batch_translations is None or len(batch_sources) != len(batch_translations):
+                        continue
+                    sources = batch_sources
+                    translations = batch_translations
+
+            for i in range(len(sources)):
+                key = self.create_key(gpt_model_name=gpt_model_name, initial_prompt=initial_prompt,
+                                      output_language=output_language, output_country=output_country,
+                                      text=sources[i])
+                self.put(key=key, translation=translations[i])
+                added = added + 1
+
+        self.flush()
+        log.write(f'Added {added} translations to the cache, skipped {skipped_languages} responses '
+                  f'of other or unknown languages and {skipped_kinds} other responses. Cache size: {len(self)}')
+        return added
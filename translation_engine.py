@@ -0,0 +1,233 @@
+import asyncio
+import time
+
+import checkpoint
+import cue_chunker
+import cue_classifier
+import deduplication
+import gpt_model_interface
+import scene_segmenter
+import subtitles
+from util import instrumentation, log
+
+
+class TranslationEngine:
+
+    def __init__(self,
+                 model: gpt_model_interface.TranslationGPT,
+                 concurrency: int = 8,
+                 delay: float = 0.0,
+                 batch_size: int = -1,
+                 batch_tokens: int = -1,
+                 scene_gap_ms: int = cue_chunker.DEFAULT_SCENE_GAP_MS,
+                 scene_sessions: bool = False,
+                 scene_overlap: int = scene_segmenter.DEFAULT_OVERLAP,
+                 scene_lines: int = scene_segmenter.DEFAULT_MAX_SCENE_LINES) -> None:
+        # With 'scene_sessions', every scene keeps a session history of its own (see 'scene_segmenter.py').
+        # The lines of a scene are translated one request after the other, the scenes at the same time.
+        super().__init__()
+        assert model is not None
+        assert concurrency is not None
+
+        concurrency = int(concurrency)
+        if concurrency < 1:
+            raise AttributeError(f'Illegal concurrency: {concurrency}. At least one request must be in flight.')
+
+        self.model: gpt_model_interface.TranslationGPT = model
+        self.concurrency: int = concurrency
+        self.delay: float = float(delay)
+        self.batch_size: int = int(batch_size)
+        self.batch_tokens: int = int(batch_tokens)
+        self.scene_gap_ms: int = int(scene_gap_ms)
+        self.scene_sessions: bool = bool(scene_sessions)
+        self.scene_overlap: int = int(scene_overlap)
+        self.scene_lines: int = int(scene_lines)
+
+        # accounting
+        self.responses: [gpt_model_interface.GPTResponseData] = []
+        self.total_tokens: int = 0
+        self.elapsed_ms: int = 0
+
+    def translate(self,
+                  subs: subtitles.Subtitles,
+                  progress_callback=None,
+                  pending: [int] = None,
+                  journal: checkpoint.TranslationJournal = None,
+                  writer: subtitles.SubtitleWriter = None,
+                  duplicates: deduplication.FileDuplicates = None) -> [gpt_model_interface.GPTResponseData]:
+        # Blocking entry point. Translates the lines of the given subtitles in place.
+        return asyncio.run(self.translate_async(subs=subs, progress_callback=progress_callback, pending=pending,
+                                                journal=journal, writer=writer, duplicates=duplicates))
+
+    async def translate_async(self,
+                              subs: subtitles.Subtitles,
+                              progress_callback=None,
+                              pending: [int] = None,
+                              journal: checkpoint.TranslationJournal = None,
+                              writer: subtitles.SubtitleWriter = None,
+                              duplicates: deduplication.FileDuplicates = None
+                              ) -> [gpt_model_interface.GPTResponseData]:
+        # Only the lines at the 'pending' positions are translated. If None, every line is translated.
+        # Every finished line is recorded in the journal and passed to the writer, if they are provided.
+        # Repeats of a pending line (see 'duplicates') receive its translation, without being translated themselves.
+        assert subs is not None
+
+        lines: [subtitles.Line] = subs.lines
+        if pending is None:
+            pending = list(range(len(lines)))
+        translations: [str] = [None] * len(lines)
+        responses: [gpt_model_interface.GPTResponseData] = []
+        semaphore = asyncio.Semaphore(self.concurrency)
+        copy_count: int = duplicates.copy_count(positions=pending) if duplicates is not None else 0
+        completed: int = len(lines) - len(pending) - copy_count
+
+        if self.scene_sessions:
+            scene_batches = self.create_scene_batches(subs=subs, pending=pending)
+            batches = [batch for _, batches_of_scene in scene_batches for batch in batches_of_scene]
+        else:
+            scene_batches = None
+            batches = self.create_batches(subs=subs, pending=pending)
+        log.write(f'Translating {len(pending)} lines in {len(batches)} requests '
+                  f'with up to {self.concurrency} requests in flight.',
+                  print_to_console=False)
+        start_time = time.time_ns()
+
+        async def translate_single_batch(batch: [int], history: [{}] = None):
+            nonlocal completed
+
+            async with semaphore:
+                batch_translations, gpt_responses = await self.translate_batch_async(subs=subs, batch=batch,
+                                                                                     journal=journal,
+                                                                                     writer=writer,
+                                                                                     duplicates=duplicates,
+                                                                                     history=history)
+
+            for i in range(len(batch)):
+                translations[batch[i]] = batch_translations[i]
+            responses.extend(gpt_responses)
+
+            completed = completed + len(batch)
+            if duplicates is not None:
+                completed = completed + duplicates.copy_count(positions=batch)
+            if progress_callback is not None:
+                progress_callback(completed, len(lines), gpt_responses)
+
+        async def translate_scene(scene: scene_segmenter.Scene, batches_of_scene: [[int]]):
+            # every request of the scene sees the ones before it, so they are sent one after the other
+            history = self.model.create_history(
+                context=[cue_classifier.strip_tags(lines[i].spoken_line) for i in scene.context])
+            for batch in batches_of_scene:
+                await translate_single_batch(batch=batch, history=history)
+
+        async with self.model.backend.connection_pool():
+            if scene_batches is not None:
+                await asyncio.gather(*[translate_scene(scene=scene, batches_of_scene=batches_of_scene)
+                                       for scene, batches_of_scene in scene_batches])
+            else:
+                await asyncio.gather(*[translate_single_batch(batch=batch) for batch in batches])
+
+        # Writing the results back only once every line is done, so the file is never half translated
+        for i in pending:
+            if duplicates is not None:
+                for position in duplicates.with_copies(position=i):
+                    lines[position].spoken_line = translations[i]
+            else:
+                lines[i].spoken_line = translations[i]
+
+        self.elapsed_ms = int((time.time_ns() - start_time) / 1_000_000)
+        log.write(f'Translated {len(pending)} lines in {self.elapsed_ms} ms.', print_to_console=False)
+
+        return responses
+
+    def create_batches(self, subs: subtitles.Subtitles, pending: [int]) -> [[int]]:
+        # Every batch is sent as one request. Without batch mode, every line is its own batch.
+        if not self.model.batch_mode:
+            return [[i] for i in pending]
+
+        batches = cue_chunker.create_chunks(lines=subs.lines, indices=pending, max_cues=self.batch_size,
+                                            token_budget=self.batch_tokens, scene_gap_ms=self.scene_gap_ms)
+        log.write(cue_chunker.chunk_stats_text(lines=subs.lines, chunks=batches), print_to_console=False)
+        return batches
+
+    def create_scene_batches(self, subs: subtitles.Subtitles, pending: [int]) -> [[scene_segmenter.Scene, [[int]]]]:
+        # The batches of every scene with pending lines. Batches never span two scenes.
+        lines: [subtitles.Line] = subs.lines
+        scenes = scene_segmenter.segment(lines=lines, gap_ms=self.scene_gap_ms, overlap=self.scene_overlap,
+                                         max_lines=self.scene_lines)
+        scene_of_line = [0] * len(lines)
+        for scene in scenes:
+            for position in scene.positions():
+                scene_of_line[position] = scene.number
+        pending_of_scene = [[] for _ in scenes]
+        for i in pending:
+            pending_of_scene[scene_of_line[i]].append(i)
+
+        scene_batches = []
+        for scene in scenes:
+            scene_pending = pending_of_scene[scene.number]
+            if len(scene_pending) == 0:
+                continue
+            if self.model.batch_mode:
+                # the scene is one chunk already, unless it exceeds the limits of a batch
+                batches = cue_chunker.create_chunks(lines=lines, indices=scene_pending, max_cues=self.batch_size,
+                                                    token_budget=self.batch_tokens, scene_gap_ms=0)
+            else:
+                batches = [[i] for i in scene_pending]
+            scene_batches.append([scene, batches])
+
+        stats = scene_segmenter.scene_stats(scenes=[scene for scene, _ in scene_batches])
+        log.write(f'Translating {stats["lines"]} lines in {stats["scenes"]} scenes of {stats["average_lines"]} lines '
+                  f'on average ({stats["max_lines"]} at most), each with a session history of its own and '
+                  f'{self.scene_overlap} lines of context.', print_to_console=False)
+        return scene_batches
+
+    async def translate_batch_async(self,
+                                    subs: subtitles.Subtitles,
+                                    batch: [int],
+                                    journal: checkpoint.TranslationJournal = None,
+                                    writer: subtitles.SubtitleWriter = None,
+                                    duplicates: deduplication.FileDuplicates = None,
+                                    history: [{}] = None
+                                    ) -> [[str], [gpt_model_interface.GPTResponseData]]:
+        # Translates the lines at the positions of the batch, without changing them.
+        # Repeats of these lines are recorded in the journal and written as well.
+        # The 'history' of a scene session is sent along and extended, if given.
+        lines: [subtitles.Line] = subs.lines
+
+        if self.model.batch_mode:
+            translations, gpt_responses = await self.model.translate_lines_async(
+                lines=[lines[i].spoken_line for i in batch], silent=True, history=history)
+        else:
+            translation, gpt_response = await self.model.translate_line_async(
+                line=lines[batch[0]].spoken_line, silent=True, history=history)
+            translations = [translation]
+            gpt_responses = [gpt_response] if gpt_response is not None else []
+
+        # the delay is applied per request slot, so the overall request rate stays bounded
+        # cached translations did not cause a request, so they are not delayed
+        if self.delay > 0 and len(gpt_responses) > 0:
+            instrumentation.add_seconds(name=instrumentation.SPAN_DELAY, seconds=self.delay)
+            await asyncio.sleep(self.delay)
+
+        with instrumentation.span(instrumentation.SPAN_WRITE):
+            for i in range(len(batch)):
+                positions = duplicates.with_copies(position=batch[i]) if duplicates is not None else [batch[i]]
+                for position in positions:
+                    if journal is not None:
+                        journal.record(position=position, source_text=lines[position].spoken_line,
+                                       translation=translations[i])
+
+                    if writer is not None:
+                        # the lines themselves are only changed once every line is done, so copies are written
+                        line = lines[position]
+                        writer.write(position=position, line=subtitles.Line(index=line.index,
+                                                                            start_time=line.start_ms,
+                                                                            end_time=line.end_ms,
+                                                                            spoken_line=translations[i]))
+
+        self.responses.extend(gpt_responses)
+        for gpt_response in gpt_responses:
+            self.total_tokens = self.total_tokens + gpt_response.total_tokens
+
+        return translations, gpt_responses
+
@@ -0,0 +1,380 @@
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import gpt_model_interface
+import languages
+import model_backend
+import response_archive
+import run_report
+import translation_cache
+import translator
+from util import log, rate_limiter, retry
+
+# Keeps the model client warm and translates jobs sent over a local HTTP API, one job at a time.
+# All jobs share the backend, the translation cache, the rate limiter and the retrier,
+# so the rate limits hold across jobs and a job costs no interpreter startup or setup.
+# Start it via: python translator.py -l de --serve 8090
+# - POST /jobs      {"input": "<file or dir>", "output": "<dir>", "language": "es", "overwrite": false}
+# - GET  /jobs      status of all jobs
+# - GET  /jobs/<id> status of a single job
+# - GET  /metrics   throughput, tokens and rate limit usage since the start
+
+DEFAULT_PORT: int = 8090
+
+JOB_QUEUED: str = 'queued'
+JOB_RUNNING: str = 'running'
+JOB_DONE: str = 'done'
+JOB_FAILED: str = 'failed'
+JOB_CANCELLED: str = 'cancelled'
+
+# Finished jobs kept for their status. Older ones are forgotten.
+_max_finished_jobs: int = 1000
+
+
+class TranslationJob:
+
+    def __init__(self, job_id: int, file_list: [str], out_dir: str, country: languages.Country,
+                 language: languages.Language, overwrite: bool = False) -> None:
+        super().__init__()
+        self.job_id: int = int(job_id)
+        self.file_list: [str] = file_list
+        self.out_dir: str = str(out_dir)
+        self.country: languages.Country = country
+        self.language: languages.Language = language
+        self.overwrite: bool = bool(overwrite)
+
+        self.status: str = JOB_QUEUED
+        self.error: str = None
+        self.report: run_report.RunReport = None
+        self.report_file_path: str = None
+        self.created_time: float = time.time()
+        self.started_time: float = None
+        self.finished_time: float = None
+
+    def queued_seconds(self) -> float:
+        # cancelled jobs were queued until they were cancelled
+        end_time = self.started_time if self.started_time is not None else self.finished_time
+        if end_time is None:
+            end_time = time.time()
+        return round(end_time - self.created_time, 3)
+
+    def elapsed_seconds(self) -> float:
+        if self.started_time is None:
+            return None
+        end_time = self.finished_time if self.finished_time is not None else time.time()
+        return round(end_time - self.started_time, 3)
+
+    def cues_translated(self) -> int:
+        if self.report is None:
+            return 0
+        return sum([f.pending for f in self.report.files])
+
+    def to_dict(self) -> {}:
+        d = {
+            'id': self.job_id,
+            'status': self.status,
+            'files': self.file_list,
+            'output': self.out_dir,
+            'language': self.language.alpha_2,
+            'country': self.country.alpha_2,
+            'queued_seconds': self.queued_seconds(),
+            'elapsed_seconds': self.elapsed_seconds(),
+            'cues_translated': self.cues_translated(),
+            'error': self.error
+        }
+        if self.report is not None:
+            d['requests'] = self.report.requests
+            d['prompt_tokens'] = self.report.prompt_tokens
+            d['completion_tokens'] = self.report.completion_tokens
+            d['estimated_cost_usd'] = run_report.estimate_cost(gpt_model_name=self.report.gpt_model_name,
+                                                               prompt_tokens=self.report.prompt_tokens,
+                                                               completion_tokens=self.report.completion_tokens)
+            d['report'] = self.report_file_path
+        return d
+
+
+class TranslationService:
+
+    def __init__(self,
+                 api_key: str,
+                 backend: model_backend.ModelBackend,
+                 default_language: str,
+                 cache: translation_cache.TranslationCache = None,
+                 limiter: rate_limiter.RateLimiter = None,
+                 retrier: retry.Retrier = None,
+                 cache_warm: bool = False,
+                 model_parameters: {} = None,
+                 run_parameters: {} = None) -> None:
+        # 'model_parameters' are passed to 'translator.create_model', 'run_parameters' to 'translator.translate_files'.
+        # A model is created per language on its first job and kept for every later job.
+        super().__init__()
+        assert backend is not None
+        self.api_key: str = api_key
+        self.backend: model_backend.ModelBackend = backend
+        self.default_language: str = str(default_language)
+        self.cache: translation_cache.TranslationCache = cache
+        self.limiter: rate_limiter.RateLimiter = limiter
+        self.retrier: retry.Retrier = retrier if retrier is not None else gpt_model_interface.create_retrier()
+        self.cache_warm: bool = bool(cache_warm) and cache is not None
+        self.archive = response_archive.ResponseArchive(archive_dir=log.log_dir_base + 'log' + os.sep + 'model')
+        self.model_parameters: {} = model_parameters if model_parameters is not None else {}
+        self.run_parameters: {} = run_parameters if run_parameters is not None else {}
+
+        self.models: {str: gpt_model_interface.TranslationGPT} = {}
+        self.jobs: {int: TranslationJob} = {}
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._next_job_id: int = 1
+        self._worker: threading.Thread = None
+
+        # statistics
+        self.start_time: float = time.time()
+        self.busy_seconds: float = 0.0
+        self.jobs_finished: int = 0
+        self.jobs_failed: int = 0
+        self.files_translated: int = 0
+        self.cues_translated: int = 0
+
+    def start(self):
+        self._worker = threading.Thread(target=self._work, name='translation-service', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        # The running job is finished, queued jobs are dropped. They are kept as cancelled, so their status shows it.
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.status = JOB_CANCELLED
+                job.finished_time = time.time()
+                log.write(f'Cancelled job #{job.job_id}.')
+        self._queue.put(None)
+        if self._worker is not None:
+            self._worker.join()
+        self.archive.close()
+        if self.cache is not None:
+            self.cache.close()
+        self.backend.close()
+
+    def submit(self, request: {}) -> TranslationJob:
+        # Raises an AttributeError, if the request is invalid
+        if not isinstance(request, dict) or request.get('input', None) is None:
+            raise AttributeError('The job needs an "input": A subtitle file or a directory.')
+        input_path = os.path.abspath(str(request['input']))
+        if not os.path.exists(input_path):
+            raise AttributeError(f'Input path does not exist: {input_path}')
+        out_dir = request.get('output', None)
+        if out_dir is not None:
+            out_dir = os.path.abspath(str(out_dir))
+            if not os.path.isdir(out_dir):
+                raise AttributeError(f'Output directory does not exist: {out_dir}')
+
+        found = languages.lookup(text=request.get('language', self.default_language))
+        if found is None:
+            raise AttributeError(f'Failed to detect language from {request.get("language", None)}.')
+        country, language = found
+
+        file_list, out_dir = translator.extract_input_dirs(input_dirs=input_path, output_dir=out_dir)
+        if os.path.isfile(out_dir):
+            # a single file is translated into its own directory
+            out_dir = os.path.dirname(out_dir)
+
+        with self._lock:
+            job = TranslationJob(job_id=self._next_job_id, file_list=file_list, out_dir=out_dir, country=country,
+                                 language=language, overwrite=bool(request.get('overwrite', False)))
+            self._next_job_id = self._next_job_id + 1
+            self.jobs[job.job_id] = job
+            self._forget_finished_jobs()
+        self._queue.put(job)
+        log.write(f'Queued job #{job.job_id}: {len(file_list)} file(s) into {language.name} ({country.name}).')
+        return job
+
+    def get_job(self, job_id: int) -> TranslationJob:
+        with self._lock:
+            return self.jobs.get(int(job_id), None)
+
+    def jobs_to_dict(self) -> [{}]:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [job.to_dict() for job in jobs]
+
+    def metrics(self) -> {}:
+        with self._lock:
+            jobs = list(self.jobs.values())
+            models = list(self.models.values())
+            model_names = sorted(self.models.keys())
+        uptime_seconds = time.time() - self.start_time
+        d = {
+            'uptime_seconds': round(uptime_seconds, 3),
+            'busy_seconds': round(self.busy_seconds, 3),
+            'jobs_queued': len([job for job in jobs if job.status == JOB_QUEUED]),
+            'jobs_running': len([job for job in jobs if job.status == JOB_RUNNING]),
+            'jobs_finished': self.jobs_finished,
+            'jobs_failed': self.jobs_failed,
+            'jobs_cancelled': len([job for job in jobs if job.status == JOB_CANCELLED]),
+            'files_translated': self.files_translated,
+            'cues_translated': self.cues_translated,
+            'cues_per_second': round(self.cues_translated / self.busy_seconds, 3) if self.busy_seconds > 0 else None,
+            'models': model_names,
+            'requests': sum([m.requests_total for m in models]),
+            'prompt_tokens': sum([m.prompt_tokens_total for m in models]),
+            'completion_tokens': sum([m.completion_tokens_total for m in models]),
+            'retries': self.retrier.retry_count_total,
+            'backoff_seconds': self.retrier.backoff_ms_total / 1000
+        }
+        finished = [job for job in jobs if job.finished_time is not None and job.started_time is not None]
+        if len(finished) > 0:
+            d['average_queued_seconds'] = round(sum([job.queued_seconds() for job in finished]) / len(finished), 3)
+            d['average_job_seconds'] = round(sum([job.elapsed_seconds() for job in finished]) / len(finished), 3)
+        if self.limiter is not None:
+            window_requests, window_tokens = self.limiter.window_usage()
+            d['rate_limit'] = {
+                'requests_per_minute': self.limiter.requests_per_minute,
+                'tokens_per_minute': self.limiter.tokens_per_minute,
+                'window_requests': window_requests,
+                'window_tokens': window_tokens,
+                'wait_seconds': round(self.limiter.wait_seconds_total, 3)
+            }
+        if self.cache is not None:
+            d['cache'] = {'hits': self.cache.hits, 'misses': self.cache.misses}
+        if self.backend.connection_stats() is not None:
+            d['connection_pool'] = self.backend.connection_stats()
+        return d
+
+    def get_model(self, country: languages.Country,
+                  language: languages.Language) -> gpt_model_interface.TranslationGPT:
+        key = f'{country.alpha_2.lower()}.{language.alpha_2.lower()}'
+        model = self.models.get(key, None)
+        if model is None:
+            model = translator.create_model(api_key=self.api_key, backend=self.backend, output_country=country.name,
+                                            output_language=language.name, cache=self.cache, limiter=self.limiter,
+                                            retrier=self.retrier, archive=self.archive, **self.model_parameters)
+            if self.cache_warm:
+                # jobs translate into any language with the same archive, so responses of unknown language are skipped
+                model.warm_cache(dump_dir=log.log_dir_base + 'log' + os.sep + 'model', skip_unknown_language=True)
+            with self._lock:
+                self.models[key] = model
+        return model
+
+    def run_job(self, job: TranslationJob):
+        job.status = JOB_RUNNING
+        job.started_time = time.time()
+        log.write(f'Running job #{job.job_id}.')
+        try:
+            model = self.get_model(country=job.country, language=job.language)
+            job.report_file_path = run_report.create_report_file_path(name=f'job-{job.job_id}')
+            job.report = translator.translate_files(model=model, file_list=job.file_list, out_dir=job.out_dir,
+                                                    country_alpha_2=job.country.alpha_2,
+                                                    language_alpha_2=job.language.alpha_2, overwrite=job.overwrite,
+                                                    report_file_path=job.report_file_path, **self.run_parameters)
+            job.status = JOB_DONE
+            self.jobs_finished = self.jobs_finished + 1
+            self.files_translated = self.files_translated + len(job.report.files)
+            self.cues_translated = self.cues_translated + job.cues_translated()
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = f'{type(e).__name__}: {e}'
+            self.jobs_failed = self.jobs_failed + 1
+            log.write_exception(exception=e)
+        finally:
+            job.finished_time = time.time()
+            self.busy_seconds = self.busy_seconds + job.elapsed_seconds()
+        log.write(f'Job #{job.job_id} {job.status} after {job.elapsed_seconds()} seconds.')
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self.run_job(job=job)
+
+    def _forget_finished_jobs(self):
+        finished = [job for job in self.jobs.values() if job.finished_time is not None]
+        for job in finished[:max(0, len(finished) - _max_finished_jobs)]:
+            del self.jobs[job.job_id]
+
+
+class TranslationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: TranslationService, port: int = DEFAULT_PORT) -> None:
+        # Only listens on the loopback interface: Jobs name files on this machine
+        super().__init__(('127.0.0.1', int(port)), TranslationRequestHandler)
+        self.service: TranslationService = service
+
+    def address(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class TranslationRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/metrics':
+            self._send_json(status=200, payload=self.server.service.metrics())
+            return
+        if path == '/jobs':
+            self._send_json(status=200, payload={'jobs': self.server.service.jobs_to_dict()})
+            return
+        if path.startswith('/jobs/') and path[len('/jobs/'):].isdigit():
+            job = self.server.service.get_job(job_id=int(path[len('/jobs/'):]))
+            if job is None:
+                self._send_json(status=404, payload={'error': f'Unknown job: {path[len("/jobs/"):]}'})
+                return
+            self._send_json(status=200, payload=job.to_dict())
+            return
+        self._send_json(status=404, payload={'error': f'Unknown path: {self.path}'})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self._send_json(status=404, payload={'error': f'Unknown path: {self.path}'})
+            return
+
+        content_length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            job = self.server.service.submit(request=request)
+        except (ValueError, AttributeError) as e:
+            # invalid json or an invalid job
+            self._send_json(status=400, payload={'error': str(e)})
+            return
+        except Exception as e:
+            log.write_exception(exception=e)
+            self._send_json(status=500, payload={'error': str(e)})
+            return
+        self._send_json(status=202, payload=job.to_dict())
+
+    def _send_json(self, status: int, payload: {}):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # silencing the default stderr logging of every request
+        pass
+
+
+def serve(service: TranslationService, port: int = DEFAULT_PORT):
+    # Blocks until interrupted
+    server = TranslationServer(service=service, port=port)
+    service.start()
+    log.write(f'Translation server running at: {server.address()} (default language: {service.default_language})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    log.write('Stopping the translation server. Waiting for the running job, queued jobs are cancelled.')
+    service.stop()
+    log.write(f'Translation server finished {service.jobs_finished} jobs ({service.jobs_failed} failed), '
+              f'{service.cues_translated} cues.')
@@ -1,14 +1,25 @@
 import argparse
 import sys
+import threading
 import time
 
-import openai.error
-import pycountry
-
-import numpy as np
+import checkpoint
+import connection_pool
+import cue_chunker
+import cue_classifier
+import deduplication
 import gpt_model_interface
+import languages
+import model_backend
+import response_archive
+import run_report
+import scene_segmenter
+import scheduler
+import source_revision
 import subtitles
-from util import log, utils
+import translation_cache
+import translation_engine
+from util import instrumentation, log, utils, rate_limiter, retry, token_estimator
 import os
 
 
@@ -30,11 +41,43 @@ def main(api_key_file_path: str,
          output_country: str,
          output_language: str,
          tokens_per_minute: int = -1,
+         requests_per_minute: int = -1,
          keep_history: bool = False,
-         delay: float = 2.0):
-    # checking if api file exists
-    if not os.path.exists(path=api_key_file_path) or not os.path.isfile(api_key_file_path):
-        raise Exception("API key file not found or invalid at: " + api_key_file_path)
+         delay: float = 2.0,
+         concurrency: int = 1,
+         api_base: str = None,
+         batch_size: int = 1,
+         batch_tokens: int = -1,
+         scene_gap_ms: int = cue_chunker.DEFAULT_SCENE_GAP_MS,
+         scene_overlap: int = scene_segmenter.DEFAULT_OVERLAP,
+         scene_lines: int = scene_segmenter.DEFAULT_MAX_SCENE_LINES,
+         cache_file_path: str = None,
+         cache_size: int = 100000,
+         cache_warm: bool = False,
+         overwrite: bool = False,
+         max_retries: int = None,
+         parallel_files: bool = False,
+         history_size: int = -1,
+         history_tokens: int = -1,
+         summarize_history: bool = False,
+         backend_name: str = model_backend.BACKEND_OPENAI,
+         fake_latency: str = None,
+         fake_rate_limit: float = 0.0,
+         backend: model_backend.ModelBackend = None,
+         report_file_path: str = None,
+         deduplicate: bool = True,
+         deduplicate_across_files: bool = False,
+         skip_untranslatable: bool = True,
+         mask_tags: bool = True,
+         max_connections: int = connection_pool.DEFAULT_MAX_CONNECTIONS,
+         keepalive_seconds: float = connection_pool.DEFAULT_KEEPALIVE_SECONDS,
+         connect_timeout: float = connection_pool.DEFAULT_CONNECT_TIMEOUT,
+         read_timeout: float = connection_pool.DEFAULT_READ_TIMEOUT,
+         more_targets: [[str, str, str, str]] = None,
+         incremental: bool = False):
+    # 'more_targets' are further languages to translate the files into at the same time, every one given as
+    # country alpha 2, language alpha 2, country name and language name. Every file is parsed only once.
+    api_key = read_api_key(api_key_file_path=api_key_file_path, backend_name=backend_name, backend=backend)
 
     if is_dev_mode():
         delay = 0.01
@@ -42,131 +85,720 @@ def main(api_key_file_path: str,
     if file_list is None:
         file_list = []
 
-    f = open(api_key_file_path)
-    api_key = f.read().strip()
-    f.close()
+    batch_mode, batch_size = batch_settings(batch_size=batch_size, batch_tokens=batch_tokens)
 
-    # updating country codes
-    country_alpha_2 = str(country_alpha_2).lower()
-    language_alpha_2 = str(language_alpha_2).lower()
+    # previous translations are reused from the cache, if one is used
+    cache = None
+    if cache_file_path is not None:
+        cache = translation_cache.TranslationCache(cache_file_path=cache_file_path, max_entries=cache_size)
+
+    # requests and tokens per minute are limited across all requests in flight
+    limiter = None
+    if tokens_per_minute > 0 or requests_per_minute > 0:
+        limiter = rate_limiter.RateLimiter(requests_per_minute=requests_per_minute,
+                                           tokens_per_minute=tokens_per_minute)
+
+    # connections to the API are kept alive and shared by all requests
+    owns_backend = backend is None
+    if backend is None:
+        pool = connection_pool.ConnectionPool(max_connections=max_connections, keepalive_seconds=keepalive_seconds,
+                                              connect_timeout=connect_timeout, read_timeout=read_timeout)
+        backend = model_backend.create_backend(name=backend_name, api_key=api_key, api_base=api_base,
+                                               fake_latency=fake_latency, fake_rate_limit=fake_rate_limit, pool=pool)
 
     # generating openAI interface
-    model = gpt_model_interface.TranslationGPT(
+    targets = [[country_alpha_2, language_alpha_2, output_country, output_language]]
+    if more_targets is not None:
+        targets.extend(more_targets)
+    # one model per language, sharing the backend, cache, rate limits, retries and archive
+    retrier = gpt_model_interface.create_retrier(max_retries=max_retries)
+    archive = None
+    models: [gpt_model_interface.TranslationGPT] = []
+    for target_country_alpha_2, target_language_alpha_2, target_country, target_language in targets:
+        model = create_model(api_key=api_key, backend=backend, output_country=target_country,
+                             output_language=target_language, api_base=api_base, batch_mode=batch_mode, cache=cache,
+                             limiter=limiter, retrier=retrier, history_size=history_size,
+                             history_tokens=history_tokens, summarize_history=summarize_history, mask_tags=mask_tags,
+                             archive=archive)
+        archive = model.archive
+        models.append(model)
+
+    if cache is not None and cache_warm:
+        # every model only takes the responses of its own language. With several languages, responses of older
+        # versions are skipped, as they do not record their language.
+        for model in models:
+            model.warm_cache(dump_dir=log.log_dir_base + 'log' + os.sep + 'model',
+                             skip_unknown_language=len(models) > 1)
+
+    run_parameters = {'overwrite': overwrite, 'keep_history': keep_history, 'delay': delay,
+                      'concurrency': concurrency, 'batch_size': batch_size, 'batch_tokens': batch_tokens,
+                      'scene_gap_ms': scene_gap_ms, 'scene_overlap': scene_overlap, 'scene_lines': scene_lines,
+                      'parallel_files': parallel_files, 'deduplicate': deduplicate,
+                      'deduplicate_across_files': deduplicate_across_files,
+                      'skip_untranslatable': skip_untranslatable, 'incremental': incremental,
+                      'report_parameters': {'backend': backend_name, 'tokens_per_minute': tokens_per_minute,
+                                            'requests_per_minute': requests_per_minute}}
+    try:
+        if len(targets) == 1:
+            translate_files(model=models[0], file_list=file_list, out_dir=out_dir, country_alpha_2=country_alpha_2,
+                            language_alpha_2=language_alpha_2, report_file_path=report_file_path, **run_parameters)
+        else:
+            translate_targets(models=models, targets=[target[:2] for target in targets], file_list=file_list,
+                              out_dir=out_dir, report_file_path=report_file_path, run_parameters=run_parameters)
+    finally:
+        archive.close()
+        if cache is not None:
+            cache.close()
+        if owns_backend:
+            backend.close()
+
+
+def read_api_key(api_key_file_path: str,
+                 backend_name: str = model_backend.BACKEND_OPENAI,
+                 backend: model_backend.ModelBackend = None) -> str:
+    # the fake backend runs offline, it needs no api key. Neither does a backend passed by the caller.
+    use_api_key = backend_name == model_backend.BACKEND_OPENAI and backend is None
+
+    # checking if api file exists
+    if use_api_key and (api_key_file_path is None or not os.path.exists(path=api_key_file_path) or
+                        not os.path.isfile(api_key_file_path)):
+        raise Exception("API key file not found or invalid at: " + str(api_key_file_path))
+
+    api_key = 'offline'
+    if use_api_key:
+        f = open(api_key_file_path)
+        api_key = f.read().strip()
+        f.close()
+    return api_key
+
+
+def batch_settings(batch_size: int, batch_tokens: int) -> [bool, int]:
+    # batching: multiple lines per request. A token budget alone does not limit the number of lines.
+    batch_mode = batch_size > 1 or batch_tokens > 0
+    if batch_tokens > 0 and batch_size <= 1:
+        batch_size = -1
+    return batch_mode, batch_size
+
+
+def create_model(api_key: str,
+                 backend: model_backend.ModelBackend,
+                 output_country: str,
+                 output_language: str,
+                 api_base: str = None,
+                 batch_mode: bool = False,
+                 cache: translation_cache.TranslationCache = None,
+                 limiter: rate_limiter.RateLimiter = None,
+                 retrier: retry.Retrier = None,
+                 history_size: int = -1,
+                 history_tokens: int = -1,
+                 summarize_history: bool = False,
+                 mask_tags: bool = True,
+                 archive: response_archive.ResponseArchive = None) -> gpt_model_interface.TranslationGPT:
+    # Models translating into different languages can share the backend, cache, limiter, retrier and archive
+    return gpt_model_interface.TranslationGPT(
         api_key=api_key,
+        backend=backend,
         output_country=output_country,
-        output_language=output_language
+        output_language=output_language,
+        api_base=api_base,
+        batch_mode=batch_mode,
+        cache=cache,
+        limiter=limiter,
+        retrier=retrier,
+        history_size=history_size,
+        history_tokens=history_tokens,
+        summarize_history=summarize_history,
+        archive=archive,
+        mask_tags=mask_tags
     )
 
-    # looping over every subtitle file
-    for i in range(len(file_list)):
-        subtitle_file: str = file_list[i]
-        log.write(f'Translating file: {i + 1}/{len(file_list)}: {os.path.basename(subtitle_file)}')
-
-        subs: subtitles.Subtitles = subtitles.Subtitles(input_file_path=subtitle_file)
-        response_times: [int] = []
-        eta_text = '?'
-        model.clear_session()
-        total_token_count: int = 0
-
-        # tokens per minute limits
-        current_tpm_tokens: int = 0
-        current_tpm_ms: int = 0
-
-        for j in range(len(subs)):
-            # updating progressbar
-            utils.print_progress_bar(iteration=j + 1,
-                                     total=len(subs),
-                                     eta_text=eta_text,
-                                     tokens_session=model.tokens_generated + model.tokens_generated,
-                                     tokens_total=total_token_count)
-
-            # clearing history if requested
-            if not keep_history:
-                model.clear_session()
-
-            # getting the current line
-            line_current: subtitles.Line = subs[j]
-            if j >= 4 and is_dev_mode():
+
+def translate_files(model: gpt_model_interface.TranslationGPT,
+                    file_list: [str],
+                    out_dir: str,
+                    country_alpha_2: str,
+                    language_alpha_2: str,
+                    overwrite: bool = False,
+                    keep_history: bool = False,
+                    delay: float = 2.0,
+                    concurrency: int = 1,
+                    batch_size: int = 1,
+                    batch_tokens: int = -1,
+                    scene_gap_ms: int = cue_chunker.DEFAULT_SCENE_GAP_MS,
+                    scene_overlap: int = scene_segmenter.DEFAULT_OVERLAP,
+                    scene_lines: int = scene_segmenter.DEFAULT_MAX_SCENE_LINES,
+                    parallel_files: bool = False,
+                    deduplicate: bool = True,
+                    deduplicate_across_files: bool = False,
+                    skip_untranslatable: bool = True,
+                    report_file_path: str = None,
+                    report_parameters: {} = None,
+                    parsed: subtitles.ParsedSubtitles = None,
+                    incremental: bool = False,
+                    measure_spans: bool = True) -> run_report.RunReport:
+    # Translates the files with a model that is already set up. The model is kept open for further runs.
+    # 'batch_size' must be normalized by 'batch_settings' already.
+    # Files are read from 'parsed', if given, so other languages translated at the same time can share them.
+    # With 'incremental', existing translations of revised files are updated (see 'source_revision.py').
+    # Without 'measure_spans', no time per stage is reported: Other runs at the same time would be counted too.
+    # updating country codes
+    country_alpha_2 = str(country_alpha_2).lower()
+    language_alpha_2 = str(language_alpha_2).lower()
+    batch_mode = model.batch_mode
+
+    # With one history over the whole file, every line depends on all previous lines, so they cannot be sent
+    # at the same time. With concurrency, every scene keeps a shorter history of its own instead.
+    scene_sessions = keep_history and concurrency > 1
+    if scene_sessions:
+        log.write('Keeping a session history per scene, to translate the scenes at the same time.')
+
+    if keep_history and parallel_files:
+        log.write('Keeping a session history requires translating one file at a time. Ignoring parallel files.')
+        parallel_files = False
+
+    # repeated lines are only translated once. Across files, translations of files finished earlier are reused.
+    source_index = None
+    if deduplicate:
+        source_index = deduplication.SourceIndex(
+            across_files=deduplicate_across_files,
+            prompt_tokens_per_call=utils.estimate_tokens(model.create_initial_prompt()),
+            lines_per_call=batch_size if batch_mode else 1)
+
+    # lines of only symbols, speaker tags or already in the target language are kept as they are
+    classifier = None
+    if skip_untranslatable:
+        classifier = cue_classifier.CueClassifier(
+            target_language_alpha_2=language_alpha_2,
+            prompt_tokens_per_call=utils.estimate_tokens(model.create_initial_prompt()),
+            lines_per_call=batch_size if batch_mode else 1)
+
+    # time spent per stage, tokens and estimated cost of every file and the whole run
+    parameters = {'concurrency': concurrency, 'parallel_files': parallel_files, 'delay': delay,
+                  'batch_size': batch_size, 'batch_tokens': batch_tokens, 'scene_gap_ms': scene_gap_ms,
+                  'keep_history': keep_history, 'scene_sessions': scene_sessions, 'incremental': incremental}
+    if scene_sessions:
+        parameters.update({'scene_overlap': scene_overlap, 'scene_lines': scene_lines})
+    if report_parameters is not None:
+        parameters.update(report_parameters)
+    report = run_report.RunReport(gpt_model_name=model.gpt_model_name, parameters=parameters,
+                                  measure_spans=measure_spans)
+    # the totals of the model include earlier runs with the same model
+    requests_at_start = model.requests_total
+    prompt_tokens_at_start = model.prompt_tokens_total
+    completion_tokens_at_start = model.completion_tokens_total
+
+    try:
+        jobs: [scheduler.FileJob] = []
+
+        # looping over every subtitle file
+        for i in range(len(file_list)):
+            subtitle_file: str = file_list[i]
+            log.write(f'Preparing file: {i + 1}/{len(file_list)}: {os.path.basename(subtitle_file)}')
+            job = prepare_file(subtitle_file=subtitle_file, out_dir=out_dir, country_alpha_2=country_alpha_2,
+                               language_alpha_2=language_alpha_2, overwrite=overwrite, source_index=source_index,
+                               classifier=classifier, parsed=parsed, incremental=incremental)
+            if job is None:
                 continue
 
-            # prompting model for translation
-            translation, gpt_response = model.translate_line(line=line_current.spoken_line,
-                                                             silent=True)
-            line_current.spoken_line = translation
-
-            # sleeping a number of seconds specified by the user
-            time.sleep(delay)
-
-            # collecting tokens
-            current_tpm_tokens += gpt_response.total_tokens
-            current_tpm_ms += int(gpt_response.response_ms + int(delay * 1000))
-            total_token_count += gpt_response.total_tokens
-
-            if current_tpm_ms >= 60000:
-                # if more than one minute has passed, reset the minute and token counter
-                current_tpm_ms = 0
-                current_tpm_tokens = 0
-            if tokens_per_minute > 0 and current_tpm_tokens >= tokens_per_minute:
-                # if less than one minute has passed and tokens have exceeded maximum:
-                #   let's wait a minute and reset counter
-                current_tpm_tokens = 0
-                current_tpm_ms = 0
-                time.sleep(61)
-
-            # updating eta text
-            response_times.append(int(gpt_response.response_ms + int(delay * 1000)))
-            average_times = int(np.average(response_times))
-            eta_text = utils.format_ms(milliseconds=average_times * (len(subs) - j))
-
-        # printing an empty line to flush console
-        print('')
-
-        # saving the translated file
-        out_file_name = subs.file_name_without_extension()
-        out_file_path = f'{out_dir}{os.sep}{out_file_name}.{country_alpha_2}.{language_alpha_2}.srt'
-
-        f = open(out_file_path, 'w')
-        f.write(subs.format())
-        f.close()
+            # all files are translated at the same time, once every file is prepared
+            if parallel_files:
+                jobs.append(job)
+                continue
 
-        log.write(f'Saved translation: {out_file_path}')
+            log.write(f'Translating file: {i + 1}/{len(file_list)}: {os.path.basename(subtitle_file)}')
+            model.clear_session()
+            report.add_file(file_report=job.report)
+            job.report.start(measure_spans=measure_spans)
+            try:
+                if concurrency > 1:
+                    translate_concurrent(model=model, subs=job.subs, concurrency=concurrency, delay=delay,
+                                         batch_size=batch_size, batch_tokens=batch_tokens,
+                                         scene_gap_ms=scene_gap_ms, scene_sessions=scene_sessions,
+                                         scene_overlap=scene_overlap, scene_lines=scene_lines, pending=job.pending,
+                                         journal=job.journal, writer=job.writer, report=job.report,
+                                         duplicates=job.duplicates)
+                else:
+                    translate_serial(model=model, subs=job.subs, keep_history=keep_history, delay=delay,
+                                     batch_size=batch_size, batch_tokens=batch_tokens,
+                                     scene_gap_ms=scene_gap_ms, pending=job.pending,
+                                     journal=job.journal, writer=job.writer, report=job.report,
+                                     duplicates=job.duplicates)
+            finally:
+                # whatever happens, finished lines must reach the disk
+                job.journal.close()
+                job.writer.close()
 
+            finish_file(job=job, model=model, source_index=source_index, classifier=classifier)
 
-def extract_input_language(input_language: str):
-    if input_language is None:
-        raise Exception('Undefined language to translate into.')
+        if len(jobs) > 0:
+            for job in jobs:
+                report.add_file(file_report=job.report)
+            translate_parallel(model=model, jobs=jobs, concurrency=concurrency, delay=delay, batch_size=batch_size,
+                               batch_tokens=batch_tokens, scene_gap_ms=scene_gap_ms, source_index=source_index,
+                               classifier=classifier)
+    finally:
+        # the report of an interrupted run is saved too, it shows where the time went until then
+        report.finish(requests=model.requests_total - requests_at_start,
+                      prompt_tokens=model.prompt_tokens_total - prompt_tokens_at_start,
+                      completion_tokens=model.completion_tokens_total - completion_tokens_at_start)
+        if source_index is not None:
+            report.deduplication = source_index.to_dict()
+        if classifier is not None:
+            report.classifier = classifier.to_dict()
+        report.tag_masking = model.tag_masking_dict()
+        report.connection_pool = model.backend.connection_stats()
+        report.token_estimates = token_estimator.default_estimator().to_dict()
+        log.write(token_estimator.default_estimator().stats_text(), print_to_console=False)
+        throttled_text = f', throttled for {utils.format_ms(report.throttled_seconds() * 1000)}' \
+            if report.spans is not None else ''
+        log.write(f'Run: {report.requests} API calls, {report.prompt_tokens} prompt and '
+                  f'{report.completion_tokens} completion tokens{throttled_text}.')
+        report.save(report_file_path=report_file_path if report_file_path is not None else
+                    run_report.create_report_file_path())
 
-    input_language = str(input_language).strip()
-    country = None
+    return report
 
-    if len(input_language) <= 3:
-        # is this a iso alpha 2/3 code?
-        country = pycountry.countries.get(alpha_3=input_language)
-        if country is None:
-            country = pycountry.countries.get(alpha_2=input_language)
 
-    if country is None:
-        try:
-            pycountry.countries.lookup(input_language)
-        except LookupError:
-            country = None
+def translate_targets(models: [gpt_model_interface.TranslationGPT],
+                      targets: [[str, str]],
+                      file_list: [str],
+                      out_dir: str,
+                      report_file_path: str = None,
+                      run_parameters: {} = None) -> run_report.FanOutReport:
+    # Translates the files into every target (country alpha 2 and language alpha 2) at the same time,
+    # with the model of the same position. Every language is translated by 'translate_files' in a thread of its own,
+    # as if it was the only one. Each file is parsed once and every language translates a copy of it.
+    assert len(models) == len(targets)
+    if run_parameters is None:
+        run_parameters = {}
+
+    # translations created by this program are no input, whichever language they are in
+    suffixes = tuple([f'.{country_alpha_2}.{language_alpha_2}.srt'.lower() for country_alpha_2, language_alpha_2
+                      in targets])
+    skipped_files = [file for file in file_list if file.lower().endswith(suffixes)]
+    if len(skipped_files) > 0:
+        log.write(f'Skipping {len(skipped_files)} translations created by this program.')
+    file_list = [file for file in file_list if not file.lower().endswith(suffixes)]
 
-    if country is None:
+    parsed = subtitles.ParsedSubtitles()
+    report = run_report.FanOutReport(gpt_model_name=models[0].gpt_model_name,
+                                     parameters=run_parameters.get('report_parameters'))
+    if report_file_path is None:
+        report_file_path = run_report.create_report_file_path(name='fan-out')
+    errors: [Exception] = []
+
+    def translate_target(model: gpt_model_interface.TranslationGPT, country_alpha_2: str, language_alpha_2: str):
+        target = f'{country_alpha_2}.{language_alpha_2}'.lower()
         try:
-            pycountry.countries.search_fuzzy(input_language)[0]
-        except LookupError:
-            country = None
+            target_report = translate_files(model=model, file_list=file_list, out_dir=out_dir,
+                                            country_alpha_2=country_alpha_2, language_alpha_2=language_alpha_2,
+                                            report_file_path=run_report.target_report_file_path(
+                                                report_file_path=report_file_path, target=target),
+                                            parsed=parsed, measure_spans=False, **run_parameters)
+            report.add(target=target, report=target_report)
+            log.write(f'Finished {model.output_language} ({model.output_country}): '
+                      f'{report.target_text(target=target)}.')
+        except Exception as e:
+            log.write(f'Failed to translate into {model.output_language} ({model.output_country}).')
+            log.write_exception(exception=e, print_to_console_message=False)
+            errors.append(e)
+
+    log.write(f'Translating {len(file_list)} subtitle(s) into {len(targets)} languages at the same time.')
+    # several progress bars cannot share the console
+    show_progress_bar = utils.show_progress_bar
+    utils.show_progress_bar = False
+    threads = []
+    try:
+        for i in range(len(targets)):
+            thread = threading.Thread(target=translate_target,
+                                      name=f'translate-{targets[i][0]}.{targets[i][1]}'.lower(),
+                                      args=(models[i], targets[i][0], targets[i][1]))
+            thread.start()
+            threads.append(thread)
+    finally:
+        for thread in threads:
+            thread.join()
+        utils.show_progress_bar = show_progress_bar
+
+        report.finish(files_parsed=parsed.files_parsed, copies=parsed.copies)
+        report.save(report_file_path=report_file_path)
+        log.write(f'Fan-out: {report.text()}.')
+
+    if len(errors) > 0:
+        raise errors[0]
+    return report
+
+
+def prepare_file(subtitle_file: str,
+                 out_dir: str,
+                 country_alpha_2: str,
+                 language_alpha_2: str,
+                 overwrite: bool,
+                 source_index: deduplication.SourceIndex = None,
+                 classifier: cue_classifier.CueClassifier = None,
+                 parsed: subtitles.ParsedSubtitles = None,
+                 incremental: bool = False) -> scheduler.FileJob:
+    # Returns None, if the file does not need to be translated.
+    # With 'incremental', an existing translation with a source snapshot is updated instead of skipped.
+    if subtitle_file.lower().endswith(f'.{country_alpha_2}.{language_alpha_2}.srt'):
+        log.write(f'File is a translation created by this program. Skipping: {subtitle_file}')
+        return None
+
+    with instrumentation.span(instrumentation.SPAN_PARSE):
+        if parsed is not None:
+            subs: subtitles.Subtitles = parsed.get(input_file_path=subtitle_file)
+        else:
+            subs: subtitles.Subtitles = subtitles.Subtitles(input_file_path=subtitle_file)
+    out_file_path = get_out_file_path(subs=subs, out_dir=out_dir, country_alpha_2=country_alpha_2,
+                                      language_alpha_2=language_alpha_2)
+    # the source texts are kept before any line is translated
+    revision = source_revision.FileRevision(subs=subs, out_file_path=out_file_path) if incremental else None
+    if os.path.exists(out_file_path) and not overwrite and (revision is None or not revision.has_snapshot()):
+        log.write(f'Translation already exists. Skipping: {out_file_path}')
+        return None
+
+    # translations of previous, interrupted runs are restored from the journal
+    journal = checkpoint.TranslationJournal(journal_file_path=out_file_path + '.journal')
+    pending = journal.restore(subs=subs)
+
+    # unchanged lines of a revised source keep their previous translation, unless every line is translated again
+    reused = 0
+    if revision is not None and not overwrite:
+        pending = revision.restore(subs=subs, pending=pending, journal=journal)
+        reused = revision.reused()
+    lines_to_deliver = len(pending)
+
+    # lines which need no translation keep their text. They are not journaled, as they are found again on a restart.
+    skipped = {}
+    skip_tokens_saved = 0
+    if classifier is not None:
+        skipped, pending, skip_tokens_saved = classifier.classify(subs=subs, pending=pending)
+
+    # repeated lines are not translated, they receive the translation of their first occurrence
+    duplicates = None
+    if source_index is not None:
+        duplicates = source_index.deduplicate(subs=subs, pending=pending)
+        for position, translation in duplicates.resolved.items():
+            journal.record(position=position, source_text=subs[position].spoken_line, translation=translation)
+            subs[position].spoken_line = translation
+        pending = duplicates.pending
+
+    # translated lines are written while the file is translated, starting with the restored ones
+    writer = subtitles.SubtitleWriter(out_file_path=out_file_path)
+    pending_positions = set(pending)
+    if duplicates is not None:
+        for position in pending:
+            pending_positions.update(duplicates.copies.get(position, []))
+    for position in range(len(subs)):
+        if position not in pending_positions:
+            writer.write(position=position, line=subs[position])
+
+    report = run_report.FileReport(file_path=subtitle_file, out_file_path=out_file_path, cues=len(subs),
+                                   pending=lines_to_deliver, skipped=len(skipped), skip_tokens_saved=skip_tokens_saved,
+                                   reused=reused)
+    return scheduler.FileJob(subs=subs, out_file_path=out_file_path, journal=journal, pending=pending, writer=writer,
+                             report=report, duplicates=duplicates, revision=revision)
+
+
+def finish_file(job: scheduler.FileJob,
+                model: gpt_model_interface.TranslationGPT,
+                source_index: deduplication.SourceIndex = None,
+                classifier: cue_classifier.CueClassifier = None):
+    # saving the translated file
+    with instrumentation.span(instrumentation.SPAN_WRITE):
+        job.writer.finish(lines=job.subs.lines)
+        job.journal.remove()
+        if job.revision is not None:
+            job.revision.save()
+        else:
+            source_revision.remove_snapshot(out_file_path=job.out_file_path)
+    log.write(f'Saved translation: {job.out_file_path}')
+
+    if job.report is not None:
+        job.report.finish()
+        log.write(f'File: {job.report.text(gpt_model_name=model.gpt_model_name)}.')
 
-    if country is None:
+    if source_index is not None:
+        if job.duplicates is not None:
+            source_index.remember(duplicates=job.duplicates, subs=job.subs)
+        log.write(f'Deduplication: {source_index.stats_text()}.')
+    if classifier is not None:
+        log.write(f'Classifier: {classifier.stats_text()}.')
+    if model.mask_tags and model.lines_masked > 0:
+        log.write(f'Tag masking: {model.tag_masking_text()}.')
+    if model.cache is not None:
+        log.write(f'Translation {model.cache.stats_text()}.')
+    if model.limiter is not None:
+        log.write(f'Waited {utils.format_ms(model.limiter.wait_seconds_total * 1000)} for the rate limit so far.')
+    if model.backend.stats_text() is not None:
+        log.write(model.backend.stats_text() + '.')
+    if model.retrier.retry_count_total > 0:
+        log.write(f'Retried {model.retrier.retry_count_total} API calls so far, '
+                  f'waiting {utils.format_ms(model.retrier.backoff_ms_total)} in total.')
+
+
+def translate_serial(model: gpt_model_interface.TranslationGPT,
+                     subs: subtitles.Subtitles,
+                     keep_history: bool,
+                     delay: float,
+                     batch_size: int = -1,
+                     batch_tokens: int = -1,
+                     scene_gap_ms: int = cue_chunker.DEFAULT_SCENE_GAP_MS,
+                     pending: [int] = None,
+                     journal: checkpoint.TranslationJournal = None,
+                     writer: subtitles.SubtitleWriter = None,
+                     report: run_report.FileReport = None,
+                     duplicates: deduplication.FileDuplicates = None):
+    if pending is None:
+        pending = list(range(len(subs)))
+
+    response_times: [int] = []
+    prompt_tokens_per_call: [int] = []
+    eta_text = '?'
+    total_token_count: int = 0
+    lines_translated: int = len(subs) - len(pending)
+    if duplicates is not None:
+        lines_translated = lines_translated - duplicates.copy_count(positions=pending)
+
+    # Every batch is sent as one request. Without batch mode, every line is its own batch.
+    if model.batch_mode:
+        batches = cue_chunker.create_chunks(lines=subs.lines, indices=pending, max_cues=batch_size,
+                                            token_budget=batch_tokens, scene_gap_ms=scene_gap_ms)
+        log.write(cue_chunker.chunk_stats_text(lines=subs.lines, chunks=batches), print_to_console=False)
+    else:
+        batches = [[j] for j in pending]
+
+    for j in range(len(batches)):
+        batch: [int] = batches[j]
+
+        # updating progressbar
+        lines_in_batch = len(batch) + (duplicates.copy_count(positions=batch) if duplicates is not None else 0)
+        utils.print_progress_bar(iteration=lines_translated + lines_in_batch,
+                                 total=len(subs),
+                                 eta_text=eta_text,
+                                 tokens_session=model.tokens_asked + model.tokens_generated,
+                                 tokens_total=total_token_count,
+                                 suffix_text=progress_suffix_text(model=model))
+        lines_translated = lines_translated + lines_in_batch
+
+        # clearing history if requested
+        if not keep_history:
+            model.clear_session()
+
+        # getting the current lines
+        lines_current: [subtitles.Line] = [subs[k] for k in batch]
+        if j >= 4 and is_dev_mode():
+            continue
+
+        # prompting model for translation
+        if model.batch_mode:
+            translations, gpt_responses = model.translate_lines(lines=[line.spoken_line for line in lines_current],
+                                                                silent=True)
+        else:
+            translation, gpt_response = model.translate_line(line=lines_current[0].spoken_line,
+                                                             silent=True)
+            translations = [translation]
+            gpt_responses = [gpt_response] if gpt_response is not None else []
+
+        # summaries of the session history are API calls as well
+        gpt_responses = model.take_summary_responses() + gpt_responses
+
+        with instrumentation.span(instrumentation.SPAN_WRITE):
+            for k in range(len(lines_current)):
+                # repeats of the line receive the same translation
+                positions = duplicates.with_copies(position=batch[k]) if duplicates is not None else [batch[k]]
+                for position in positions:
+                    if journal is not None:
+                        journal.record(position=position, source_text=subs[position].spoken_line,
+                                       translation=translations[k])
+                    subs[position].spoken_line = translations[k]
+                    if writer is not None:
+                        writer.write(position=position, line=subs[position])
+        if report is not None:
+            report.record_responses(gpt_responses=gpt_responses)
+
+        # sleeping a number of seconds specified by the user
+        # cached translations did not cause a request, so they are not delayed
+        request_delay = delay if len(gpt_responses) > 0 else 0
+        if request_delay > 0:
+            instrumentation.add_seconds(name=instrumentation.SPAN_DELAY, seconds=request_delay)
+        time.sleep(request_delay)
+
+        # collecting tokens
+        request_tokens = sum([gpt_response.total_tokens for gpt_response in gpt_responses])
+        request_ms = sum([gpt_response.response_ms for gpt_response in gpt_responses])
+        total_token_count += request_tokens
+        prompt_tokens_per_call.extend([gpt_response.prompt_tokens for gpt_response in gpt_responses])
+
+        # updating eta text
+        response_times.append(int(request_ms + int(request_delay * 1000)))
+        average_times = int(sum(response_times) / len(response_times))
+        eta_text = utils.format_ms(milliseconds=average_times * (len(batches) - j))
+
+    # printing an empty line to flush console
+    utils.finish_progress_bar()
+    if len(prompt_tokens_per_call) > 0:
+        log.write(f'Prompt tokens per API call: {int(sum(prompt_tokens_per_call) / len(prompt_tokens_per_call))} on average, '
+                  f'{max(prompt_tokens_per_call)} at most, {prompt_tokens_per_call[-1]} for the last call.')
+
+
+def translate_concurrent(model: gpt_model_interface.TranslationGPT,
+                         subs: subtitles.Subtitles,
+                         concurrency: int,
+                         delay: float,
+                         batch_size: int = -1,
+                         batch_tokens: int = -1,
+                         scene_gap_ms: int = cue_chunker.DEFAULT_SCENE_GAP_MS,
+                         scene_sessions: bool = False,
+                         scene_overlap: int = scene_segmenter.DEFAULT_OVERLAP,
+                         scene_lines: int = scene_segmenter.DEFAULT_MAX_SCENE_LINES,
+                         pending: [int] = None,
+                         journal: checkpoint.TranslationJournal = None,
+                         writer: subtitles.SubtitleWriter = None,
+                         report: run_report.FileReport = None,
+                         duplicates: deduplication.FileDuplicates = None):
+    engine = translation_engine.TranslationEngine(model=model, concurrency=concurrency, delay=delay,
+                                                  batch_size=batch_size, batch_tokens=batch_tokens,
+                                                  scene_gap_ms=scene_gap_ms, scene_sessions=scene_sessions,
+                                                  scene_overlap=scene_overlap, scene_lines=scene_lines)
+    ms_per_line: [float] = []
+    previously_completed: int = len(subs) - len(pending) if pending is not None else 0
+    if duplicates is not None and pending is not None:
+        previously_completed = previously_completed - duplicates.copy_count(positions=pending)
+
+    def on_progress(completed: int, total: int, gpt_responses: [gpt_model_interface.GPTResponseData]):
+        nonlocal previously_completed
+        if report is not None:
+            report.record_responses(gpt_responses=gpt_responses)
+
+        # with multiple requests in flight, the remaining lines are shared among all request slots
+        request_ms = sum([gpt_response.response_ms for gpt_response in gpt_responses])
+        if len(gpt_responses) > 0:
+            request_ms = request_ms + int(delay * 1000)
+        ms_per_line.append(request_ms / (completed - previously_completed))
+        previously_completed = completed
+        average_times = int(sum(ms_per_line) / len(ms_per_line))
+        eta_text = utils.format_ms(milliseconds=average_times * (total - completed) / concurrency)
+        utils.print_progress_bar(iteration=completed,
+                                 total=total,
+                                 eta_text=eta_text,
+                                 tokens_session=model.tokens_asked + model.tokens_generated,
+                                 tokens_total=engine.total_tokens,
+                                 suffix_text=progress_suffix_text(model=model))
+
+    engine.translate(subs=subs, progress_callback=on_progress, pending=pending, journal=journal, writer=writer,
+                     duplicates=duplicates)
+
+    # printing an empty line to flush console
+    utils.finish_progress_bar()
+    log.write(f'Translated {len(subs)} lines in {utils.format_ms(engine.elapsed_ms)}.')
+
+
+def translate_parallel(model: gpt_model_interface.TranslationGPT,
+                       jobs: [scheduler.FileJob],
+                       concurrency: int,
+                       delay: float,
+                       batch_size: int = -1,
+                       batch_tokens: int = -1,
+                       scene_gap_ms: int = cue_chunker.DEFAULT_SCENE_GAP_MS,
+                       source_index: deduplication.SourceIndex = None,
+                       classifier: cue_classifier.CueClassifier = None):
+    engine = translation_engine.TranslationEngine(model=model, concurrency=concurrency, delay=delay,
+                                                  batch_size=batch_size, batch_tokens=batch_tokens,
+                                                  scene_gap_ms=scene_gap_ms)
+    start_time = time.time_ns()
+    for job in jobs:
+        if job.report is not None:
+            # the files share their time, so only the whole run reports the time spent per stage
+            job.report.start(measure_spans=False)
+    lines_at_start: int = sum([len(job.subs) - len(job.pending) - job.copy_count() for job in jobs])
+
+    def on_progress(file_scheduler: scheduler.FileScheduler, gpt_responses: [gpt_model_interface.GPTResponseData]):
+        # The ETA is based on the throughput of all files so far
+        elapsed_ms = (time.time_ns() - start_time) / 1_000_000
+        lines_done = file_scheduler.lines_completed - lines_at_start
+        lines_left = file_scheduler.lines_total - file_scheduler.lines_completed
+        eta_text = utils.format_ms(milliseconds=elapsed_ms / max(1, lines_done) * lines_left)
+
+        suffix_text = f'{file_scheduler.files_finished}/{len(jobs)} files'
+        if model.cache is not None:
+            suffix_text = suffix_text + ', ' + model.cache.stats_text()
+        utils.print_progress_bar(iteration=file_scheduler.lines_completed,
+                                 total=file_scheduler.lines_total,
+                                 eta_text=eta_text,
+                                 tokens_session=model.tokens_generated + model.tokens_asked,
+                                 tokens_total=engine.total_tokens,
+                                 suffix_text=suffix_text)
+
+    def on_file_finished(job: scheduler.FileJob):
+        job.journal.close()
+        utils.finish_progress_bar()
+        finish_file(job=job, model=model, source_index=source_index, classifier=classifier)
+
+    log.write(f'Translating {len(jobs)} files at the same time.')
+    file_scheduler = scheduler.FileScheduler(engine=engine, jobs=jobs, on_file_finished=on_file_finished,
+                                             progress_callback=on_progress)
+    try:
+        file_scheduler.run()
+    finally:
+        # whatever happens, finished lines must reach the disk
+        for job in jobs:
+            job.journal.close()
+            job.writer.close()
+
+    # printing an empty line to flush console
+    utils.finish_progress_bar()
+    log.write(f'Translated {file_scheduler.lines_total} lines of {len(jobs)} files '
+              f'in {utils.format_ms(file_scheduler.elapsed_ms)}.')
+
+
+def progress_suffix_text(model: gpt_model_interface.TranslationGPT) -> str:
+    if model.cache is None:
+        return None
+    return model.cache.stats_text()
+
+
+def get_out_file_path(subs: subtitles.Subtitles, out_dir: str, country_alpha_2: str, language_alpha_2: str) -> str:
+    out_file_name = subs.file_name_without_extension()
+    return f'{out_dir}{os.sep}{out_file_name}.{country_alpha_2}.{language_alpha_2}.srt'
+
+
+def extract_input_language(input_language: str) -> [languages.Country, languages.Language]:
+    if input_language is None:
+        raise Exception('Undefined language to translate into.')
+
+    input_language = str(input_language).strip()
+
+    # is this a iso alpha 2/3 code or the name of a country?
+    found = languages.lookup(text=input_language)
+    if found is None:
         raise AttributeError(f'Failed to detect language from {input_language}. '
                              f'Try ISO 3166-1: alpha-2 code. Example: "de" for "Germany", "es" for Spain, etc.')
 
-    language = pycountry.languages.get(alpha_3=country.alpha_3)
+    country, language = found
     return country, language
 
 
+def split_languages(input_languages: [str]) -> [str]:
+    # Several languages may be given, separated by spaces or commas. Repeated ones are only translated once.
+    if input_languages is None:
+        raise Exception('Undefined language to translate into.')
+    if isinstance(input_languages, str):
+        input_languages = [input_languages]
+
+    result = []
+    for input_language in input_languages:
+        for part in str(input_language).split(','):
+            part = part.strip()
+            if part != '' and part not in result:
+                result.append(part)
+    if len(result) == 0:
+        raise Exception('Undefined language to translate into.')
+    return result
+
+
 def extract_input_dirs(input_dirs: str, output_dir: str) -> ([str], str):
-    if args.input is None:
+    if input_dirs is None:
         input_dirs = get_absolute_path()
 
     input_dirs = str(input_dirs).strip()
@@ -186,6 +818,57 @@ def extract_input_dirs(input_dirs: str, output_dir: str) -> ([str], str):
     return file_list, output_dir
 
 
+def serve(args, cache_file_path: str):
+    # Translates jobs sent over a local HTTP API, until interrupted. The arguments are the defaults of every job.
+    # Loaded only here, the server is not needed to translate files directly
+    import translation_server
+
+    api_key = read_api_key(api_key_file_path=args.api_key, backend_name=args.backend)
+    batch_mode, batch_size = batch_settings(batch_size=args.batch_size, batch_tokens=args.batch_tokens)
+    delay = 0.01 if is_dev_mode() else args.delay
+    languages_of_args = split_languages(args.language)
+    if len(languages_of_args) > 1:
+        # every job names its own language, so only one default is needed
+        log.write(f'The server translates into {languages_of_args[0]} by default, '
+                  f'jobs name other languages themselves.')
+
+    cache = None
+    if cache_file_path is not None:
+        cache = translation_cache.TranslationCache(cache_file_path=cache_file_path, max_entries=args.cache_size)
+    limiter = None
+    if args.tokens_per_minute > 0 or args.requests_per_minute > 0:
+        limiter = rate_limiter.RateLimiter(requests_per_minute=args.requests_per_minute,
+                                           tokens_per_minute=args.tokens_per_minute)
+
+    service = translation_server.TranslationService(
+        api_key=api_key,
+        backend=model_backend.create_backend(name=args.backend, api_key=api_key, api_base=args.api_base,
+                                             fake_latency=args.fake_latency, fake_rate_limit=args.fake_rate_limit,
+                                             pool=connection_pool.ConnectionPool(
+                                                 max_connections=args.max_connections,
+                                                 keepalive_seconds=args.keepalive,
+                                                 connect_timeout=args.connect_timeout,
+                                                 read_timeout=args.read_timeout)),
+        default_language=languages_of_args[0],
+        cache=cache,
+        limiter=limiter,
+        retrier=gpt_model_interface.create_retrier(max_retries=args.max_retries),
+        cache_warm=args.cache_warm,
+        model_parameters={'api_base': args.api_base, 'batch_mode': batch_mode, 'history_size': args.history_size,
+                          'history_tokens': args.history_tokens, 'summarize_history': args.history_summary,
+                          'mask_tags': not args.no_tag_masking},
+        run_parameters={'keep_history': args.keep_history, 'delay': delay, 'concurrency': args.concurrency,
+                        'batch_size': batch_size, 'batch_tokens': args.batch_tokens,
+                        'scene_gap_ms': int(args.scene_gap * 1000), 'scene_overlap': args.scene_overlap,
+                        'scene_lines': args.scene_lines,
+                        'parallel_files': args.parallel_files, 'deduplicate': not args.no_dedup,
+                        'deduplicate_across_files': args.dedup_files, 'skip_untranslatable': not args.no_skip,
+                        'incremental': args.incremental,
+                        'report_parameters': {'backend': args.backend, 'tokens_per_minute': args.tokens_per_minute,
+                                              'requests_per_minute': args.requests_per_minute}})
+    translation_server.serve(service=service, port=args.serve)
+
+
 def get_absolute_path() -> str:
     absolute_path = os.path.abspath(__file__)
     absolute_path = os.path.abspath(os.path.join(absolute_path, os.pardir))
@@ -206,12 +889,14 @@ if __name__ == '__main__':
 
     ######################
     # Required Arguments
-    parser.add_argument('-key', '--api_key', type=str, required=True,
-                        help='Filepath for a text file that contains your open AI api key. Required.')
-    parser.add_argument('-l', '--language', type=str, required=True,
+    parser.add_argument('-key', '--api_key', type=str, required=False,
+                        help='Filepath for a text file that contains your open AI api key.'
+                             ' Required, unless the fake backend is used.')
+    parser.add_argument('-l', '--language', type=str, required=True, nargs='+',
                         help='The language to translate into.'
                              ' Recommended to use two character country code (ISO 3166-1: alpha-2).'
                              ' Example: "de" for "Germany", "es" for Spain, etc.'
+                             ' Several languages are translated at the same time. Example: "de fr es" or "de,fr,es".'
                              ' Required.')
 
     # Optional arguments
@@ -219,6 +904,9 @@ if __name__ == '__main__':
                         help='Maximum tokens per minute to use.'
                              ' Typical rate limit reached for gpt-3.5-turbo is 160000.'
                              ' Visit https://platform.openai.com/account/rate-limits to learn more.')
+    parser.add_argument('-rpm', '--requests_per_minute', type=int, required=False, default=-1,
+                        help='Maximum API calls per minute to use.'
+                             ' Visit https://platform.openai.com/account/rate-limits to learn more.')
     parser.add_argument('-i', '--input', type=str, required=False,
                         help='Single file or directory to translate. If empty, the current directory is used.')
     parser.add_argument('-o', '--output', type=str, required=False,
@@ -229,12 +917,126 @@ if __name__ == '__main__':
                         help='For every file translated, keeps a session history.'
                              ' Results in more cohesive translations (as the model remembers previous lines spoken).'
                              ' Raises tokens count significantly. Keep cost and rate limits in mind!')
+    parser.add_argument('-c', '--concurrency', type=int, required=False, default=1,
+                        help='Number of API calls to keep in flight at the same time.'
+                             ' With a session history, every scene keeps a history of its own (see "--scene_gap").')
+    parser.add_argument('--api_base', type=str, required=False,
+                        help='Base URL of an openAI compatible API. Example: The local "mock_server.py".')
+    parser.add_argument('-b', '--batch_size', type=int, required=False, default=1,
+                        help='Number of subtitle lines to translate with a single API call.'
+                             ' Reduces the number of calls and tokens spent on the initial prompt.')
+    parser.add_argument('-bt', '--batch_tokens', type=int, required=False, default=-1,
+                        help='Maximum tokens of subtitle lines to translate with a single API call.'
+                             ' Counted with the tokenizer of the model, if "tiktoken" is installed.'
+                             ' Can be combined with "--batch_size".')
+    parser.add_argument('--scene_gap', type=float, required=False,
+                        default=cue_chunker.DEFAULT_SCENE_GAP_MS / 1000,
+                        help='Seconds between two lines that start a new scene. Lines of different scenes are never'
+                             ' translated with the same API call. 0 disables scenes.')
+    parser.add_argument('--scene_overlap', type=int, required=False, default=scene_segmenter.DEFAULT_OVERLAP,
+                        help='Lines before a scene sent along as context, if every scene keeps a session history'
+                             ' of its own (see "--keep_history" and "--concurrency").')
+    parser.add_argument('--scene_lines', type=int, required=False,
+                        default=scene_segmenter.DEFAULT_MAX_SCENE_LINES,
+                        help='Maximum lines of a scene with a session history of its own. Longer scenes are split.'
+                             ' 0 keeps scenes whole.')
+    parser.add_argument('--cache', type=str, required=False,
+                        help='File path of the translation cache. Lines translated before are read from it'
+                             ' instead of being sent to the model again.'
+                             ' If empty, "log/cache/translation_cache.sqlite" is used.')
+    parser.add_argument('--cache_size', type=int, required=False, default=100000,
+                        help='Maximum number of translations kept in the cache.'
+                             ' The least recently used translations are removed first.')
+    parser.add_argument('--cache_warm', action='store_true',
+                        help='Fills the cache with the model responses logged in "log/model/" before translating.'
+                             ' Only responses translated into the selected languages are used. Responses of older'
+                             ' versions without a language are used only if a single language is selected.')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Disables the translation cache.')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Translates files again, even if their translation already exists.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keeps a snapshot of the source next to every translation. Once the source is revised,'
+                             ' only new and edited lines are translated again, unchanged lines keep their'
+                             ' translation with the new timing.')
+    parser.add_argument('--max_retries', type=int, required=False,
+                        help='Maximum retries of a failed API call (e.g. due to rate limits or connection errors).'
+                             ' If empty, the number of retries depends on the error.')
+    parser.add_argument('--parallel_files', action='store_true',
+                        help='Translates all files at the same time, sharing the API calls in flight'
+                             ' (see "--concurrency"). Files with more lines remaining are preferred.'
+                             ' Ignored when a session history is kept.')
+    parser.add_argument('-hs', '--history_size', type=int, required=False, default=-1,
+                        help='Number of previous lines to keep in the session history (see "--keep_history").'
+                             ' Older lines are removed. If empty, all lines are kept.')
+    parser.add_argument('-ht', '--history_tokens', type=int, required=False, default=-1,
+                        help='Estimated maximum tokens of the session history (see "--keep_history").'
+                             ' Older lines are removed. If empty, all lines are kept.')
+    parser.add_argument('--history_summary', action='store_true',
+                        help='Lines removed from the session history are summarized by the model.'
+                             ' The summary is kept in the history instead.')
+    parser.add_argument('--backend', type=str, required=False, default=model_backend.BACKEND_OPENAI,
+                        choices=model_backend.backend_names,
+                        help='Where requests are sent. "fake" answers every line offline with the line itself,'
+                             ' to measure the translation pipeline without network access or cost.')
+    parser.add_argument('--fake_latency', type=str, required=False, default='0.5',
+                        help='Latency of the fake backend, in seconds. Either a number or a distribution:'
+                             ' "uniform:min,max", "normal:mean,deviation", "lognormal:median,sigma",'
+                             ' "exponential:mean".')
+    parser.add_argument('--fake_rate_limit', type=float, required=False, default=0.0,
+                        help='Share of requests the fake backend answers with a rate limit error (between 0 and 1).')
+    parser.add_argument('--no_dedup', action='store_true',
+                        help='Translates repeated lines every time. By default, only the first occurrence of a line'
+                             ' is translated and its translation is copied to every repeat within the file.')
+    parser.add_argument('--dedup_files', action='store_true',
+                        help='Also reuses the translations of files translated earlier in the same run, for lines'
+                             ' repeated across files. Ignored with "--no_dedup".')
+    parser.add_argument('--no_skip', action='store_true',
+                        help='Translates every line. By default, lines of only symbols or numbers, speaker tags'
+                             ' (e.g. "JOHN:") and lines already in the target language are kept as they are.')
+    parser.add_argument('--no_tag_masking', action='store_true',
+                        help='Sends formatting tags (e.g. "<i>", "{\\an8}") to the model. By default, tags around'
+                             ' a line are removed before the translation and restored afterwards.')
+    parser.add_argument('--report', type=str, required=False,
+                        help='File path of the run report (JSON): Time spent per stage, tokens, estimated cost'
+                             ' and throughput of every file. If empty, a new file in "log/report/" is used.')
+
+    parser.add_argument('--max_connections', type=int, required=False,
+                        default=connection_pool.DEFAULT_MAX_CONNECTIONS,
+                        help='Maximum number of HTTP connections to the API open at the same time.'
+                             ' Connections are kept alive and reused by later requests.')
+    parser.add_argument('--keepalive', type=float, required=False,
+                        default=connection_pool.DEFAULT_KEEPALIVE_SECONDS,
+                        help='Seconds an idle connection to the API is kept open.')
+    parser.add_argument('--connect_timeout', type=float, required=False,
+                        default=connection_pool.DEFAULT_CONNECT_TIMEOUT,
+                        help='Seconds to wait for a connection to the API, before the request is retried.')
+    parser.add_argument('--read_timeout', type=float, required=False, default=connection_pool.DEFAULT_READ_TIMEOUT,
+                        help='Seconds to wait for the whole response of the API, before the request is retried.')
+    parser.add_argument('--serve', type=int, required=False, metavar='PORT',
+                        help='Runs as a server on the given local port, translating jobs sent over HTTP'
+                             ' (see "translation_server.py"). The model client, cache and rate limits are shared'
+                             ' by all jobs. "--language" is the default language of a job, "--input" and'
+                             ' "--output" are ignored.')
 
     # Parsing the arguments
     args = parser.parse_args()
 
-    # Extracting the language
-    country, language = extract_input_language(args.language)
+    # Selecting the cache
+    cache_file_path = args.cache
+    if cache_file_path is None:
+        cache_file_path = log.log_dir_base + 'log' + os.sep + 'cache' + os.sep + 'translation_cache.sqlite'
+    if args.no_cache:
+        cache_file_path = None
+
+    if args.serve is not None:
+        serve(args=args, cache_file_path=cache_file_path)
+        sys.exit(0)
+
+    # Extracting the languages
+    targets = [extract_input_language(input_language) for input_language in split_languages(args.language)]
+    country, language = targets[0]
+    more_targets = [[c.alpha_2, l.alpha_2, c.name, l.name] for c, l in targets[1:]]
 
     # Extracting input dir:
     file_list, out_dir = extract_input_dirs(args.input, args.output)
@@ -242,7 +1044,8 @@ if __name__ == '__main__':
     language_alpha_2 = language.alpha_2
 
     # Informing the user via terminal
-    log.write(f'Translating {len(file_list)} subtitle(s) into {language.name} ({country.name}).')
+    log.write(f'Translating {len(file_list)} subtitle(s) into '
+              f'{", ".join([f"{l.name} ({c.name})" for c, l in targets])}.')
     log.write(f'Translations are saved in: {out_dir}')
 
     # Running the script
@@ -253,8 +1056,39 @@ if __name__ == '__main__':
          language_alpha_2=language_alpha_2,
          output_country=country.name,
          tokens_per_minute=args.tokens_per_minute,
+         requests_per_minute=args.requests_per_minute,
          delay=args.delay,
          keep_history=args.keep_history,
-         output_language=language.name
+         output_language=language.name,
+         more_targets=more_targets,
+         concurrency=args.concurrency,
+         api_base=args.api_base,
+         batch_size=args.batch_size,
+         batch_tokens=args.batch_tokens,
+         scene_gap_ms=int(args.scene_gap * 1000),
+         scene_overlap=args.scene_overlap,
+         scene_lines=args.scene_lines,
+         cache_file_path=cache_file_path,
+         cache_size=args.cache_size,
+         cache_warm=args.cache_warm,
+         overwrite=args.overwrite,
+         max_retries=args.max_retries,
+         parallel_files=args.parallel_files,
+         history_size=args.history_size,
+         history_tokens=args.history_tokens,
+         summarize_history=args.history_summary,
+         backend_name=args.backend,
+         fake_latency=args.fake_latency,
+         fake_rate_limit=args.fake_rate_limit,
+         report_file_path=args.report,
+         deduplicate=not args.no_dedup,
+         deduplicate_across_files=args.dedup_files,
+         skip_untranslatable=not args.no_skip,
+         mask_tags=not args.no_tag_masking,
+         max_connections=args.max_connections,
+         keepalive_seconds=args.keepalive,
+         connect_timeout=args.connect_timeout,
+         read_timeout=args.read_timeout,
+         incremental=args.incremental
          )
     log.write('Finished running "main()".')
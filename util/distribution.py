@@ -0,0 +1,46 @@
+import math
+import random
+
+
+class Distribution:
+
+    def __init__(self, kind: str = 'fixed', values: [float] = None) -> None:
+        # Random non-negative values, e.g. the seconds a fake answer takes. Kinds and their values:
+        # fixed:value, uniform:min,max, normal:mean,deviation, lognormal:median,sigma, exponential:mean
+        super().__init__()
+        self.kind: str = str(kind).strip().lower()
+        self.values: [float] = [float(v) for v in values] if values is not None else [0.0]
+
+        expected_values = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+        if self.kind not in expected_values:
+            raise AttributeError(f'Unknown distribution: "{kind}". '
+                                 f'Choose from: {", ".join(expected_values.keys())}.')
+        if len(self.values) != expected_values[self.kind]:
+            raise AttributeError(f'The distribution "{self.kind}" needs {expected_values[self.kind]} values, '
+                                 f'got: {self.values}')
+
+    @staticmethod
+    def parse(text: str):
+        # Example: 'lognormal:0.8,0.5'. A plain number is a fixed value.
+        text = str(text).strip()
+        if ':' not in text:
+            return Distribution(kind='fixed', values=[float(text)])
+        kind, values = text.split(':', 1)
+        return Distribution(kind=kind, values=[float(v) for v in values.split(',')])
+
+    def sample(self, rng: random.Random = None) -> float:
+        rng = rng if rng is not None else random
+        if self.kind == 'fixed':
+            value = self.values[0]
+        elif self.kind == 'uniform':
+            value = rng.uniform(self.values[0], self.values[1])
+        elif self.kind == 'normal':
+            value = rng.gauss(self.values[0], self.values[1])
+        elif self.kind == 'lognormal':
+            value = rng.lognormvariate(math.log(max(self.values[0], 1e-6)), self.values[1])
+        else:
+            value = rng.expovariate(1.0 / self.values[0]) if self.values[0] > 0 else 0.0
+        return max(0.0, value)
+
+    def __str__(self):
+        return f'{self.kind}:{",".join([str(v) for v in self.values])}'
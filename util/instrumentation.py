@@ -0,0 +1,73 @@
+import threading
+import time
+
+# Time spent in every stage of the pipeline, summed over the whole process.
+# Stages of concurrent requests overlap, so their sums can exceed the wall time of a run.
+SPAN_PARSE: str = 'parse'
+SPAN_PROMPT: str = 'prompt_build'
+SPAN_NETWORK: str = 'network_wait'
+SPAN_RATE_LIMIT: str = 'rate_limit_sleep'
+SPAN_RETRY: str = 'retry_backoff'
+SPAN_DELAY: str = 'delay_sleep'
+SPAN_LOG: str = 'logging'
+SPAN_WRITE: str = 'write'
+span_names: [str] = [SPAN_PARSE, SPAN_PROMPT, SPAN_NETWORK, SPAN_RATE_LIMIT, SPAN_RETRY, SPAN_DELAY, SPAN_LOG,
+                     SPAN_WRITE]
+
+# Time waited on purpose, instead of working: Sleeping for the rate limit, before retries and between requests
+throttle_span_names: [str] = [SPAN_RATE_LIMIT, SPAN_RETRY, SPAN_DELAY]
+
+_lock = threading.Lock()
+_counts: {str: int} = {name: 0 for name in span_names}
+_totals_ns: {str: int} = {name: 0 for name in span_names}
+
+
+class Span:
+    # Measures the time spent within a 'with' block. Works in threads and around 'await'.
+    __slots__ = ['name', '_start_ns']
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self._start_ns: int = 0
+
+    def __enter__(self):
+        self._start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        add_ns(name=self.name, nanoseconds=time.perf_counter_ns() - self._start_ns)
+        return False
+
+
+def span(name: str) -> Span:
+    return Span(name=name)
+
+
+def add_ns(name: str, nanoseconds: int, count: int = 1):
+    with _lock:
+        _counts[name] = _counts.get(name, 0) + count
+        _totals_ns[name] = _totals_ns.get(name, 0) + int(nanoseconds)
+
+
+def add_seconds(name: str, seconds: float, count: int = 1):
+    # For waits that are known in advance, like sleeping
+    add_ns(name=name, nanoseconds=int(seconds * 1_000_000_000), count=count)
+
+
+def snapshot() -> {str: [int, int]}:
+    # Count and total nanoseconds of every span so far
+    with _lock:
+        return {name: (_counts[name], _totals_ns[name]) for name in _counts}
+
+
+def since(older_snapshot: {str: [int, int]}) -> {str: {}}:
+    # Count and total seconds of every span since the given snapshot
+    spans = {}
+    for name, (count, total_ns) in snapshot().items():
+        older_count, older_total_ns = older_snapshot.get(name, (0, 0))
+        spans[name] = {'count': count - older_count, 'seconds': round((total_ns - older_total_ns) / 1_000_000_000, 6)}
+    return spans
+
+
+def throttled_seconds(spans: {str: {}}) -> float:
+    return round(sum([spans[name]['seconds'] for name in throttle_span_names if name in spans]), 6)
@@ -1,13 +1,148 @@
+import atexit
 import os
+import queue
+import threading
+import time
 from pathlib import Path
 from typing import Union
 
 # from util import file_manager
+from util import instrumentation
 from util.utils import format_exception
 from util.utils import gct
 
 log_dir_base: str = ''
 
+# Log files are written by a background thread, so logging never waits for the disk.
+# If the queue is full, callers wait up to '_queue_put_timeout' seconds. After that, the record is dropped.
+_queue_size: int = 10000
+_queue_put_timeout: float = 1.0
+_flush_interval_seconds: float = 0.5
+
+_background_writer = None
+_background_writer_lock = threading.Lock()
+
+# Formatting the timestamp is the most expensive part of a record. It only changes once per second.
+_timestamp_cache: [int, str] = (-1, '')
+
+
+class BackgroundLogWriter:
+
+    def __init__(self,
+                 log_file: str,
+                 queue_size: int = _queue_size,
+                 put_timeout: float = _queue_put_timeout,
+                 flush_interval_seconds: float = _flush_interval_seconds) -> None:
+        # Appends records to one log file, keeping it open. Records are written in batches.
+        super().__init__()
+        self.log_file: str = str(log_file)
+        self.put_timeout: float = float(put_timeout)
+        self.flush_interval_seconds: float = float(flush_interval_seconds)
+
+        self._queue: queue.Queue = queue.Queue(maxsize=int(queue_size))
+        self._lock = threading.Lock()
+        # guards '_closed', so no record is put after the last one was taken by the writer thread
+        self._state_lock = threading.Lock()
+        self._file = None
+        self._file_empty: bool = True
+        self._closed: bool = False
+
+        # statistics
+        self.records_written: int = 0
+        self.records_dropped: int = 0
+
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, record: str):
+        with self._state_lock:
+            if not self._closed:
+                try:
+                    self._queue.put(record, timeout=self.put_timeout)
+                except queue.Full:
+                    with self._lock:
+                        self.records_dropped = self.records_dropped + 1
+                return
+
+        # Shut down already (e.g. at exit, while other threads still log): Written right away, after every queued record
+        self._thread.join()
+        with self._state_lock:
+            self._write_records(records=[record])
+            self._file.close()
+            self._file = None
+
+    def flush(self):
+        # Blocks until every record put so far is on disk
+        self._queue.join()
+
+    def shutdown(self):
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        running = True
+
+        while running:
+            try:
+                records = [self._queue.get(timeout=self.flush_interval_seconds)]
+            except queue.Empty:
+                records = []
+
+            # taking everything that is waiting, so it is written at once
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in records:
+                running = False
+                records = [record for record in records if record is not None]
+
+            try:
+                self._write_records(records=records)
+                if self._file is not None and (self._queue.empty() or not running or
+                                               time.monotonic() - last_flush >= self.flush_interval_seconds):
+                    self._file.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                print('Failed to log to: ' + self.log_file)
+                print(str(e))
+            finally:
+                for _ in range(len(records) + (0 if running else 1)):
+                    self._queue.task_done()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_records(self, records: [str]):
+        with self._lock:
+            dropped = self.records_dropped
+            self.records_dropped = 0
+        if dropped > 0:
+            records = records + [f'[{gct()}] {dropped} log records were dropped, logging could not keep up.']
+        if len(records) == 0:
+            return
+
+        if self._file is None:
+            # Creating the parent path
+            os.makedirs(Path(self.log_file).parent.absolute(), exist_ok=True)
+            self._file_empty = not os.path.exists(self.log_file) or os.path.getsize(self.log_file) == 0
+            self._file = open(self.log_file, 'a', encoding='utf-8')
+
+        text = '\n'.join(records)
+        if not self._file_empty:
+            text = '\n' + text
+        self._file.write(text)
+        self._file_empty = False
+        self.records_written = self.records_written + len(records)
+
 
 def set_log_dir(new_dir: str):
     if not os.path.exists(path=new_dir) or not os.path.isdir(new_dir):
@@ -16,6 +151,9 @@ def set_log_dir(new_dir: str):
     global log_dir_base
     log_dir_base = new_dir + os.sep
 
+    # the next record starts a writer for the new directory
+    shutdown()
+
 
 def write_exception(exception: Exception,
                     include_timestamp: bool = True,
@@ -66,8 +204,9 @@ def write(output: Union[str, list],
 
     try:
         output = str(output)
-        _write(output=output, print_to_console=print_to_console, include_timestamp=include_timestamp,
-               include_in_files=include_in_files, include_in_static_log=include_in_static_log)
+        with instrumentation.span(instrumentation.SPAN_LOG):
+            _write(output=output, print_to_console=print_to_console, include_timestamp=include_timestamp,
+                   include_in_files=include_in_files, include_in_static_log=include_in_static_log)
     except Exception as e:
         print('Failed to log: "' + str(output).strip() + '"!')
         print(str(e))
@@ -84,41 +223,65 @@ def _write(output,
            include_timestamp: bool = True,
            include_in_files: bool = True):
     output = str(output)
-    log_files = get_log_files()
 
     if include_timestamp:
-        timestamp = gct()
+        timestamp = _timestamp()
         output = '[' + timestamp + '] ' + output
 
     if print_to_console:
         print(output)
 
     if include_in_files:
-        for current_out_file in log_files:
-            try:
-                if os.path.exists(current_out_file):
-                    f = open(current_out_file, 'a')
-                    f.write('\n')
-                else:
-                    # Creating the parent path
-                    parent_path = Path(current_out_file)
-                    parent_path = parent_path.parent.absolute()
-                    os.makedirs(parent_path, exist_ok=True)
-                    f = open(current_out_file, 'w', encoding="utf-8")
-
-                f.write(output)
-                f.close()
-            except Exception as e:
-                print('Failed to log to: ' + str(current_out_file))
-                print(str(e))
-                # TODO: Better log error
+        get_background_writer().put(output)
+
+
+def _timestamp() -> str:
+    global _timestamp_cache
+    second = int(time.time())
+    if _timestamp_cache[0] != second:
+        _timestamp_cache = (second, gct())
+    return _timestamp_cache[1]
+
+
+def get_background_writer() -> BackgroundLogWriter:
+    global _background_writer
+    writer = _background_writer
+    if writer is not None:
+        return writer
+
+    with _background_writer_lock:
+        if _background_writer is None:
+            _background_writer = BackgroundLogWriter(log_file=get_log_file_path())
+        return _background_writer
+
+
+def flush():
+    # Blocks until every record logged so far is written to the log files
+    writer = _background_writer
+    if writer is not None:
+        writer.flush()
+
+
+@atexit.register
+def shutdown():
+    # Writes all remaining records and closes the log files. Logging again starts a new writer.
+    global _background_writer
+    with _background_writer_lock:
+        writer = _background_writer
+        _background_writer = None
+    if writer is not None:
+        writer.shutdown()
+
+
+def get_log_file_path() -> str:
+    return log_dir_base + 'log' + os.sep + 'log.txt'
 
 
 def get_log_files() -> [str]:
     log_files = []
 
     log_dir = log_dir_base + 'log' + os.sep
-    log_file = log_dir + 'log.txt'
+    log_file = get_log_file_path()
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
@@ -0,0 +1,129 @@
+import asyncio
+import collections
+import threading
+import time
+
+from util import instrumentation
+
+# Length of the sliding window, in seconds. The openAI limits are given per minute.
+WINDOW_SECONDS: float = 60.0
+
+
+class Reservation:
+
+    def __init__(self, timestamp: float, tokens: int) -> None:
+        super().__init__()
+        self.timestamp: float = timestamp
+        self.tokens: int = int(tokens)
+        self.expired: bool = False
+
+
+class RateLimiter:
+
+    def __init__(self,
+                 requests_per_minute: int = -1,
+                 tokens_per_minute: int = -1,
+                 window_seconds: float = WINDOW_SECONDS) -> None:
+        # Sliding window limiter for requests and tokens. Values below one disable the respective limit.
+        # Can be shared by threads and async tasks: The lock is only held while bookkeeping, never while waiting.
+        super().__init__()
+        self.requests_per_minute: int = int(requests_per_minute)
+        self.tokens_per_minute: int = int(tokens_per_minute)
+        self.window_seconds: float = float(window_seconds)
+
+        self._lock = threading.Lock()
+        self._reservations: collections.deque = collections.deque()
+        self._window_tokens: int = 0
+
+        # statistics
+        self.wait_seconds_total: float = 0.0
+        self.estimated_tokens_total: int = 0
+        self.actual_tokens_total: int = 0
+
+    def is_limited(self) -> bool:
+        return self.requests_per_minute > 0 or self.tokens_per_minute > 0
+
+    def acquire(self, estimated_tokens: int) -> Reservation:
+        # Blocks until the request fits into the window. Reconcile the returned reservation after the request.
+        while True:
+            wait_seconds, reservation = self._try_reserve(tokens=estimated_tokens)
+            if reservation is not None:
+                return reservation
+            self._record_wait(wait_seconds=wait_seconds)
+            instrumentation.add_seconds(name=instrumentation.SPAN_RATE_LIMIT, seconds=wait_seconds)
+            time.sleep(wait_seconds)
+
+    async def acquire_async(self, estimated_tokens: int) -> Reservation:
+        while True:
+            wait_seconds, reservation = self._try_reserve(tokens=estimated_tokens)
+            if reservation is not None:
+                return reservation
+            self._record_wait(wait_seconds=wait_seconds)
+            instrumentation.add_seconds(name=instrumentation.SPAN_RATE_LIMIT, seconds=wait_seconds)
+            await asyncio.sleep(wait_seconds)
+
+    def _record_wait(self, wait_seconds: float):
+        # Threads and tasks waiting at the same time add to the same total
+        with self._lock:
+            self.wait_seconds_total = self.wait_seconds_total + wait_seconds
+
+    def try_acquire(self, estimated_tokens: int) -> [float, Reservation]:
+        # Does not wait: Returns a reservation, or the seconds to wait until the request would fit
+        return self._try_reserve(tokens=estimated_tokens)
+
+    def reconcile(self, reservation: Reservation, actual_tokens: int):
+        # Replaces the estimated tokens of a reservation with the tokens actually used
+        if reservation is None:
+            return
+
+        actual_tokens = int(actual_tokens)
+        with self._lock:
+            self.actual_tokens_total = self.actual_tokens_total + actual_tokens
+            if not reservation.expired:
+                self._window_tokens = self._window_tokens + actual_tokens - reservation.tokens
+            reservation.tokens = actual_tokens
+
+    def window_usage(self) -> [int, int]:
+        # Requests and tokens within the current window
+        with self._lock:
+            self._expire(now=time.monotonic())
+            return len(self._reservations), self._window_tokens
+
+    def _try_reserve(self, tokens: int) -> [float, Reservation]:
+        tokens = max(0, int(tokens))
+
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now=now)
+            wait_seconds = 0.0
+
+            if 0 < self.requests_per_minute <= len(self._reservations):
+                oldest = self._reservations[0]
+                wait_seconds = max(wait_seconds, oldest.timestamp + self.window_seconds - now)
+
+            # A single request larger than the limit is allowed, once the window is empty
+            excess_tokens = self._window_tokens + tokens - self.tokens_per_minute
+            if self.tokens_per_minute > 0 and excess_tokens > 0 and len(self._reservations) > 0:
+                freed_tokens = 0
+                for reservation in self._reservations:
+                    freed_tokens = freed_tokens + reservation.tokens
+                    if freed_tokens >= excess_tokens:
+                        wait_seconds = max(wait_seconds, reservation.timestamp + self.window_seconds - now)
+                        break
+                else:
+                    wait_seconds = max(wait_seconds, self._reservations[-1].timestamp + self.window_seconds - now)
+
+            if wait_seconds > 0:
+                return wait_seconds, None
+
+            reservation = Reservation(timestamp=now, tokens=tokens)
+            self._reservations.append(reservation)
+            self._window_tokens = self._window_tokens + tokens
+            self.estimated_tokens_total = self.estimated_tokens_total + tokens
+            return 0.0, reservation
+
+    def _expire(self, now: float):
+        while len(self._reservations) > 0 and self._reservations[0].timestamp + self.window_seconds <= now:
+            reservation = self._reservations.popleft()
+            reservation.expired = True
+            self._window_tokens = self._window_tokens - reservation.tokens
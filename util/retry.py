@@ -0,0 +1,200 @@
+import asyncio
+import random
+import threading
+import time
+
+from util import instrumentation, log
+
+
+class RetryPolicy:
+
+    def __init__(self,
+                 max_retries: int = 5,
+                 base_delay: float = 1.0,
+                 max_delay: float = 60.0,
+                 trips_circuit_breaker: bool = False) -> None:
+        # Exponential backoff with jitter: attempt n waits a random time between half and all of base * 2^n.
+        super().__init__()
+        self.max_retries: int = int(max_retries)
+        self.base_delay: float = float(base_delay)
+        self.max_delay: float = float(max_delay)
+        self.trips_circuit_breaker: bool = bool(trips_circuit_breaker)
+
+    def backoff_seconds(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int = 5, pause_seconds: float = 30.0) -> None:
+        # After 'failure_threshold' consecutive failures, every caller pauses until 'pause_seconds' have passed.
+        # Used for rate limit errors: If they keep coming, sending more requests only makes it worse.
+        super().__init__()
+        self.failure_threshold: int = int(failure_threshold)
+        self.pause_seconds: float = float(pause_seconds)
+
+        self._lock = threading.Lock()
+        self._consecutive_failures: int = 0
+        self._open_until: float = 0.0
+        self.times_opened: int = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures = self._consecutive_failures + 1
+            if self._consecutive_failures >= self.failure_threshold and time.monotonic() >= self._open_until:
+                self._open_until = time.monotonic() + self.pause_seconds
+                self._consecutive_failures = 0
+                self.times_opened = self.times_opened + 1
+                log.write(f'Too many consecutive rate limit errors. Pausing all requests for {self.pause_seconds} s.')
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+
+    def remaining_pause(self) -> float:
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic())
+
+
+class RetryStats:
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.retry_count: int = 0
+        self.backoff_ms: int = 0
+
+
+class Retrier:
+
+    def __init__(self,
+                 policies: {type: RetryPolicy},
+                 circuit_breaker: CircuitBreaker = None,
+                 is_retryable=None) -> None:
+        # 'policies' maps exception classes to their policy. Subclasses use the policy of their closest parent.
+        # 'is_retryable' can reject single exceptions of a retryable class (e.g. a rate limit due to no quota).
+        super().__init__()
+        assert policies is not None
+
+        self.policies: {type: RetryPolicy} = policies
+        self.circuit_breaker: CircuitBreaker = circuit_breaker
+        self.is_retryable = is_retryable
+
+        # statistics, shared by every caller
+        self._lock = threading.Lock()
+        self.retry_count_total: int = 0
+        self.backoff_ms_total: int = 0
+
+    def policy_for(self, exception: Exception) -> RetryPolicy:
+        for exception_class in type(exception).__mro__:
+            if exception_class in self.policies:
+                if self.is_retryable is not None and not self.is_retryable(exception):
+                    return None
+                return self.policies[exception_class]
+        return None
+
+    def call(self, function, *args, **kwargs) -> [object, RetryStats]:
+        stats = RetryStats()
+        attempt = 0
+
+        while True:
+            self._wait(seconds=self._circuit_breaker_pause(), stats=stats)
+            try:
+                result = function(*args, **kwargs)
+                self._record_success()
+                return result, stats
+            except Exception as e:
+                wait_seconds = self._handle_failure(exception=e, attempt=attempt)
+                if wait_seconds is None:
+                    raise
+            self._wait(seconds=wait_seconds, stats=stats)
+            stats.retry_count = stats.retry_count + 1
+            attempt = attempt + 1
+
+    async def call_async(self, coroutine_function, *args, **kwargs) -> [object, RetryStats]:
+        stats = RetryStats()
+        attempt = 0
+
+        while True:
+            await self._wait_async(seconds=self._circuit_breaker_pause(), stats=stats)
+            try:
+                result = await coroutine_function(*args, **kwargs)
+                self._record_success()
+                return result, stats
+            except Exception as e:
+                wait_seconds = self._handle_failure(exception=e, attempt=attempt)
+                if wait_seconds is None:
+                    raise
+            await self._wait_async(seconds=wait_seconds, stats=stats)
+            stats.retry_count = stats.retry_count + 1
+            attempt = attempt + 1
+
+    def _handle_failure(self, exception: Exception, attempt: int) -> float:
+        # Returns the seconds to wait before the next attempt, or None if the exception must be raised
+        policy = self.policy_for(exception=exception)
+        if policy is None or attempt >= policy.max_retries:
+            return None
+
+        if policy.trips_circuit_breaker and self.circuit_breaker is not None:
+            self.circuit_breaker.record_failure()
+
+        wait_seconds = policy.backoff_seconds(attempt=attempt)
+        retry_after = get_retry_after_seconds(exception=exception)
+        if retry_after is not None:
+            # The server knows best, when it accepts requests again
+            wait_seconds = max(retry_after, 0.0)
+
+        log.write(f'{type(exception).__name__}: "{str(exception).strip()}". '
+                  f'Retry {attempt + 1}/{policy.max_retries} in {round(wait_seconds, 2)} s.',
+                  print_to_console=False)
+        with self._lock:
+            self.retry_count_total = self.retry_count_total + 1
+        return wait_seconds
+
+    def _record_success(self):
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success()
+
+    def _circuit_breaker_pause(self) -> float:
+        if self.circuit_breaker is None:
+            return 0.0
+        return self.circuit_breaker.remaining_pause()
+
+    def _wait(self, seconds: float, stats: RetryStats):
+        if seconds <= 0:
+            return
+        self._count_backoff(seconds=seconds, stats=stats)
+        time.sleep(seconds)
+
+    async def _wait_async(self, seconds: float, stats: RetryStats):
+        if seconds <= 0:
+            return
+        self._count_backoff(seconds=seconds, stats=stats)
+        await asyncio.sleep(seconds)
+
+    def _count_backoff(self, seconds: float, stats: RetryStats):
+        backoff_ms = int(seconds * 1000)
+        stats.backoff_ms = stats.backoff_ms + backoff_ms
+        with self._lock:
+            self.backoff_ms_total = self.backoff_ms_total + backoff_ms
+        instrumentation.add_seconds(name=instrumentation.SPAN_RETRY, seconds=seconds)
+
+
+def get_retry_after_seconds(exception: Exception) -> float:
+    # Reads the 'Retry-After' header of the failed response, if there is one
+    headers = getattr(exception, 'headers', None)
+    if headers is None:
+        return None
+
+    try:
+        retry_after_ms = headers.get('retry-after-ms', None) or headers.get('Retry-After-Ms', None)
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000
+
+        retry_after = headers.get('retry-after', None) or headers.get('Retry-After', None)
+        if retry_after is not None:
+            return float(retry_after)
+    except (TypeError, ValueError):
+        # The header may also be a HTTP date. Falling back to the exponential backoff.
+        pass
+    return None
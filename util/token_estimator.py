@@ -0,0 +1,118 @@
+import threading
+
+# Counts the tokens of texts before they are sent, without calling the API.
+# Uses the tokenizer of the model (tiktoken), if it is installed. Otherwise, about four characters are one token.
+# Counts are memoized per text: The same cues are estimated for batching, deduplication and the rate limiter.
+# The memo is shared by every thread (e.g. one per language, see 'translator.translate_targets').
+DEFAULT_ENCODING: str = 'cl100k_base'
+DEFAULT_CACHE_SIZE: int = 100_000
+HEURISTIC: str = 'heuristic'
+
+
+def heuristic_tokens(text: str) -> int:
+    # Rough estimate: Roughly four characters per token for english text
+    return max(1, int(len(str(text)) / 4))
+
+
+class TokenEstimator:
+
+    def __init__(self,
+                 encoding_name: str = DEFAULT_ENCODING,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 use_tokenizer: bool = True) -> None:
+        # At most 'cache_size' texts are memoized. Once it is full, the oldest texts are dropped first.
+        # The tokenizer is only loaded on the first count, so importing this module stays cheap.
+        super().__init__()
+        if int(cache_size) < 1:
+            raise AttributeError(f'Illegal token cache size: {cache_size}. At least one text must fit.')
+
+        self.encoding_name: str = str(encoding_name)
+        self.cache_size: int = int(cache_size)
+        self.use_tokenizer: bool = bool(use_tokenizer)
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self._counts: {str: int} = {}
+        self._lock = threading.Lock()
+        self._encoding = None
+        self._encoding_loaded: bool = False
+        self._load_lock = threading.Lock()
+
+    def tokenizer_name(self) -> str:
+        self._load_encoding()
+        return self.encoding_name if self._encoding is not None else HEURISTIC
+
+    def count(self, text: str) -> int:
+        text = str(text)
+        with self._lock:
+            tokens = self._counts.get(text)
+            if tokens is not None:
+                self.hits = self.hits + 1
+                return tokens
+            self.misses = self.misses + 1
+
+        # tokenized outside of the lock, so threads do not wait for each other
+        self._load_encoding()
+        if self._encoding is not None:
+            tokens = max(1, len(self._encoding.encode(text, disallowed_special=())))
+        else:
+            tokens = heuristic_tokens(text)
+
+        with self._lock:
+            if text not in self._counts and len(self._counts) >= self.cache_size:
+                # dicts keep their insertion order, so the first key is the oldest one
+                self._counts.pop(next(iter(self._counts)), None)
+            self._counts[text] = tokens
+        return tokens
+
+    def clear(self):
+        with self._lock:
+            self._counts = {}
+            self.hits = 0
+            self.misses = 0
+
+    def hit_ratio(self) -> float:
+        if self.hits + self.misses == 0:
+            return None
+        return round(self.hits / (self.hits + self.misses), 4)
+
+    def to_dict(self) -> {}:
+        return {
+            'tokenizer': self.tokenizer_name(),
+            'texts_counted': self.misses,
+            'memo_hits': self.hits,
+            'memo_hit_ratio': self.hit_ratio(),
+            'memo_size': len(self._counts)
+        }
+
+    def stats_text(self) -> str:
+        return f'Token estimates: {self.hits + self.misses} counts with {self.tokenizer_name()} ' \
+               f'({self.misses} texts tokenized, {self.hits} memoized, hit ratio {self.hit_ratio()})'
+
+    def _load_encoding(self):
+        if self._encoding_loaded:
+            return
+        with self._load_lock:
+            if self._encoding_loaded:
+                return
+            if self.use_tokenizer:
+                try:
+                    # optional, the heuristic is used without it
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+                except Exception:
+                    # not installed, or the encoding cannot be loaded (e.g. it was never downloaded)
+                    self._encoding = None
+            self._encoding_loaded = True
+
+
+_default_estimator: TokenEstimator = TokenEstimator()
+
+
+def default_estimator() -> TokenEstimator:
+    # Shared by every estimate of the process, so its memo is shared as well
+    return _default_estimator
+
+
+def count(text: str) -> int:
+    return _default_estimator.count(text)
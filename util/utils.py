@@ -5,7 +5,8 @@ import os
 import traceback
 from datetime import datetime, timedelta
 import hashlib
-import matplotlib
+
+from util import token_estimator
 
 ###########################################################
 # GLOBAL FIELDS
@@ -17,6 +18,9 @@ DATE_FORMAT_YYYY_MM_DD_HH_MM_SS = f'{DATE_FORMAT_YYYY_MM_DD} {DATE_FORMAT_HH_MM_
 # Global Output Offset Param
 output_day_offset: int = 0
 
+# Progress bars are hidden, if several translations share the console
+show_progress_bar: bool = True
+
 
 def gct(raw: bool = False) -> [str, datetime]:
     n = datetime.now()
@@ -137,6 +141,8 @@ def string_to_deterministic_hash(data: str) -> int:
 
 # Function to determine the text color based on the background color
 def get_dynamic_text_color(background_color) -> str:
+    # matplotlib takes long to load and is only needed here, so it is not loaded on startup
+    import matplotlib.colors
     r, g, b = matplotlib.colors.to_rgb(background_color)
     brightness = (r * 299 + g * 587 + b * 114) / 1000
     if brightness > 0.5:
@@ -145,6 +151,19 @@ def get_dynamic_text_color(background_color) -> str:
         return 'white'
 
 
+def estimate_tokens(text: str) -> int:
+    # Counted with the tokenizer of the model, if it is installed (see 'token_estimator.py')
+    return token_estimator.count(text)
+
+
+def estimate_message_tokens(messages: [{}]) -> int:
+    # Rough estimate of the prompt tokens of a chat completion request: Every message costs a few tokens extra
+    tokens = 3
+    for message in messages:
+        tokens = tokens + 4 + estimate_tokens(message['content'])
+    return tokens
+
+
 def chat_gpt_api_key_printable(api_key: str) -> str:
     assert api_key is not None
 
@@ -171,7 +190,10 @@ def print_progress_bar(iteration: int,
                        tokens_session: int,
                        tokens_total: int,
                        bar_length: int = 50,
-                       eta_text: str = None):
+                       eta_text: str = None,
+                       suffix_text: str = None):
+    if not show_progress_bar:
+        return
     percent = "{0:.1f}".format(100 * (float(iteration) / float(total)))
     filled_length = int(bar_length * iteration // total)
     bar = '█' * filled_length + '-' * (bar_length - filled_length)
@@ -193,6 +215,14 @@ def print_progress_bar(iteration: int,
         token_text = str(tokens_session) + '|' + str(tokens_total)
 
     out_text = out_text + ' [' + token_text + ' tokens]'
+    if suffix_text is not None:
+        out_text = out_text + ' [' + suffix_text + ']'
 
     sys.stdout.write(out_text)
     sys.stdout.flush()
+
+
+def finish_progress_bar():
+    # Ends the line of the progress bar, so the next output starts on a new line
+    if show_progress_bar:
+        print('')